@@ -0,0 +1,119 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class AnswerCache:
+    """
+    In-process cache of answers keyed by the question's embedding.
+
+    A lookup returns the most similar cached question if its cosine similarity is
+    at least `threshold`, so rephrasings of the same question hit too. Entries
+    expire after `ttl_seconds`, and the least recently used entry is evicted
+    once `max_entries` is reached.
+
+    Entries are only matched within the same `scope`, e.g. the retrieval settings
+    and metadata filter the answer was produced with, so an answer drawn from one
+    tenant's documents is never served for another's.
+
+    Each entry remembers the content hash of every source it cited. When that
+    source has since been re-indexed with different content (or removed), the
+    entry is dropped on lookup. Any process that runs process_documents
+    therefore invalidates stale answers without having to notify this one.
+    """
+
+    def __init__(self, threshold=0.95, ttl_seconds=3600, max_entries=512):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self._next_id = 0
+        # Stacked vectors of all entries, rebuilt lazily after inserts/evictions
+        self._matrix = None
+        self._matrix_ids = []
+        self._matrix_scopes = []
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _drop(self, entry_id):
+        del self.entries[entry_id]
+        self._matrix = None
+
+    def lookup(self, vector, source_hashes, scope=None):
+        """
+        Returns the cached {"answer", "sources"} closest to `vector`, or None.
+        `source_hashes(paths)` must return {path: current content hash} for the
+        paths that are still indexed; it is only called for a candidate hit.
+        """
+        if self.max_entries <= 0:
+            return None
+        query = self._normalize(vector)
+
+        with self.lock:
+            now = time.time()
+            for entry_id in [i for i, e in self.entries.items() if now - e["created"] > self.ttl_seconds]:
+                self._drop(entry_id)
+            if not self.entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix_ids = list(self.entries)
+                self._matrix = np.stack([self.entries[i]["vector"] for i in self._matrix_ids])
+                self._matrix_scopes = [self.entries[i]["scope"] for i in self._matrix_ids]
+            scores = self._matrix @ query
+            scores[[entry_scope != scope for entry_scope in self._matrix_scopes]] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id = self._matrix_ids[best]
+            entry = self.entries[entry_id]
+
+        # Checked outside the lock since it may hit the manifest on disk
+        current = source_hashes(list(entry["source_hashes"]))
+        if any(current.get(path) != content_hash for path, content_hash in entry["source_hashes"].items()):
+            with self.lock:
+                if entry_id in self.entries:
+                    self._drop(entry_id)
+                self.misses += 1
+            return None
+
+        with self.lock:
+            if entry_id in self.entries:
+                self.entries.move_to_end(entry_id)
+            self.hits += 1
+        return {"answer": entry["answer"], "sources": set(entry["sources"])}
+
+    def store(self, vector, answer, sources, source_hashes, scope=None):
+        """Caches an answer together with the content hashes of the sources it cited."""
+        if self.max_entries <= 0:
+            return
+        sources = [source for source in sources if source]
+        entry = {
+            "vector": self._normalize(vector),
+            "answer": answer,
+            "sources": sources,
+            "source_hashes": source_hashes(sources),
+            "created": time.time(),
+            "scope": scope,
+        }
+        with self.lock:
+            self.entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self._matrix = None
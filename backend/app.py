@@ -1,21 +1,47 @@
 import streamlit as st
 import os
 import sys
+import time
+import threading
+import itertools
 from datetime import datetime
-import requests
 # Add the backend directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import your existing backend modules
-from data_indexing import db, process_documents, DOCUMENT_DIRECTORY, PERSIST_DIRECTORY
-from retrieval_pipeline import ask_question, vectorstore
+from config import DOCUMENT_DIRECTORY, PERSIST_DIRECTORY
+from document_loading import SUPPORTED_EXTENSIONS
+from index_manifest import DEFAULT_TENANT
+from ingest_jobs import IngestJobs, IngestWorker
+from health import HealthMonitor
+from retrieval_pipeline import stream_question, warm_up, SEARCH_KWARGS, HYBRID_SEARCH
+from startup_timing import report as report_startup_timing
 
-def is_ollama_running():
-    try:
-        r = requests.get("http://localhost:11434/api/tags", timeout=2)
-        return r.status_code == 200
-    except Exception:
-        return False
+def stream_answer(query, response, search_kwargs=None, filter=None):
+    """
+    Adapts stream_question for st.write_stream: yields only answer text and stores
+    the final answer and sources in `response`. The spinner covers retrieval and
+    prompt processing, up to the first token.
+    """
+    stream = stream_question(query, search_kwargs, filter)
+    with st.spinner("Thinking..."):
+        first = next(stream, None)
+    if first is None:
+        return
+    for item in itertools.chain([first], stream):
+        if isinstance(item, dict):
+            response.update(item)
+        else:
+            yield item
+
+def list_tenants(documents):
+    """Collections to search: the default one plus every one with indexed documents."""
+    return [DEFAULT_TENANT] + sorted(t for t in documents if t != DEFAULT_TENANT)
+
+def checked_ago(seconds):
+    if seconds is None:
+        return "not checked yet"
+    return f"checked {seconds:.0f}s ago"
 
 # Page configuration
 st.set_page_config(
@@ -25,6 +51,91 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource(show_spinner=False)
+def start_health_monitor():
+    """
+    One background prober per server for Ollama status, chunk count and the
+    document list, so reruns read cached values instead of doing I/O.
+    """
+    monitor = HealthMonitor()
+    monitor.start()
+    return monitor
+
+health = start_health_monitor()
+
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    """
+    Loads the embedding model, vector store and RAG chain once per server, in a
+    background thread, so the page renders straight away instead of blocking on torch.
+    """
+    state = {"ready": threading.Event(), "error": None}
+
+    def run():
+        try:
+            warm_up()
+            report_startup_timing()
+            # The chunk count can be probed now that the vector store is loaded
+            health.refresh()
+        except Exception as e:
+            state["error"] = str(e)
+        finally:
+            state["ready"].set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return state
+
+warmup = start_warm_up()
+is_warm = warmup["ready"].is_set() and warmup["error"] is None
+
+@st.cache_resource(show_spinner=False)
+def start_ingest_worker():
+    """
+    One background indexing worker per server, so uploads never block a session.
+    On start it resumes any job a previous server left unfinished.
+    """
+    worker = IngestWorker(IngestJobs(PERSIST_DIRECTORY))
+    worker.start()
+    return worker
+
+ingest_worker = start_ingest_worker()
+
+FILE_STATUS_ICONS = {"pending": "⏳", "loaded": "⚙️", "done": "✅", "skipped": "➖", "failed": "❌"}
+
+def show_ingest_progress():
+    """Live status of the latest indexing jobs; refreshed on its own while a job is active."""
+    jobs = ingest_worker.jobs.jobs(limit=3)
+    if not jobs:
+        st.caption("No uploads indexed yet")
+        return
+    active = any(job["status"] in ("queued", "running") for job in jobs)
+    if st.session_state.get("ingest_active") and not active:
+        # A job just finished: refresh the whole page so stats and documents update
+        st.session_state.ingest_active = False
+        health.probe("chunk_count", "documents")
+        st.rerun()
+    st.session_state.ingest_active = active
+
+    for job in jobs:
+        label = f"Job {job['id']}: {job['status']}"
+        if job["status"] == "running":
+            label += f" ({job['phase']})"
+        st.progress(job["files_done"] / max(job["files_total"], 1), text=label)
+        st.caption(
+            f"{job['files_done']}/{job['files_total']} files, {job['chunks_done']} chunks · "
+            f"{job['files_per_second']:.1f} files/s, {job['chunks_per_second']:.0f} chunks/s"
+        )
+        if job["error"]:
+            st.error(job["error"])
+        with st.expander("Files", expanded=job["status"] == "running"):
+            for file in job["files"]:
+                line = f"{FILE_STATUS_ICONS.get(file['status'], '')} {os.path.basename(file['path'])}"
+                if file["chunks"]:
+                    line += f" ({file['chunks']} chunks)"
+                if file["error"]:
+                    line += f" - {file['error']}"
+                st.text(line)
+
 # Custom CSS for modern styling
 st.markdown("""
     <style>
@@ -205,25 +316,38 @@ with st.sidebar:
         uploaded_files = st.file_uploader(
             "Add files to knowledge base",
             accept_multiple_files=True,
-            type=['pdf', 'txt', 'docx', 'doc', 'pptx', 'csv', 'xlsx', 'xls'],
+            type=[extension.lstrip(".") for extension in SUPPORTED_EXTENSIONS],
             help="Upload documents to add to the knowledge base",
             label_visibility="collapsed"
         )
+        collection = st.text_input(
+            "Collection", value=DEFAULT_TENANT,
+            help="Documents are searched per collection; each one is a subfolder of the documents folder",
+        ).strip()
         
         if uploaded_files:
             if st.button("📥 Process Documents", use_container_width=True, type="primary"):
-                with st.spinner("Processing and indexing documents..."):
+                with st.spinner("Saving documents..."):
                     try:
-                        # Save uploaded files to documents directory
+                        # Save uploaded files to the collection's folder
+                        if collection in ("", DEFAULT_TENANT):
+                            target_directory = DOCUMENT_DIRECTORY
+                        elif collection != os.path.basename(collection) or collection.startswith('.'):
+                            raise ValueError(f"Invalid collection name '{collection}'")
+                        else:
+                            target_directory = os.path.join(DOCUMENT_DIRECTORY, collection)
+                        os.makedirs(target_directory, exist_ok=True)
+                        saved_paths = []
                         for uploaded_file in uploaded_files:
-                            file_path = os.path.join(DOCUMENT_DIRECTORY, uploaded_file.name)
+                            file_path = os.path.join(target_directory, uploaded_file.name)
                             with open(file_path, "wb") as f:
                                 f.write(uploaded_file.getbuffer())
+                            saved_paths.append(file_path)
                         
-                        # Process documents using your data_indexing.py function
-                        process_documents(db)
-                        
-                        st.success("✅ Successfully processed the file(s)!")
+                        # Index in the background; chat stays usable meanwhile
+                        ingest_worker.jobs.submit(saved_paths)
+                        ingest_worker.notify()
+                        st.session_state.ingest_active = True
                         
                         # Clear the file uploader by rerunning
                         st.rerun()
@@ -231,44 +355,57 @@ with st.sidebar:
                     except Exception as e:
                         st.error(f"❌ Error processing files: {str(e)}")
     
+    # Indexing progress of uploaded files
+    with st.status("⚙️ Indexing Jobs", expanded=ingest_worker.jobs.has_pending()):
+        st.fragment(show_ingest_progress, run_every=2 if ingest_worker.jobs.has_pending() else None)()
+    
     st.divider()
     
     # Database Statistics Section
     with st.status("📊 Database Statistics", expanded=True):
-        if os.path.exists(PERSIST_DIRECTORY):
-            try:
-                collection_count = db._collection.count()
-                st.metric("Total Chunks Indexed", collection_count)
-            except Exception as e:
-                st.warning(f"Could not fetch stats: {e}")
+        chunk_count = health.get("chunk_count")
+        if not is_warm:
+            st.info("⏳ Warming up...")
+        elif chunk_count["error"]:
+            st.warning(f"Could not fetch stats: {chunk_count['error']}")
+        elif chunk_count["value"] is not None:
+            st.metric("Total Chunks Indexed", chunk_count["value"])
+            st.caption(checked_ago(health.age("chunk_count")))
         else:
-            st.warning("⚠️ No vector database found!")
-            st.info("Upload documents above to create the database")
+            st.info("⏳ Counting chunks...")
     
     st.divider()
     
-    # Show existing documents
+    # Show indexed documents, from the manifest as of the last probe
     st.subheader("📄 Indexed Documents")
-    if os.path.exists(DOCUMENT_DIRECTORY):
-        files = [f for f in os.listdir(DOCUMENT_DIRECTORY) 
-                if os.path.isfile(os.path.join(DOCUMENT_DIRECTORY, f)) 
-                and not f.startswith('.')]
-        
-        if files:
-            with st.expander(f"View all ({len(files)} files)"):
-                for file in sorted(files):
+    documents = health.get("documents")["value"] or {}
+    total_documents = sum(len(files) for files in documents.values())
+    if total_documents:
+        with st.expander(f"View all ({total_documents} files)"):
+            for tenant, files in sorted(documents.items()):
+                if len(documents) > 1:
+                    st.markdown(f"**{tenant}**")
+                for file in files:
                     st.text(f"📄 {file}")
-        else:
-            st.info("No documents found in the directory")
+        st.caption(checked_ago(health.age("documents")))
+    else:
+        st.info("No documents indexed yet")
     
     st.divider()
     
     # Retrieval Info
     with st.status("🔍 Retrieval Settings", expanded=False):
-        st.text("Search Type: MMR")
-        st.text("Top Results: 3")
-        st.text("Fetch Pool: 10")
-        st.text("Diversity: 0.6")
+        st.text("Search Type: MMR + keyword (hybrid)" if HYBRID_SEARCH else "Search Type: MMR")
+        search_in = st.selectbox("Search In", ["All collections"] + list_tenants(documents))
+        search_filter = None if search_in == "All collections" else {"tenant": search_in}
+        search_kwargs = {
+            "k": st.slider("Top Results", 1, 20, SEARCH_KWARGS["k"]),
+            "fetch_k": st.slider("Fetch Pool", 5, 500, SEARCH_KWARGS["fetch_k"], step=5),
+            "lambda_mult": st.slider(
+                "Relevance vs. Diversity", 0.0, 1.0, SEARCH_KWARGS["lambda_mult"], step=0.05,
+                help="1 ranks purely by relevance, 0 purely by diversity",
+            ),
+        }
     
     st.divider()
     
@@ -307,14 +444,19 @@ with header_col1:
     st.caption("Ask questions about your knowledge base using a local LLM")
 
 with header_col2:
-    try:
-        _ = vectorstore._collection.count()
-        if is_ollama_running():
+    if warmup["error"]:
+        st.error(f"🔴 Failed to load models: {warmup['error']}")
+    elif not is_warm:
+        st.info("⏳ Warming up: loading the embedding model and vector store...")
+    else:
+        ollama = health.get("ollama")
+        if ollama["value"] is None:
+            st.info("⏳ Checking Ollama...")
+        elif ollama["value"]:
             st.success("🟢 System Online")
         else:
             st.error("🔴 Ollama is not running.\nOpen Ollama app or use 'ollama serve' in terminal.")
-    except Exception as e:
-        st.error("🔴 System Offline")
+        st.caption(checked_ago(health.age("ollama")))
 
 st.divider()
 
@@ -357,7 +499,7 @@ else:
         """)
 
 # Chat input at the bottom (pinned)
-if prompt := st.chat_input("Ask a question about your documents..."):
+if prompt := st.chat_input("Ask a question about your documents...", disabled=not is_warm):
     # Add user message to chat history immediately for display
     st.session_state.chat_history.append({
         "question": prompt,
@@ -373,34 +515,36 @@ if prompt := st.chat_input("Ask a question about your documents..."):
     
     # Get assistant response
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                # Call your retrieval pipeline
-                response = ask_question(prompt)
-                
-                # Update the last chat entry with the actual response
-                st.session_state.chat_history[-1]["answer"] = response['answer']
-                st.session_state.chat_history[-1]["sources"] = list(response['sources'])
-                
-                # Display answer
-                st.markdown(response['answer'], unsafe_allow_html=True)
-                
-                # Display sources
-                if response.get('sources'):
-                    with st.expander("📎 View Sources"):
-                        for i, source in enumerate(response['sources'], 1):
-                            st.text(f"{i}. {os.path.basename(source) if source else 'Unknown'}")
-                
-                # Rerun to update the display
-                st.rerun()
-                
-            except Exception as e:
-                error_message = str(e)
-                # Remove the incomplete chat entry on error
-                st.session_state.chat_history.pop()
-                
-                if "ConnectError" in error_message or "connect" in error_message.lower():
-                    st.error("❌ Cannot connect to Ollama. Please make sure the Ollama app is running!")
-                    st.info("💡 Open the Ollama app or run 'ollama serve' in your terminal")
-                else:
-                    st.error(f"❌ Error: {error_message}")
+        try:
+            # Stream the answer from your retrieval pipeline as it is generated
+            response = {}
+            answer = st.write_stream(stream_answer(prompt, response, search_kwargs, search_filter))
+            
+            # Update the last chat entry with the actual response
+            st.session_state.chat_history[-1]["answer"] = response.get('answer', answer)
+            st.session_state.chat_history[-1]["sources"] = list(response.get('sources', []))
+            
+            # Display sources
+            if response.get('sources'):
+                with st.expander("📎 View Sources"):
+                    for i, source in enumerate(response['sources'], 1):
+                        st.text(f"{i}. {os.path.basename(source) if source else 'Unknown'}")
+            
+            # Rerun to update the display
+            st.rerun()
+            
+        except Exception as e:
+            error_message = str(e)
+            # Remove the incomplete chat entry on error
+            st.session_state.chat_history.pop()
+            
+            if "ConnectError" in error_message or "connect" in error_message.lower():
+                st.error("❌ Cannot connect to Ollama. Please make sure the Ollama app is running!")
+                st.info("💡 Open the Ollama app or run 'ollama serve' in your terminal")
+            else:
+                st.error(f"❌ Error: {error_message}")
+
+# Poll until the background warm-up finishes, then rerun once with everything enabled
+if not warmup["ready"].is_set():
+    time.sleep(1)
+    st.rerun()
@@ -0,0 +1,163 @@
+import os
+import csv
+import json
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from query_service import QueryService, MAX_CONCURRENT_GENERATIONS, MAX_PENDING_REQUESTS
+
+
+# Threads running retrieval (Chroma query, MMR, keyword search) at once
+RETRIEVAL_WORKERS = int(os.environ.get("RAG_RETRIEVAL_WORKERS", str(min(8, (os.cpu_count() or 2)))))
+
+
+def read_questions(path):
+    """
+    Questions from a JSONL file ({"id", "question"} per line, optionally with
+    "search_kwargs" and "filter") or a CSV file with "id" and "question" columns.
+    Questions without an ID are numbered by their position in the file; IDs
+    must be unique, since they are how a rerun finds the questions already answered.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    questions = []
+    seen = set()
+    for number, row in enumerate(rows, 1):
+        question = (row.get("question") or "").strip()
+        if not question:
+            print(f"Skipping entry {number}: no question")
+            continue
+        question_id = row.get("id")
+        # 0 is an ID; only a missing or empty one falls back to the position
+        question_id = str(number if question_id is None or question_id == "" else question_id)
+        if question_id in seen:
+            raise ValueError(f"Duplicate question ID {question_id!r} (entry {number})")
+        seen.add(question_id)
+        questions.append({
+            "id": question_id,
+            "question": question,
+            "search_kwargs": row.get("search_kwargs"),
+            "filter": row.get("filter"),
+        })
+    return questions
+
+
+def answered_ids(output_path):
+    """IDs already answered in an earlier run's output; questions that failed are asked again."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of an interrupted run may be cut short
+                continue
+            if record.get("error") is None:
+                done.add(str(record.get("id")))
+    return done
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+async def answer_all(service, questions, output, max_in_flight=MAX_PENDING_REQUESTS):
+    """
+    Answers the questions with `service` and appends one JSON line per question
+    to the open file `output` as soon as it is answered. All queries are embedded
+    in one call first; retrieval and generation then run concurrently, bounded by
+    the service's generation slots. Returns (answered, failed).
+    """
+    start = time.perf_counter()
+    vectors = await service.embed_many([q["question"] for q in questions])
+    # Each question's share of the batched embedding call
+    embed_seconds = (time.perf_counter() - start) / max(len(questions), 1)
+
+    in_flight = asyncio.Semaphore(max_in_flight)
+    counts = {"answered": 0, "failed": 0}
+
+    async def answer(question, vector):
+        async with in_flight:
+            record = {"id": question["id"], "question": question["question"]}
+            start = time.perf_counter()
+            try:
+                result = await service.ask(question["question"], question["search_kwargs"], question["filter"], vector=vector)
+                record["answer"] = result["answer"]
+                record["sources"] = sorted(s for s in result["sources"] if s)
+                timings = {**result["timings"], "embed": embed_seconds}
+                counts["answered"] += 1
+            except Exception as e:
+                record["error"] = str(e)
+                timings = {}
+                counts["failed"] += 1
+            timings["total"] = time.perf_counter() - start + embed_seconds
+            record["timings_ms"] = {name: round(seconds * 1000, 1) for name, seconds in timings.items()}
+            # One complete line per answer, flushed, so an interrupted run loses at most the answers in flight
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            done = counts["answered"] + counts["failed"]
+            print(f"[{done}/{len(questions)}] {question['id']}: " + ("ok" if "error" not in record else record["error"]))
+
+    await asyncio.gather(*(answer(question, vector) for question, vector in zip(questions, vectors)))
+    return counts["answered"], counts["failed"]
+
+
+async def run_batch(input_path, output_path, max_generations=MAX_CONCURRENT_GENERATIONS,
+                    retrieval_workers=RETRIEVAL_WORKERS, service=None):
+    questions = read_questions(input_path)
+    done = answered_ids(output_path)
+    remaining = [q for q in questions if q["id"] not in done]
+    print(f"{len(questions)} questions, {len(questions) - len(remaining)} already answered, {len(remaining)} to go")
+    if not remaining:
+        return
+
+    # Retrieval runs through asyncio.to_thread, i.e. on the loop's default executor
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=retrieval_workers))
+    # Enough questions in flight to keep retrieval and the generation slots busy,
+    # without holding the retrieved context of the whole file in memory
+    max_in_flight = retrieval_workers + 2 * max_generations
+    if service is None:
+        import retrieval_pipeline
+        service = QueryService(max_generations=max_generations, max_pending=max_in_flight)
+        if retrieval_pipeline.OLLAMA_WARM_UP:
+            # Loads the model in Ollama while the questions are embedded
+            threading.Thread(target=retrieval_pipeline.warm_up_llm, name="llm-warm-up", daemon=True).start()
+    start = time.perf_counter()
+    try:
+        with open(output_path, "a", encoding="utf-8") as output:
+            # Start on a fresh line after an answer cut short by an interrupted run
+            if output.tell() and not _ends_with_newline(output_path):
+                output.write("\n")
+            answered, failed = await answer_all(service, remaining, output, max_in_flight=max_in_flight)
+    finally:
+        await service.close()
+    wall = time.perf_counter() - start
+    print(
+        f"Answered {answered} question(s), {failed} failed, in {wall:.1f}s "
+        f"({answered / max(wall, 1e-9):.2f} questions/s). Answers in {output_path}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a file of questions; rerun to resume where it stopped.")
+    parser.add_argument("questions", help="JSONL file of {\"id\", \"question\"} or CSV with id and question columns")
+    parser.add_argument("--output", help="JSONL answers file, appended to (default: <questions>.answers.jsonl)")
+    parser.add_argument("--max-generations", type=int, default=MAX_CONCURRENT_GENERATIONS,
+                        help="answers generated by Ollama at once (default: %(default)s)")
+    parser.add_argument("--retrieval-workers", type=int, default=RETRIEVAL_WORKERS,
+                        help="threads running retrieval at once (default: %(default)s)")
+    args = parser.parse_args()
+
+    output_path = args.output or os.path.splitext(args.questions)[0] + ".answers.jsonl"
+    asyncio.run(run_batch(args.questions, output_path, args.max_generations, args.retrieval_workers))
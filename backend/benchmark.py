@@ -0,0 +1,714 @@
+import os
+import io
+import csv
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from xml.sax.saxutils import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Indexing and retrieval benchmark over a generated corpus. Everything it writes
+# (documents, Chroma, manifest, embedding cache) lives in a scratch directory,
+# which is set through the RAG_*_DIRECTORY variables before the backend modules
+# are imported, so the real documents and index are never touched.
+#
+#   python backend/benchmark.py --documents 500 --output results.json
+#   python backend/benchmark.py --e2e            # also answer questions through a stub Ollama
+#   python backend/benchmark.py --generation --ollama-host http://localhost:11434
+
+BENCHMARK_VERSION = 2
+FORMATS = ("txt", "csv", "pdf", "docx", "pptx", "xlsx")
+ATTRIBUTES = ("budget", "owner", "deadline", "location", "supplier", "priority")
+WORDS = (
+    "system report quarter review process team market customer service product data network "
+    "policy update release support budget plan design model cost value growth risk change "
+    "project meeting client region sales office training document storage account schedule "
+    "quality feature analysis issue request result version partner contract delivery target "
+    "the a of and to in for on with by from this that each every new current annual monthly "
+    "improves requires includes supports covers reduces extends tracks follows describes"
+).split()
+VALUES = {
+    "budget": lambda rng: f"{rng.randint(10, 990) * 1000} dollars",
+    "owner": lambda rng: rng.choice(("Alice Moreau", "Bilal Chen", "Carla Diaz", "Dmitri Volkov", "Eun-ji Park", "Femi Adeyemi")),
+    "deadline": lambda rng: f"{rng.randint(1, 28)} {rng.choice(('March', 'June', 'September', 'December'))} {rng.randint(2026, 2030)}",
+    "location": lambda rng: rng.choice(("Lisbon", "Nairobi", "Osaka", "Calgary", "Tallinn", "Recife")),
+    "supplier": lambda rng: rng.choice(("Northwind", "Contoso", "Fabrikam", "Tailspin", "Litware", "Adatum")),
+    "priority": lambda rng: rng.choice(("low", "medium", "high", "critical")),
+}
+
+
+# Synthetic corpus
+
+def make_facts(rng, count):
+    """`count` facts about made-up projects, each with the question that asks for it."""
+    facts = []
+    for _ in range(count):
+        code = f"{''.join(rng.choices('ABCDEFGHJKLMNPQRSTUVWXYZ', k=3))}-{rng.randint(1000, 9999)}"
+        attribute = rng.choice(ATTRIBUTES)
+        value = VALUES[attribute](rng)
+        facts.append({
+            "project": code,
+            "attribute": attribute,
+            "value": value,
+            "sentence": f"The {attribute} of project {code} is {value}.",
+            "question": f"What is the {attribute} of project {code}?",
+        })
+    return facts
+
+
+def filler_sentence(rng):
+    words = rng.choices(WORDS, k=rng.randint(8, 18))
+    return " ".join(words).capitalize() + "."
+
+
+def make_paragraphs(rng, words, facts):
+    """Filler paragraphs totalling about `words` words, with the fact sentences placed at random."""
+    paragraphs = []
+    count = 0
+    while count < words:
+        sentences = [filler_sentence(rng) for _ in range(rng.randint(3, 6))]
+        count += sum(len(s.split()) for s in sentences)
+        paragraphs.append(sentences)
+    for fact in facts:
+        rng.choice(paragraphs).insert(0, fact["sentence"])
+    return [" ".join(sentences) for sentences in paragraphs]
+
+
+def write_txt(path, paragraphs, facts, rng):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs))
+
+
+def table_rows(paragraphs, facts, rng):
+    rows = [["project", "attribute", "value", "notes"]]
+    for paragraph in paragraphs:
+        rows.append([f"REF-{rng.randint(1000, 9999)}", "note", "", paragraph])
+    for fact in facts:
+        rows.insert(rng.randint(1, len(rows)), [fact["project"], fact["attribute"], fact["value"], fact["sentence"]])
+    return rows
+
+
+def write_csv(path, paragraphs, facts, rng):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(table_rows(paragraphs, facts, rng))
+
+
+def write_xlsx(path, paragraphs, facts, rng):
+    from openpyxl import Workbook
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in table_rows(paragraphs, facts, rng):
+        sheet.append(row)
+    workbook.save(path)
+
+
+def write_pptx(path, paragraphs, facts, rng):
+    from pptx import Presentation
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]
+    for number, paragraph in enumerate(paragraphs, 1):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {number}"
+        slide.placeholders[1].text = paragraph
+    presentation.save(path)
+
+
+def write_docx(path, paragraphs, facts, rng):
+    # A minimal WordprocessingML package; no writer library needed
+    body = "".join(f"<w:p><w:r><w:t>{escape(p)}</w:t></w:r></w:p>" for p in paragraphs)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as package:
+        package.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ))
+        package.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/></Relationships>'
+        ))
+        package.writestr("word/document.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'
+        ))
+
+
+def write_pdf(path, paragraphs, facts, rng, line_chars=90, lines_per_page=50):
+    # A minimal text-only PDF, one Helvetica text object per page
+    lines = []
+    for paragraph in paragraphs:
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + len(word) >= line_chars:
+                lines.append(line)
+                line = ""
+            line = f"{line} {word}" if line else word
+        lines.extend([line, ""])
+    pages = [lines[i : i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in pages:
+        text = "".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T* " for line in page
+        )
+        stream = f"BT /F1 10 Tf 14 TL 50 770 Td {text}ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+    with open(path, "wb") as f:
+        f.write(out.getvalue())
+
+
+WRITERS = {"txt": write_txt, "csv": write_csv, "pdf": write_pdf, "docx": write_docx, "pptx": write_pptx, "xlsx": write_xlsx}
+
+
+def generate_corpus(directory, documents=100, formats=FORMATS, words_per_document=600, facts_per_document=3, seed=0):
+    """
+    Writes `documents` files cycling through `formats`, each with filler text and
+    `facts_per_document` unique facts. Returns the labeled queries: one per fact,
+    with the path of the only file that answers it.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    queries = []
+    for number in range(documents):
+        extension = formats[number % len(formats)]
+        path = os.path.abspath(os.path.join(directory, f"doc_{number:05d}.{extension}"))
+        facts = make_facts(rng, facts_per_document)
+        WRITERS[extension](path, make_paragraphs(rng, words_per_document, facts), facts, rng)
+        queries.extend({"question": fact["question"], "source": path} for fact in facts)
+    return queries
+
+
+# Stub Ollama server
+
+def keep_alive_seconds(value):
+    """Ollama's keep_alive ("30m", "1h", 300, -1, ...) in seconds; negative means forever."""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = value.strip()
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    for unit in sorted(units, key=len, reverse=True):
+        if value.endswith(unit):
+            return float(value[: -len(unit)]) * units[unit]
+    return float(value)
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """
+    Answers /api/chat like Ollama, streaming a fixed answer at a fixed token rate.
+    It keeps a model "loaded" the way Ollama does: the first request, one after
+    keep_alive ran out or one with a different num_ctx pays `load_seconds`, and
+    prefill time is only spent on the part of the prompt not shared with the
+    previous one. Unless `think` is false, `think_tokens` of reasoning come first.
+    """
+
+    answer_tokens = 40
+    token_seconds = 0.0
+    prefill_seconds = 0.0  # for a prompt with nothing cached
+    load_seconds = 0.0
+    think_tokens = 0
+    default_num_ctx = 4096
+    state = None  # {"lock", "num_ctx", "expires_at", "last_prompt"}, shared by the server's handlers
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": []})
+        elif self.path == "/api/ps":
+            with self.state["lock"]:
+                loaded = self._loaded()
+                expires_at = self.state["expires_at"]
+            models = []
+            if loaded:
+                expires = "forever" if expires_at == float("inf") else time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(expires_at))
+                models.append({"name": "stub", "model": "stub", "context_length": self.state["num_ctx"], "expires_at": expires})
+            self._send_json({"models": models})
+        else:
+            self.send_error(404)
+
+    def _loaded(self):
+        return self.state["num_ctx"] is not None and time.time() < self.state["expires_at"]
+
+    def _schedule_unload(self, keep_alive):
+        seconds = keep_alive_seconds(keep_alive)
+        self.state["expires_at"] = float("inf") if seconds < 0 else time.time() + seconds
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/api/generate" and not request.get("prompt"):
+            # Load or unload only, e.g. {"model": ..., "keep_alive": 0}
+            with self.state["lock"]:
+                self._schedule_unload(request.get("keep_alive"))
+                if self.state["expires_at"] <= time.time():
+                    self.state["num_ctx"] = None
+            self._send_json({"model": request.get("model", "stub"), "response": "", "done": True})
+            return
+        if self.path != "/api/chat":
+            self.send_error(404)
+            return
+
+        options = request.get("options") or {}
+        num_ctx = options.get("num_ctx") or self.default_num_ctx
+        prompt = "".join(f"<{message.get('role')}>{message.get('content') or ''}" for message in request.get("messages", []))
+        with self.state["lock"]:
+            load_seconds = 0.0
+            if not self._loaded() or self.state["num_ctx"] != num_ctx:
+                load_seconds = self.load_seconds
+                self.state["num_ctx"] = num_ctx
+                self.state["last_prompt"] = ""
+            cached = len(os.path.commonprefix([prompt, self.state["last_prompt"]]))
+            self.state["last_prompt"] = prompt
+            self._schedule_unload(request.get("keep_alive"))
+            if self.state["expires_at"] <= time.time():
+                self.state["num_ctx"] = None
+        prefill_seconds = self.prefill_seconds * (len(prompt) - cached) / max(len(prompt), 1)
+
+        think = request.get("think")
+        thinking = [] if think is False else [f"thought{i} " for i in range(self.think_tokens)]
+        answer = [f"token{i} " for i in range(self.answer_tokens)]
+        if think is None and thinking:
+            # Without think, reasoning models put their thinking in the answer
+            answer = ["<think>"] + thinking + ["</think>"] + answer
+            thinking = []
+        limit = options.get("num_predict")
+        done_reason = "stop"
+        if limit is not None and limit >= 0 and len(thinking) + len(answer) > limit:
+            thinking, answer = thinking[:limit], answer[: max(limit - len(thinking), 0)]
+            done_reason = "length"
+        base = {"model": request.get("model", "stub"), "created_at": "1970-01-01T00:00:00Z"}
+        # Same fields as Ollama's final message, durations in nanoseconds
+        stats = {
+            "done": True, "done_reason": done_reason, "load_duration": int(load_seconds * 1e9),
+            "prompt_eval_count": max(len(prompt) - cached, 1) // 4, "prompt_eval_duration": int(prefill_seconds * 1e9),
+            "eval_count": len(thinking) + len(answer), "eval_duration": int(self.token_seconds * (len(thinking) + len(answer)) * 1e9),
+        }
+        time.sleep(load_seconds + prefill_seconds)
+
+        if not request.get("stream", True):
+            message = {"role": "assistant", "content": "".join(answer)}
+            if thinking:
+                message["thinking"] = "".join(thinking)
+            self._send_json({**base, "message": message, **stats})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for field, tokens in (("thinking", thinking), ("content", answer)):
+            for token in tokens:
+                time.sleep(self.token_seconds)
+                message = {"role": "assistant", "content": "", field: token}
+                self.wfile.write((json.dumps({**base, "message": message, "done": False}) + "\n").encode("utf-8"))
+                self.wfile.flush()
+        self.wfile.write((json.dumps({**base, "message": {"role": "assistant", "content": ""}, **stats}) + "\n").encode("utf-8"))
+
+
+def start_stub_ollama(answer_tokens=40, token_seconds=0.0, prefill_seconds=0.0, load_seconds=0.0, think_tokens=0):
+    """Starts a stub Ollama server on a free local port; returns (server, base URL)."""
+    handler = type("Handler", (StubOllamaHandler,), {
+        "answer_tokens": answer_tokens, "token_seconds": token_seconds, "prefill_seconds": prefill_seconds,
+        "load_seconds": load_seconds, "think_tokens": think_tokens,
+        "state": {"lock": threading.Lock(), "num_ctx": None, "expires_at": 0.0, "last_prompt": ""},
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# Measurements
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of its largest child process, in MB."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return {"self": None, "children": None}
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+def latency_summary(seconds):
+    import numpy as np
+    if not seconds:
+        return None
+    milliseconds = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "mean": float(milliseconds.mean()), "max": float(milliseconds.max())}
+
+
+def bench_indexing(workers):
+    from data_indexing import process_documents
+
+    counts = {"files": 0, "chunks": 0, "failed": 0}
+
+    def progress(event, **fields):
+        if event == "file_indexed":
+            counts["files"] += 1
+        elif event == "batch":
+            counts["chunks"] += fields["chunks"]
+        elif event == "file_failed":
+            counts["failed"] += 1
+
+    start = time.perf_counter()
+    process_documents(workers=workers, progress=progress)
+    seconds = time.perf_counter() - start
+    persist_directory = os.environ["RAG_PERSIST_DIRECTORY"]
+    return {
+        "seconds": seconds,
+        # Vectors, index and sidecars (manifest, keyword index)
+        "index_bytes": sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(persist_directory) for name in names
+        ),
+        "documents": counts["files"],
+        "chunks": counts["chunks"],
+        "failed": counts["failed"],
+        "docs_per_second": counts["files"] / seconds,
+        "chunks_per_second": counts["chunks"] / seconds,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_retrieval(queries, search_kwargs):
+    """Replays the labeled queries through retrieve(); recall@k is the share whose answer file is among the results."""
+    from retrieval_pipeline import retrieve, search_settings
+
+    settings = search_settings(search_kwargs)
+    retrieve("warm up")
+    latencies, hits = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        docs = retrieve(query["question"], settings)
+        latencies.append(time.perf_counter() - start)
+        hits += any(doc.metadata.get("source") == query["source"] for doc in docs)
+    return {
+        "queries": len(queries),
+        "search_kwargs": settings,
+        "latency_ms": latency_summary(latencies),
+        "recall_at_k": hits / len(queries) if queries else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_end_to_end(queries, search_kwargs):
+    """Answers the queries with ask_question; source recall counts answers citing the labeled file."""
+    from retrieval_pipeline import ask_question, warm_up
+
+    warm_up()
+    latencies, hits, failures = [], 0, 0
+    for query in queries:
+        start = time.perf_counter()
+        response = ask_question(query["question"], search_kwargs)
+        latencies.append(time.perf_counter() - start)
+        if response is None:
+            failures += 1
+        else:
+            hits += query["source"] in response["sources"]
+    return {
+        "queries": len(queries),
+        "failures": failures,
+        "latency_ms": latency_summary(latencies),
+        "source_recall": hits / len(queries) if queries else None,
+    }
+
+
+def generation_variants():
+    """
+    The generation settings applied one at a time, each step keeping the ones
+    before it: (name, ChatOllama overrides, warm up first, prompt messages).
+    The baseline is ChatOllama's defaults with the context in the system prompt.
+    """
+    import retrieval_pipeline as pipeline
+
+    reasoning = pipeline.reasoning_mode()
+    num_predict = pipeline.answer_token_limit(reasoning)
+    instructions, _, reminder = pipeline.system_prompt.rpartition("\n\n")
+    context_in_system = [
+        ("system", f"{instructions}\n\nContext:\n{{context}}\n\n{reminder}"),
+        ("human", "{input}"),
+    ]
+    static_prefix = [("system", pipeline.system_prompt), ("human", pipeline.question_prompt)]
+    steps = (
+        ("baseline", {}, False, context_in_system),
+        ("keep_alive", {"keep_alive": pipeline.OLLAMA_KEEP_ALIVE}, False, context_in_system),
+        ("warm_up", {}, True, context_in_system),
+        ("context_size", {"num_ctx": pipeline.context_window(num_predict), "num_predict": num_predict}, True, context_in_system),
+        ("reasoning", {"reasoning": reasoning}, True, context_in_system),
+        ("static_prefix", {}, True, static_prefix),
+    )
+    settings = {"keep_alive": None, "reasoning": None, "num_ctx": None, "num_predict": None}
+    variants = []
+    for name, overrides, warm, messages in steps:
+        settings = {**settings, **overrides}
+        variants.append((name, settings, warm, messages))
+    return variants
+
+
+def ollama_keep_alive_left(host):
+    """Seconds until Ollama unloads the model (None if none is loaded, -1 if never)."""
+    import requests
+    from datetime import datetime, timezone
+    models = requests.get(f"{host}/api/ps", timeout=10).json().get("models") or []
+    if not models:
+        return None
+    expires_at = models[0].get("expires_at") or ""
+    if expires_at == "forever" or expires_at.startswith("0001") or expires_at.startswith("2318"):
+        return -1
+    try:
+        expires = datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return round((expires - datetime.now(timezone.utc)).total_seconds())
+
+
+def bench_generation(queries, search_kwargs):
+    """
+    Compares the generation settings step by step (see generation_variants).
+    Each question's context is retrieved once up front and reused for every
+    variant, so only generation changes. The model is unloaded before each
+    variant, so the first question shows the load unless the variant warms up.
+    """
+    import requests
+    from langchain_core.callbacks import BaseCallbackHandler
+    import retrieval_pipeline as pipeline
+    from config import ollama_url
+
+    class OllamaStats(BaseCallbackHandler):
+        def __init__(self):
+            self.calls = []
+
+        def on_llm_end(self, response, **kwargs):
+            for generations in response.generations:
+                for generation in generations:
+                    self.calls.append(getattr(getattr(generation, "message", None), "response_metadata", None) or {})
+
+    host = ollama_url(os.environ.get("OLLAMA_HOST"))
+    settings = pipeline.search_settings(search_kwargs)
+    contexts = [
+        pipeline.build_context(query["question"], pipeline.retrieve(query["question"], settings))
+        for query in queries
+    ]
+
+    results = {}
+    for name, overrides, warm, messages in generation_variants():
+        requests.post(f"{host}/api/generate", json={"model": pipeline.USE_MODEL, "keep_alive": 0}, timeout=60)
+        stats = OllamaStats()
+        llm = pipeline.load_llm_model(pipeline.USE_MODEL, callbacks=[stats], **overrides)
+        _, chain = pipeline.build_combine_docs_chain(llm, messages)
+
+        warm_up_seconds = None
+        if warm:
+            start = time.perf_counter()
+            pipeline.warm_up_llm(llm.model_copy(update={"callbacks": None}))
+            warm_up_seconds = time.perf_counter() - start
+        latencies = []
+        for query, context in zip(queries, contexts):
+            start = time.perf_counter()
+            chain.invoke({"input": query["question"], "context": context})
+            latencies.append(time.perf_counter() - start)
+
+        def mean(field, scale=1):
+            values = [call[field] * scale for call in stats.calls if call.get(field) is not None]
+            return sum(values) / len(values) if values else None
+
+        results[name] = {
+            "settings": overrides,
+            "warm_up_ms": warm_up_seconds * 1000 if warm_up_seconds is not None else None,
+            "first_question_ms": latencies[0] * 1000 if latencies else None,
+            "latency_ms": latency_summary(latencies),
+            # Ollama reports durations in nanoseconds
+            "ollama_ms": {
+                "load": mean("load_duration", 1e-6),
+                "prefill": mean("prompt_eval_duration", 1e-6),
+                "decode": mean("eval_duration", 1e-6),
+            },
+            "prompt_tokens_evaluated": mean("prompt_eval_count"),
+            "output_tokens": mean("eval_count"),
+            "hit_token_limit": sum(call.get("done_reason") == "length" for call in stats.calls),
+            "keep_alive_left_seconds": ollama_keep_alive_left(host),
+        }
+    return {"queries": len(queries), "variants": results}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark indexing, retrieval and (optionally) answering on a synthetic corpus.")
+    parser.add_argument("--documents", type=int, default=100, help="files in the generated corpus (default: %(default)s)")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="comma-separated file types to generate (default: %(default)s)")
+    parser.add_argument("--words", type=int, default=600, help="filler words per document (default: %(default)s)")
+    parser.add_argument("--facts", type=int, default=3, help="labeled facts per document (default: %(default)s)")
+    parser.add_argument("--queries", type=int, default=200, help="labeled queries replayed through the retriever (default: %(default)s)")
+    parser.add_argument("--k", type=int, help="chunks retrieved per query (default: RAG_SEARCH_K)")
+    parser.add_argument("--fetch-k", type=int, help="MMR candidate pool (default: RAG_FETCH_K)")
+    parser.add_argument("--workers", type=int, default=1, help="processes parsing files during indexing (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--e2e", action="store_true", help="also answer questions end to end with ask_question")
+    parser.add_argument("--e2e-queries", type=int, default=20,
+                        help="questions answered end to end and per generation variant (default: %(default)s)")
+    parser.add_argument("--generation", action="store_true",
+                        help="also compare the generation settings step by step on the same retrieved contexts")
+    parser.add_argument("--ollama-host", help="real Ollama server for --e2e and --generation; a stub server is started when omitted")
+    parser.add_argument("--stub-tokens", type=int, default=40, help="tokens in each stub answer (default: %(default)s)")
+    parser.add_argument("--stub-token-ms", type=float, default=0.0, help="stub delay per generated token (default: %(default)s)")
+    parser.add_argument("--stub-prefill-ms", type=float, default=0.0,
+                        help="stub delay before the first token of an uncached prompt (default: %(default)s)")
+    parser.add_argument("--stub-load-ms", type=float, default=0.0, help="stub model load time (default: %(default)s)")
+    parser.add_argument("--stub-think-tokens", type=int, default=0,
+                        help="reasoning tokens the stub generates unless thinking is off (default: %(default)s)")
+    parser.add_argument("--workdir", help="scratch directory for the corpus and index (default: a new temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory afterwards")
+    parser.add_argument("--output", help="write the JSON results to this file as well as stdout")
+    args = parser.parse_args()
+
+    formats = tuple(f.strip().lstrip(".").lower() for f in args.formats.split(",") if f.strip())
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown formats {sorted(unknown)}, expected some of {list(FORMATS)}")
+    if args.workdir and os.path.exists(args.workdir) and os.listdir(args.workdir):
+        parser.error(f"--workdir {args.workdir} is not empty")
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="rag-benchmark-"))
+
+    # Must be set before config is imported
+    os.environ["RAG_DOCUMENT_DIRECTORY"] = os.path.join(workdir, "documents")
+    os.environ["RAG_PERSIST_DIRECTORY"] = os.path.join(workdir, "chroma_db")
+    os.environ["RAG_EMBEDDING_CACHE_DIRECTORY"] = os.path.join(workdir, "embedding_cache")
+    # Every end-to-end question should reach the model
+    os.environ["RAG_ANSWER_CACHE_SIZE"] = "0"
+    stub = None
+    if args.e2e or args.generation:
+        if args.ollama_host:
+            os.environ["OLLAMA_HOST"] = args.ollama_host
+        else:
+            stub, os.environ["OLLAMA_HOST"] = start_stub_ollama(
+                args.stub_tokens, args.stub_token_ms / 1000, args.stub_prefill_ms / 1000,
+                args.stub_load_ms / 1000, args.stub_think_tokens,
+            )
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    try:
+        start = time.perf_counter()
+        queries = generate_corpus(
+            os.environ["RAG_DOCUMENT_DIRECTORY"], args.documents, formats, args.words, args.facts, args.seed
+        )
+        corpus = {
+            "documents": args.documents,
+            "formats": list(formats),
+            "words_per_document": args.words,
+            "facts_per_document": args.facts,
+            "bytes": sum(entry.stat().st_size for entry in os.scandir(os.environ["RAG_DOCUMENT_DIRECTORY"])),
+            "generate_seconds": time.perf_counter() - start,
+        }
+        random.Random(args.seed).shuffle(queries)
+        search_kwargs = {"k": args.k, "fetch_k": args.fetch_k}
+
+        from config import EMBEDDING_BACKEND, EMBED_BATCH_SIZE, VECTOR_STORE
+        from retrieval_pipeline import HYBRID_SEARCH, USE_MODEL, OLLAMA_KEEP_ALIVE, REASONING, MAX_ANSWER_TOKENS
+
+        results = {
+            "benchmark_version": BENCHMARK_VERSION,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": git_commit(),
+            "platform": {"python": platform.python_version(), "system": platform.platform(), "cpus": os.cpu_count()},
+            "settings": {
+                "embedding_backend": EMBEDDING_BACKEND,
+                "embed_batch_size": EMBED_BATCH_SIZE,
+                "hybrid_search": HYBRID_SEARCH,
+                "vector_store": VECTOR_STORE,
+                "ollama_keep_alive": OLLAMA_KEEP_ALIVE,
+                "reasoning": REASONING,
+                "max_answer_tokens": MAX_ANSWER_TOKENS,
+                "workers": args.workers,
+                "seed": args.seed,
+            },
+            "corpus": corpus,
+            "indexing": bench_indexing(args.workers),
+            "retrieval": bench_retrieval(queries[: args.queries], search_kwargs),
+            "end_to_end": None,
+            "generation": None,
+        }
+        ollama = {
+            "model": USE_MODEL,
+            "ollama": "real" if args.ollama_host else "stub",
+            "stub": {
+                "tokens": args.stub_tokens, "token_ms": args.stub_token_ms, "prefill_ms": args.stub_prefill_ms,
+                "load_ms": args.stub_load_ms, "think_tokens": args.stub_think_tokens,
+            } if stub else None,
+        }
+        if args.e2e:
+            results["end_to_end"] = bench_end_to_end(queries[: args.e2e_queries], search_kwargs)
+            results["end_to_end"].update(ollama)
+        if args.generation:
+            results["generation"] = bench_generation(queries[: args.e2e_queries], search_kwargs)
+            results["generation"].update(ollama)
+    finally:
+        if stub:
+            stub.shutdown()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
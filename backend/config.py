@@ -0,0 +1,41 @@
+import os
+
+# Paths and settings shared by the indexing, retrieval and UI modules.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Both can be moved with environment variables, e.g. by benchmark.py to index a scratch corpus
+DOCUMENT_DIRECTORY = os.environ.get("RAG_DOCUMENT_DIRECTORY", os.path.join(BASE_DIR, 'documents'))
+PERSIST_DIRECTORY = os.environ.get("RAG_PERSIST_DIRECTORY", os.path.join(BASE_DIR, 'chroma_db'))
+SENTENCE_TRANSFORMER_MODEL_DIR = os.path.join(BASE_DIR, "backend/models/all-MiniLM-L6-v2")
+# Lives outside chroma_db so rebuilding the vector store reuses every vector
+EMBEDDING_CACHE_DIRECTORY = os.environ.get("RAG_EMBEDDING_CACHE_DIRECTORY", os.path.join(BASE_DIR, 'embedding_cache'))
+
+# Texts per forward pass of the embedding model
+EMBED_BATCH_SIZE = int(os.environ.get("RAG_EMBED_BATCH_SIZE", "64"))
+# "torch" (fp32 PyTorch), "onnx" (fp32 ONNX Runtime) or "onnx-int8" (dynamically quantized)
+EMBEDDING_BACKEND = os.environ.get("RAG_EMBEDDING_BACKEND", "torch")
+# "chroma" (float32 vectors with an HNSW index) or "quantized" (int8/binary codes in
+# memory-mapped segments with exact rescoring, see quantized_store.py)
+VECTOR_STORE = os.environ.get("RAG_VECTOR_STORE", "chroma")
+
+
+def ollama_url(host=None):
+    """
+    Base URL of the Ollama server from an OLLAMA_HOST value. Like Ollama's own
+    tools, accepts it without a scheme or port ("127.0.0.1:11434", "0.0.0.0"),
+    and maps the 0.0.0.0 bind address to localhost.
+    """
+    host = (host or "").strip().rstrip("/")
+    if not host:
+        return "http://localhost:11434"
+    scheme, separator, address = host.partition("://")
+    if not separator:
+        scheme, address = "http", host
+    address, slash, path = address.partition("/")
+    name, colon, port = address.rpartition(":")
+    if not colon or "]" in port:
+        # No port, or the colons belong to a bracketed IPv6 address
+        name, port = address, "443" if scheme == "https" else "11434"
+    if name in ("", "0.0.0.0", "[::]"):
+        name = "localhost"
+    return f"{scheme}://{name}:{port}{slash}{path}"
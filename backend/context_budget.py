@@ -0,0 +1,143 @@
+import os
+import re
+
+
+# Most prompt tokens are context; this caps what the retrieved chunks may add to it
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKENS", "1500"))
+# Rough characters per token for English text with Llama/Qwen-style BPE vocabularies
+CHARS_PER_TOKEN = 4
+# Chunks from the same page this close together are stitched into one passage
+MERGE_GAP_CHARS = 2
+# Word-trigram Jaccard similarity at which two chunks count as the same passage
+NEAR_DUPLICATE_THRESHOLD = 0.85
+
+_WORDS = re.compile(r"\w+")
+
+
+def estimate_tokens(text):
+    """Cheap token estimate; the model's tokenizer lives in the Ollama server."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _position(doc):
+    """(source, page, start, end) for chunks indexed with start_index, else None."""
+    start = doc.metadata.get("start_index")
+    if start is None or start < 0:
+        return None
+    return doc.metadata.get("source"), doc.metadata.get("page"), start, start + len(doc.page_content)
+
+
+def merge_adjacent(docs):
+    """
+    Stitches chunks that overlap or touch in the same source (and page) into one
+    document, so the splitter's chunk overlap is sent once. The merged document
+    takes the rank of its best chunk; chunks without start_index are kept as is.
+    """
+    from langchain_core.documents import Document
+
+    groups = {}
+    for rank, doc in enumerate(docs):
+        position = _position(doc)
+        key = position[:2] if position else ("", rank)
+        groups.setdefault(key, []).append((rank, position, doc))
+
+    merged = []
+    for members in groups.values():
+        if members[0][1] is None:
+            merged.append((members[0][0], members[0][2]))
+            continue
+        members.sort(key=lambda member: member[1][2])
+        rank, (_, _, _, end), first = members[0]
+        text = first.page_content
+        for other_rank, (_, _, other_start, other_end), other in members[1:]:
+            if other_start > end + MERGE_GAP_CHARS:
+                merged.append((rank, Document(page_content=text, metadata=first.metadata, id=first.id)))
+                rank, end, text, first = other_rank, other_end, other.page_content, other
+                continue
+            if other_end > end:
+                if other_start <= end:
+                    # Text before `end` is already in the passage
+                    text += other.page_content[end - other_start:]
+                else:
+                    # Only the whitespace the splitter stripped lies between them
+                    text += "\n" + other.page_content
+                end = other_end
+            rank = min(rank, other_rank)
+        merged.append((rank, Document(page_content=text, metadata=first.metadata, id=first.id)))
+
+    merged.sort(key=lambda item: item[0])
+    return [doc for _, doc in merged]
+
+
+def _shingles(text):
+    words = _WORDS.findall(text.lower())
+    if len(words) < 3:
+        return {tuple(words)}
+    return set(zip(words, words[1:], words[2:]))
+
+
+def drop_near_duplicates(docs, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Keeps the first (best ranked) of any group of chunks with nearly the same text."""
+    kept, kept_shingles = [], []
+    for doc in docs:
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / max(len(shingles | other), 1) >= threshold for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def pack(docs, budget_tokens=CONTEXT_TOKEN_BUDGET):
+    """
+    Takes documents in rank order while they fit in the token budget, skipping
+    any that would overflow it. If not even the best one fits, it is cut to the budget.
+    """
+    packed, used = [], 0
+    for doc in docs:
+        # Documents are joined with a blank line in the prompt
+        tokens = estimate_tokens(doc.page_content) + 1
+        if used + tokens <= budget_tokens:
+            packed.append(doc)
+            used += tokens
+    if not packed and docs and budget_tokens > 0:
+        from langchain_core.documents import Document
+        best = docs[0]
+        text = best.page_content[: budget_tokens * CHARS_PER_TOKEN]
+        packed, used = [Document(page_content=text, metadata=best.metadata, id=best.id)], estimate_tokens(text)
+    return packed, used
+
+
+def assemble_context(docs, budget_tokens=CONTEXT_TOKEN_BUDGET):
+    """
+    Retrieved chunks -> the documents actually put in the prompt: merged where
+    they overlap, near-duplicates dropped, packed to the token budget.
+    Returns (documents, stats).
+    """
+    merged = merge_adjacent(docs)
+    unique = drop_near_duplicates(merged)
+    packed, tokens = pack(unique, budget_tokens)
+    stats = {
+        "retrieved": len(docs),
+        "merged": len(docs) - len(merged),
+        "duplicates": len(merged) - len(unique),
+        "packed": len(packed),
+        "context_tokens": tokens,
+        "budget_tokens": budget_tokens,
+    }
+    return packed, stats
+
+
+def prompt_token_logger():
+    """Callback handler that prints the prompt and output token counts Ollama reports for each call."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class PromptTokenLogger(BaseCallbackHandler):
+        def on_llm_end(self, response, **kwargs):
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if usage:
+                        print(f"Prompt tokens: {usage['input_tokens']}, output tokens: {usage['output_tokens']}")
+
+    return PromptTokenLogger()
@@ -1,113 +1,334 @@
 import os
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    TextLoader, 
-    UnstructuredWordDocumentLoader, 
-    UnstructuredPowerPointLoader,
-    CSVLoader,
-    UnstructuredExcelLoader
-)
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-
-
-# 1. Paths
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DOCUMENT_DIRECTORY = os.path.join(BASE_DIR, 'documents')
-PERSIST_DIRECTORY = os.path.join(BASE_DIR, 'chroma_db')
-SENTENCE_TRANSFORMER_MODEL_DIR = os.path.join(BASE_DIR, "backend/models/all-MiniLM-L6-v2")
+import time
+import argparse
+from config import DOCUMENT_DIRECTORY, PERSIST_DIRECTORY, EMBED_BATCH_SIZE, EMBEDDING_BACKEND, VECTOR_STORE
+from resources import get_embeddings, get_vectorstore, vectorstore_exists
+from index_manifest import IndexManifest, chunk_id, tenant_of, file_type_of
+from keyword_index import KeywordIndex
+from document_loading import iter_load_and_split
+from streaming import prefetch
+import startup_timing
+import metrics
+
+
+BATCH_SIZE = 5000  # Chroma rejects batches above 5461
+# Parse/split files in this many processes (1 = in-process, no pool)
+INGEST_WORKERS = int(os.environ.get("RAG_INGEST_WORKERS", "1"))
+# Files parsed ahead of the writer; bounds memory regardless of corpus size
+PREFETCH_FILES = 32
+# MiniLM-L6 is small enough that intra-op threads stop paying off past ~8 cores;
+# one core is left for the Chroma writer running alongside.
+EMBED_THREADS = int(os.environ.get("RAG_EMBED_THREADS", str(min(8, max(1, (os.cpu_count() or 2) - 1)))))
 # Ensure directories exist
 os.makedirs(DOCUMENT_DIRECTORY, exist_ok=True)
 
-# 2. Initialize Components
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=800,
-    chunk_overlap=100,
-    length_function=len,
-)
-
-embeddings = HuggingFaceEmbeddings(
-    model_name=SENTENCE_TRANSFORMER_MODEL_DIR
-)
-
-# Connect to existing db or create new if it does not exist
-db = Chroma(
-        persist_directory=PERSIST_DIRECTORY,
-        embedding_function=embeddings, 
+def __getattr__(name):
+    # `db` and `embeddings` are shared with retrieval_pipeline and app.py, and only
+    # loaded when first used so a run with nothing to index never imports torch.
+    if name == "db":
+        return get_vectorstore()
+    if name == "embeddings":
+        return get_embeddings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _ignore_progress(event, **fields):
+    pass
+
+def iter_documents(file_paths, workers=INGEST_WORKERS, progress=_ignore_progress):
+    """
+    Loads and splits the given documents, in parallel when workers > 1.
+    Yields (file path, chunks) for each file as soon as it is ready.
+    A failing file is reported and skipped without affecting the others.
+    """
+    timings = []
+    start = time.perf_counter()
+
+    for result in iter_load_and_split(file_paths, workers=workers):
+        file = os.path.basename(result["path"])
+        if result["chunks"] is None:
+            if result["unsupported"]:
+                print(f"Could not process {file}. {result['error']}")
+            else:
+                print(f"Error loading {file}: {result['error']}")
+            progress("file_failed", path=result["path"], error=result["error"])
+            metrics.count("files_failed")
+            continue
+        elapsed = result["load_seconds"] + result["split_seconds"]
+        metrics.observe("load", result["load_seconds"])
+        metrics.observe("split", result["split_seconds"])
+        timings.append((elapsed, file))
+        print(
+            f"Successfully loaded: {file} ({len(result['chunks'])} chunks, "
+            f"load {result['load_seconds']:.2f}s, split {result['split_seconds']:.2f}s)"
+        )
+        progress("file_loaded", path=result["path"], chunks=len(result["chunks"]), seconds=elapsed)
+        yield result["path"], result["chunks"]
+
+    if timings:
+        wall = time.perf_counter() - start
+        busy = sum(t for t, _ in timings)
+        print(f"Loaded {len(timings)} files in {wall:.2f}s ({busy:.2f}s of per-file work) with {workers} worker(s)")
+        slowest = sorted(timings, reverse=True)[:5]
+        print("Slowest files: " + ", ".join(f"{file} ({t:.2f}s)" for t, file in slowest))
+
+def chunk_tags(file_path, directory=DOCUMENT_DIRECTORY):
+    """Filterable metadata of every chunk of a file: its tenant (collection) and file type."""
+    return {"tenant": tenant_of(file_path, directory), "file_type": file_type_of(file_path)}
+
+def iter_chunk_batches(documents, new_files, batch_size=BATCH_SIZE):
+    """
+    Regroups per-file chunks into write batches of at most batch_size.
+    Yields (chunks, ids, finished) where finished holds (path, size, mtime, hash, ids)
+    for every file whose last chunk is in this batch, i.e. files that are fully
+    stored once the batch has been written.
+    """
+    chunks, ids, finished = [], [], []
+
+    for file_path, file_chunks in documents:
+        _, size, mtime, content_hash = new_files[file_path]
+        # Every chunk gets an ID derived from its file's content hash
+        file_ids = [chunk_id(content_hash, i) for i in range(len(file_chunks))]
+        tags = chunk_tags(file_path)
+        for chunk in file_chunks:
+            chunk.metadata["source"] = file_path
+            chunk.metadata["content_hash"] = content_hash
+            chunk.metadata.update(tags)
+
+        entry = (file_path, size, mtime, content_hash, file_ids)
+        pos = 0
+        while pos < len(file_chunks):
+            take = min(batch_size - len(chunks), len(file_chunks) - pos)
+            chunks.extend(file_chunks[pos : pos + take])
+            ids.extend(file_ids[pos : pos + take])
+            pos += take
+            if pos == len(file_chunks):
+                finished.append(entry)
+            if len(chunks) == batch_size:
+                yield chunks, ids, finished
+                chunks, ids, finished = [], [], []
+        if not file_chunks:
+            finished.append(entry)
+
+    if chunks or finished:
+        yield chunks, ids, finished
+
+def iter_embedded_batches(batches, embeddings=None):
+    """
+    Embeds each write batch. Yields (chunks, ids, vectors, finished, seconds).
+    Run behind prefetch() so the next batch is encoded while the previous one is written.
+    """
+    for chunks, ids, finished in batches:
+        start = time.perf_counter()
+        vectors = []
+        if chunks:
+            # The model is only loaded once there is something to embed
+            embeddings = embeddings or get_embeddings()
+            vectors = embeddings.embed_documents([chunk.page_content for chunk in chunks])
+        seconds = time.perf_counter() - start
+        if chunks:
+            metrics.observe("embed_documents", seconds)
+        yield chunks, ids, vectors, finished, seconds
+
+def write_embedded(db, chunks, ids, vectors):
+    """Upserts chunks with precomputed vectors, bypassing the store's own embedding call."""
+    db._collection.upsert(
+        ids=ids,
+        embeddings=vectors,
+        documents=[chunk.page_content for chunk in chunks],
+        metadatas=[chunk.metadata for chunk in chunks],
     )
 
-def load_documents(directory, existing_db):
+def evict_chunks(db, stale_ids, repoints, keyword_index=None):
+    """Deletes chunks of removed/changed content and re-cites chunks kept alive by a duplicate file."""
+    for i in range(0, len(stale_ids), BATCH_SIZE):
+        batch = stale_ids[i : i + BATCH_SIZE]
+        if keyword_index is not None:
+            # The keyword index needs the original texts and tags to drop their postings
+            existing = db._collection.get(ids=batch, include=["documents", "metadatas"])
+            keyword_index.remove(existing["ids"], existing["documents"], existing["metadatas"])
+        db.delete(ids=batch)
+
+    for ids, new_source in repoints:
+        existing = db._collection.get(ids=ids, include=["documents", "metadatas"])
+        metadatas = [{**m, "source": new_source, **chunk_tags(new_source)} for m in existing["metadatas"]]
+        if keyword_index is not None:
+            # The new source may have another tenant or file type, which the postings are tagged with
+            keyword_index.remove(existing["ids"], existing["documents"], existing["metadatas"])
+            keyword_index.add(existing["ids"], existing["documents"], metadatas)
+        db._collection.update(ids=existing["ids"], metadatas=metadatas)
+
+def backfill_chunk_tags(db, page_size=BATCH_SIZE):
+    """
+    One-time migration for stores indexed before chunks were tagged with their
+    tenant and file type. Tags are derived from each chunk's source path.
+    """
+    offset = 0
+    tagged = 0
+    while True:
+        page = db._collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids, metadatas = [], []
+        for item_id, metadata in zip(page["ids"], page["metadatas"]):
+            if metadata and "source" in metadata and "tenant" not in metadata:
+                ids.append(item_id)
+                metadatas.append({**metadata, **chunk_tags(metadata["source"])})
+        if ids:
+            db._collection.update(ids=ids, metadatas=metadatas)
+            tagged += len(ids)
+        offset += len(page["ids"])
+    if tagged:
+        print(f"Tagged {tagged} previously indexed chunk(s) with their tenant and file type")
+
+def process_documents(db=None, workers=INGEST_WORKERS, embed_threads=EMBED_THREADS, progress=None):
     """
-    Loads documents from the specified directory with support for multiple formats.
-    Skips documents that have already been embedded in vector store.
+    Brings the vector store in line with the documents folder.
+    Only new or modified files are embedded, identical content is indexed once,
+    and chunks of modified or deleted files are evicted by ID. The keyword index
+    is kept in step with the store.
+    The shared vector store is used when db is None, and only loaded if needed.
+
+    `progress(event, **fields)` is called as work completes, possibly from a loader
+    thread: "scanned" (new, duplicates, changed, removed), "file_loaded" (path, chunks,
+    seconds), "file_failed" (path, error), "batch" (chunks, embed_seconds, write_seconds),
+    "file_indexed" (path, chunks), "file_skipped" (path, reason) and "finished" (files, chunks).
     """
-    print(f"Scanning directory: {os.path.abspath(directory)}")
-    documents = []
-    
-    existing_items = existing_db.get()
-    existing_sources = set()
-    
-    if existing_items and 'metadatas' in existing_items:
-        existing_sources = {m['source'] for m in existing_items['metadatas'] if 'source' in m}
-
-    for root, _, files in os.walk(directory):
-        for file in files:
-            file_path = os.path.abspath(os.path.join(root, file))
-            file_lower = file.lower()
-            
-            if file_path in existing_sources:
-                print(f"Skipping (already indexed): {file}")
-                continue
-            
-            try:
-                # Handle different file types
-                if file_lower.endswith(".pdf"):
-                    loader = PyPDFLoader(file_path)
-                elif file_lower.endswith(".docx") or file_lower.endswith(".doc"):
-                    loader = UnstructuredWordDocumentLoader(file_path)
-                elif file_lower.endswith(".txt"):
-                    loader = TextLoader(file_path, encoding='utf-8')
-                elif file_lower.endswith(".pptx"):
-                    loader = UnstructuredPowerPointLoader(file_path)
-                elif file_lower.endswith(".csv"):
-                    loader = CSVLoader(file_path)
-                elif file_lower.endswith("xlsx") or file_lower.endswith('xls'):
-                    loader = UnstructuredExcelLoader(file_path)
-                else:
-                    extension = os.path.splitext(file)[1]
-                    print(f"Could not process {file}. '{extension}' files not supported")
-                    continue
-                
-                print(f"Successfully loaded: {file}")
-                documents.extend(loader.load())
-            except Exception as e:
-                print(f"Error loading {file}: {str(e)}")
-                
-    return documents
-
-def process_documents(db):
-    raw_documents = load_documents(DOCUMENT_DIRECTORY, db)
-    
-    if not raw_documents:
+    with metrics.trace("process_documents", workers=workers, embed_threads=embed_threads):
+        _process_documents(db, workers, embed_threads, progress or _ignore_progress)
+
+def _process_documents(db, workers, embed_threads, progress):
+    from embedding_backends import set_embedding_threads
+    # Before anything loads the model: ONNX Runtime sizes its thread pool when the session is created
+    set_embedding_threads(embed_threads)
+    print(f"Scanning directory: {os.path.abspath(DOCUMENT_DIRECTORY)}")
+    manifest = IndexManifest(PERSIST_DIRECTORY)
+    # The manifest records what is in one particular store; manifests older than the setting describe Chroma
+    indexed_into = manifest.get_meta("vector_store") or ("chroma" if manifest.exists() else VECTOR_STORE)
+    if indexed_into != VECTOR_STORE:
+        manifest.close()
+        raise RuntimeError(
+            f"The index was built with the '{indexed_into}' vector store, not '{VECTOR_STORE}'. "
+            "Run 'python backend/quantized_store.py --import-chroma' to copy a Chroma index, "
+            "or delete chroma_db to index the documents again."
+        )
+    manifest.set_meta("vector_store", VECTOR_STORE)
+    store_exists = vectorstore_exists()
+    if not manifest.exists() and store_exists:
+        db = db or get_vectorstore()
+        if db._collection.count() > 0:
+            manifest.bootstrap_from_store(db, DOCUMENT_DIRECTORY)
+    if not manifest.get_meta("chunk_tags") and store_exists:
+        db = db or get_vectorstore()
+        backfill_chunk_tags(db)
+    manifest.set_meta("chunk_tags", "1")
+    keyword_index = KeywordIndex(PERSIST_DIRECTORY)
+    if not keyword_index.exists() and store_exists:
+        db = db or get_vectorstore()
+        if db._collection.count() > 0:
+            keyword_index.build_from_store(db)
+
+    with metrics.stage("scan"):
+        changes = manifest.scan(DOCUMENT_DIRECTORY)
+    print(
+        f"{changes['unchanged']} unchanged, {len(changes['new'])} new, "
+        f"{len(changes['duplicates'])} duplicate, {len(changes['changed'])} modified, "
+        f"{len(changes['removed'])} removed"
+    )
+    progress(
+        "scanned", new=len(changes["new"]), duplicates=len(changes["duplicates"]),
+        changed=len(changes["changed"]), removed=len(changes["removed"]),
+    )
+
+    for file_path in changes["changed"] + changes["removed"]:
+        manifest.forget(file_path)
+
+    new_files = {item[0]: item for item in changes["new"]}
+    # Load -> split -> write as a stream. Loading runs ahead of the writer by at most
+    # PREFETCH_FILES files, and the manifest is committed after every batch so an
+    # interrupted run resumes with the files it had not finished.
+    documents = prefetch(iter_documents(list(new_files), workers=workers, progress=progress), maxsize=PREFETCH_FILES)
+    # Embedding of batch N+1 overlaps with the Chroma write of batch N
+    embedded = prefetch(iter_embedded_batches(iter_chunk_batches(documents, new_files)), maxsize=1)
+    total_chunks = 0
+    total_files = 0
+    embed_seconds = 0.0
+    write_seconds = 0.0
+    start = time.perf_counter()
+
+    for batch_number, (chunks, ids, vectors, finished, seconds) in enumerate(embedded, 1):
+        if chunks:
+            db = db or get_vectorstore()
+            write_start = time.perf_counter()
+            with metrics.stage("chroma_write"):
+                write_embedded(db, chunks, ids, vectors)
+            with metrics.stage("keyword_write"):
+                keyword_index.add(ids, [chunk.page_content for chunk in chunks], [chunk.metadata for chunk in chunks])
+            write_time = time.perf_counter() - write_start
+            metrics.count("chunks_indexed", len(chunks))
+            embed_seconds += seconds
+            write_seconds += write_time
+            print(
+                f"Processing batch {batch_number} ({len(chunks)} chunks): "
+                f"embed {len(chunks) / max(seconds, 1e-9):.0f} chunks/s, write {write_time:.2f}s"
+            )
+            progress("batch", chunks=len(chunks), embed_seconds=seconds, write_seconds=write_time)
+        for file_path, size, mtime, content_hash, file_ids in finished:
+            manifest.record_file(file_path, size, mtime, content_hash)
+            manifest.record_content(content_hash, file_path, file_ids)
+        # Keyword postings are committed first; re-adding them after a crash is a no-op
+        keyword_index.save()
+        manifest.save()
+        for file_path, _, _, _, file_ids in finished:
+            progress("file_indexed", path=file_path, chunks=len(file_ids))
+        total_chunks += len(chunks)
+        total_files += len(finished)
+        metrics.count("files_indexed", len(finished))
+
+    if total_chunks:
+        wall = time.perf_counter() - start
+        print(
+            f"Embedded {total_chunks} chunks at {total_chunks / max(embed_seconds, 1e-9):.0f} chunks/s "
+            f"({embed_seconds:.2f}s embedding, {write_seconds:.2f}s writing, {wall:.2f}s wall, "
+            f"{total_chunks / max(wall, 1e-9):.0f} chunks/s end to end, {EMBEDDING_BACKEND}, {embed_threads} threads, "
+            f"batch size {EMBED_BATCH_SIZE})"
+        )
+        print(f"Embedding cache: {get_embeddings().hits} hits, {get_embeddings().misses} misses")
+
+    if not total_files:
         print("\nNo new documents found! Check if your files are in the 'documents' folder.")
         print(f"Expected path: {os.path.abspath(DOCUMENT_DIRECTORY)}")
     else:
-        # Split
-        print(f"Splitting {len(raw_documents)} new documents...")
-        split_docs = text_splitter.split_documents(raw_documents)
-        
-        # 3. Index with Batching to avoid the 5461 limit
-        batch_size = 5000  # Staying safely under the 5461 limit
-        print(f"Indexing {len(split_docs)} chunks into Chroma in batches...")
-        
-        for i in range(0, len(split_docs), batch_size):
-            batch = split_docs[i : i + batch_size]
-            print(f"Processing batch {i // batch_size + 1} ({len(batch)} chunks)...")
-            db.add_documents(batch)
-        
-        print(f"✅ Successfully indexed to Vector Store!!")
+        print(f"✅ Successfully indexed {total_files} files ({total_chunks} chunks) to Vector Store!!")
+
+    for file_path, size, mtime, content_hash in changes["duplicates"]:
+        # Only adopt content that actually made it into the store
+        if manifest.has_content(content_hash):
+            print(f"Skipping (identical content already indexed): {os.path.basename(file_path)}")
+            manifest.record_file(file_path, size, mtime, content_hash)
+            progress("file_skipped", path=file_path, reason="identical content already indexed")
+
+    stale_ids, repoints = manifest.collect_garbage()
+    if stale_ids or repoints:
+        if stale_ids:
+            print(f"Evicting {len(stale_ids)} stale chunks...")
+        with metrics.stage("evict"):
+            evict_chunks(db or get_vectorstore(), stale_ids, repoints, keyword_index)
+        metrics.count("chunks_evicted", len(stale_ids))
+
+    keyword_index.save()
+    manifest.save()
+    keyword_index.close()
+    manifest.close()
+    progress("finished", files=total_files, chunks=total_chunks)
+
 # 3. Main Execution Logic
 
 if __name__ == "__main__":
-    process_documents(db)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Index the documents folder into the vector store.")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="processes used to parse and split files (default: %(default)s)")
+    parser.add_argument("--embed-threads", type=int, default=EMBED_THREADS,
+                        help="CPU threads used by the embedding model (default: %(default)s)")
+    args = parser.parse_args()
+    process_documents(workers=args.workers, embed_threads=args.embed_threads)
+    startup_timing.report()
\ No newline at end of file
@@ -0,0 +1,247 @@
+import os
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Kept free of embeddings and vector store setup so worker processes start cheaply.
+# Loaders and the splitter are imported on first use, so scanning a folder with
+# nothing new to index never pays for them.
+
+# Read row by row and packed into header-carrying chunks instead of one document per row
+TABLE_EXTENSIONS = (".csv", ".xlsx", ".xlsm", ".xls")
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".doc", ".txt", ".pptx") + TABLE_EXTENSIONS
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+TABLE_CELL_SEPARATOR = " | "
+# Share of a chunk a table header may take; longer headers are cut to fit
+TABLE_HEADER_SHARE = 0.25
+# Bytes of a CSV file used to detect its delimiter and quoting
+CSV_SNIFF_BYTES = 64 * 1024
+
+_text_splitter = None
+
+def get_text_splitter():
+    global _text_splitter
+    if _text_splitter is None:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        _text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            length_function=len,
+            # Lets the context assembly stitch overlapping neighbours back together
+            add_start_index=True,
+        )
+    return _text_splitter
+
+def load_document(file_path):
+    """
+    Loads a single document with the loader matching its extension.
+    Returns None if the file type is not supported. Tables are read by load_table.
+    """
+    file = os.path.basename(file_path)
+    file_lower = file.lower()
+    if not file_lower.endswith(SUPPORTED_EXTENSIONS) or file_lower.endswith(TABLE_EXTENSIONS):
+        return None
+
+    from langchain_community import document_loaders
+
+    # Handle different file types
+    if file_lower.endswith(".pdf"):
+        loader = document_loaders.PyPDFLoader(file_path)
+    elif file_lower.endswith(".docx") or file_lower.endswith(".doc"):
+        loader = document_loaders.UnstructuredWordDocumentLoader(file_path)
+    elif file_lower.endswith(".txt"):
+        loader = document_loaders.TextLoader(file_path, encoding='utf-8')
+    elif file_lower.endswith(".pptx"):
+        loader = document_loaders.UnstructuredPowerPointLoader(file_path)
+    else:
+        return None
+
+    return loader.load()
+
+def _table_line(cells):
+    return TABLE_CELL_SEPARATOR.join(" ".join(str(cell).split()) if cell is not None else "" for cell in cells)
+
+def _fit_header(header, chunk_size):
+    """The header, cut at a cell boundary if it would take more than its share of a chunk."""
+    limit = int(chunk_size * TABLE_HEADER_SHARE)
+    if len(header) <= limit:
+        return header
+    cut = header.rfind(TABLE_CELL_SEPARATOR, 0, limit - 2)
+    return header[: cut if cut > 0 else limit - 2] + " …"
+
+def _split_line(line, size):
+    """Pieces of at most `size` characters of an over-long row, split between cells where possible."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=size,
+        chunk_overlap=min(CHUNK_OVERLAP, size // 4),
+        separators=[TABLE_CELL_SEPARATOR, " ", ""],
+        keep_separator=False,
+    )
+    return splitter.split_text(line)
+
+def pack_rows(rows, metadata, chunk_size=CHUNK_SIZE):
+    """
+    Packs (row number, cells) pairs of one table into Documents of at most
+    chunk_size characters. The first row is the header; it opens every chunk
+    so each one can be read on its own, and is cut short if it is too long for
+    that. Each chunk records the table rows it holds as row_start and row_end.
+    A row too long for a chunk is split into several, each with the header.
+    """
+    from langchain_core.documents import Document
+
+    header = None
+    lines, first, last, size = [], None, None, 0
+    chunks = []
+
+    def add(body, row_start, row_end):
+        text = header + "\n" + body
+        chunks.append(Document(page_content=text, metadata={**metadata, "row_start": row_start, "row_end": row_end}))
+
+    for number, cells in rows:
+        # Trailing empty cells are formatting, not data
+        while cells and (cells[-1] is None or str(cells[-1]).strip() == ""):
+            cells = cells[:-1]
+        if not cells:
+            continue
+        if header is None:
+            header = _table_line(cell if cell not in (None, "") else f"column_{i + 1}" for i, cell in enumerate(cells))
+            header = _fit_header(header, chunk_size)
+            room = chunk_size - len(header) - 1
+            continue
+        line = _table_line(cells)
+        if lines and size + len(line) + 1 > chunk_size:
+            add("\n".join(lines), first, last)
+            lines = []
+        if len(line) > room:
+            for piece in _split_line(line, room):
+                add(piece, number, number)
+            continue
+        if not lines:
+            first, size = number, len(header)
+        lines.append(line)
+        last = number
+        size += len(line) + 1
+    if lines:
+        add("\n".join(lines), first, last)
+    return chunks
+
+def iter_csv_rows(file_path):
+    """
+    Yields (line number, cells) for every record of a CSV file, read as a stream.
+    The line number is the one the record starts on; quoted fields may span several.
+    """
+    with open(file_path, encoding="utf-8-sig", errors="replace", newline="") as f:
+        sample = f.read(CSV_SNIFF_BYTES)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        start = 1
+        for cells in reader:
+            yield start, cells
+            start = reader.line_num + 1
+
+def load_table(file_path, chunk_size=CHUNK_SIZE):
+    """
+    Chunks of a CSV file or of every sheet of an Excel workbook, packed by pack_rows.
+    Row numbers are the spreadsheet's (CSV line numbers), and workbook chunks carry their sheet name.
+    """
+    file_lower = file_path.lower()
+    if file_lower.endswith(".csv"):
+        return pack_rows(iter_csv_rows(file_path), {}, chunk_size)
+
+    if file_lower.endswith(".xls"):
+        import xlrd
+        # on_demand loads each sheet when it is read; legacy workbooks have no read-only streaming
+        workbook = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            chunks = []
+            for index in range(workbook.nsheets):
+                sheet = workbook.sheet_by_index(index)
+                rows = ((number + 1, sheet.row_values(number)) for number in range(sheet.nrows))
+                chunks.extend(pack_rows(rows, {"sheet": sheet.name}, chunk_size))
+                workbook.unload_sheet(index)
+            return chunks
+        finally:
+            workbook.release_resources()
+
+    from openpyxl import load_workbook
+    # read_only streams rows from the XML instead of building the whole sheet in memory
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        chunks = []
+        for sheet in workbook.worksheets:
+            rows = ((number, list(cells)) for number, cells in enumerate(sheet.iter_rows(values_only=True), 1))
+            chunks.extend(pack_rows(rows, {"sheet": sheet.title}, chunk_size))
+        return chunks
+    finally:
+        workbook.close()
+
+def load_and_split(file_path):
+    """
+    Loads and splits one file. Never raises, so one bad file cannot take down
+    a worker pool. Returns a dict with the file path, its chunks (None when the
+    file could not be used), an error message if any, and load/split timings.
+    """
+    result = {"path": file_path, "chunks": None, "error": None, "unsupported": False, "load_seconds": 0.0, "split_seconds": 0.0}
+    try:
+        start = time.perf_counter()
+        if file_path.lower().endswith(TABLE_EXTENSIONS):
+            # Tables are chunked while they are read
+            result["chunks"] = load_table(file_path)
+            result["load_seconds"] = time.perf_counter() - start
+            return result
+        documents = load_document(file_path)
+        result["load_seconds"] = time.perf_counter() - start
+        if documents is None:
+            extension = os.path.splitext(file_path)[1]
+            result["error"] = f"'{extension}' files not supported"
+            result["unsupported"] = True
+            return result
+
+        start = time.perf_counter()
+        result["chunks"] = get_text_splitter().split_documents(documents)
+        result["split_seconds"] = time.perf_counter() - start
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def iter_load_and_split(file_paths, workers=1):
+    """
+    Yields load_and_split results for the given files.
+    With workers > 1 files are parsed in a process pool and yielded as they finish.
+    At most two files per worker are in flight, so finished results never pile up
+    faster than the caller consumes them.
+    """
+    if workers <= 1:
+        for file_path in file_paths:
+            yield load_and_split(file_path)
+        return
+
+    remaining = iter(file_paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def submit_next():
+            file_path = next(remaining, None)
+            if file_path is not None:
+                pending[executor.submit(load_and_split, file_path)] = file_path
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # A worker died (e.g. a parser crashed the process)
+                    result = {"path": file_path, "chunks": None, "error": str(e), "unsupported": False, "load_seconds": 0.0, "split_seconds": 0.0}
+                submit_next()
+                yield result
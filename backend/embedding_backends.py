@@ -0,0 +1,191 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from embedding_cache import CachedEmbeddings
+from config import PERSIST_DIRECTORY, SENTENCE_TRANSFORMER_MODEL_DIR, EMBEDDING_BACKEND, VECTOR_STORE
+
+
+# Exported ONNX models are cached next to the original and reused on every start
+ONNX_MODEL_DIR = SENTENCE_TRANSFORMER_MODEL_DIR + "-onnx"
+
+# Instruction set the int8 model is quantized for: "arm64", "avx2", "avx512" or "avx512_vnni"
+ONNX_QUANTIZATION = os.environ.get("RAG_ONNX_QUANTIZATION", "avx2")
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# CPU threads for encoding, set by set_embedding_threads; None keeps the runtime's default
+_embed_threads = None
+
+
+def onnx_file_name(backend, quantization=ONNX_QUANTIZATION):
+    if backend == "onnx-int8":
+        return f"onnx/model_qint8_{quantization}.onnx"
+    return "onnx/model.onnx"
+
+
+def export_onnx(backend, model_dir=SENTENCE_TRANSFORMER_MODEL_DIR, onnx_dir=ONNX_MODEL_DIR,
+                quantization=ONNX_QUANTIZATION):
+    """
+    Exports the sentence-transformers model to ONNX (and optionally int8) once.
+    Later calls find the files on disk and return immediately.
+    """
+    if os.path.exists(os.path.join(onnx_dir, onnx_file_name(backend, quantization))):
+        return onnx_dir
+
+    try:
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    except ImportError as e:
+        raise ImportError("ONNX backends need 'pip install sentence-transformers[onnx]'") from e
+
+    if not os.path.exists(os.path.join(onnx_dir, onnx_file_name("onnx"))):
+        print(f"Exporting {os.path.basename(model_dir)} to ONNX...")
+        SentenceTransformer(model_dir, backend="onnx", device="cpu").save_pretrained(onnx_dir)
+
+    if backend == "onnx-int8":
+        print(f"Quantizing ONNX model to int8 ({quantization})...")
+        model = SentenceTransformer(onnx_dir, backend="onnx", device="cpu")
+        export_dynamic_quantized_onnx_model(model, quantization, onnx_dir)
+
+    return onnx_dir
+
+
+def set_embedding_threads(threads):
+    """
+    Caps the CPU threads used for encoding. torch applies it process-wide, also to
+    a model already loaded; an ONNX Runtime session sizes its thread pool when it
+    is created, so for the ONNX backends it applies to models loaded afterwards.
+    Never imports torch itself.
+    """
+    global _embed_threads
+    _embed_threads = threads
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def onnx_session_options(threads=None):
+    """ONNX Runtime session options with `threads` intra-op threads (the default, all cores, if None)."""
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    return options
+
+
+def load_base_embeddings(backend=EMBEDDING_BACKEND, encode_kwargs=None):
+    """Builds the uncached HuggingFaceEmbeddings for the given backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {BACKENDS}")
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if backend == "torch":
+        embeddings = HuggingFaceEmbeddings(
+            model_name=SENTENCE_TRANSFORMER_MODEL_DIR,
+            encode_kwargs=encode_kwargs or {},
+        )
+        if _embed_threads:
+            import torch
+            torch.set_num_threads(_embed_threads)
+        return embeddings
+
+    onnx_dir = export_onnx(backend)
+    return HuggingFaceEmbeddings(
+        model_name=onnx_dir,
+        model_kwargs={
+            "backend": "onnx",
+            "device": "cpu",
+            "model_kwargs": {
+                "file_name": onnx_file_name(backend),
+                "provider": "CPUExecutionProvider",
+                "session_options": onnx_session_options(_embed_threads),
+            },
+        },
+        encode_kwargs=encode_kwargs or {},
+    )
+
+
+def load_embeddings(cache_directory, backend=EMBEDDING_BACKEND, encode_kwargs=None):
+    """
+    Embedding model for the given backend, behind the on-disk embedding cache.
+    Each backend gets its own cache keys since their vectors are not identical.
+    """
+    model_id = os.path.basename(SENTENCE_TRANSFORMER_MODEL_DIR)
+    if backend != "torch":
+        model_id = f"{model_id}:{backend}"
+        if backend == "onnx-int8":
+            model_id = f"{model_id}:{ONNX_QUANTIZATION}"
+    return CachedEmbeddings(load_base_embeddings(backend, encode_kwargs), cache_directory, model_id=model_id)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def check_parity(texts, backend, queries=50, k=10):
+    """
+    Compares a backend against the fp32 PyTorch model on the same texts.
+    Reports per-text cosine similarity between the two vectors, recall@k of
+    the candidate's nearest neighbours against fp32's, and encode speed.
+    """
+    reference_model = load_base_embeddings("torch")
+    candidate_model = load_base_embeddings(backend)
+
+    start = time.perf_counter()
+    reference = _normalize(reference_model.embed_documents(texts))
+    reference_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    candidate = _normalize(candidate_model.embed_documents(texts))
+    candidate_seconds = time.perf_counter() - start
+
+    cosine = np.sum(reference * candidate, axis=1)
+
+    # Use the first texts as queries against the whole set, excluding themselves
+    n_queries = min(queries, len(texts))
+    k = min(k, len(texts) - 1)
+    ref_scores = reference[:n_queries] @ reference.T
+    cand_scores = candidate[:n_queries] @ candidate.T
+    np.fill_diagonal(ref_scores, -np.inf)
+    np.fill_diagonal(cand_scores, -np.inf)
+    ref_top = np.argsort(-ref_scores, axis=1)[:, :k]
+    cand_top = np.argsort(-cand_scores, axis=1)[:, :k]
+    recall = np.mean([len(set(r) & set(c)) / k for r, c in zip(ref_top, cand_top)])
+
+    return {
+        "backend": backend,
+        "texts": len(texts),
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        f"recall@{k}": float(recall),
+        "torch_texts_per_sec": len(texts) / reference_seconds,
+        f"{backend}_texts_per_sec": len(texts) / candidate_seconds,
+    }
+
+
+def sample_texts(persist_directory, limit):
+    """Chunk texts already stored in the vector store, read without the embedding model."""
+    if VECTOR_STORE == "quantized":
+        from quantized_store import QuantizedCollection, quantized_directory
+        collection = QuantizedCollection(quantized_directory(persist_directory))
+    else:
+        import chromadb
+        client = chromadb.PersistentClient(path=persist_directory)
+        collection = client.get_collection("langchain")
+    return collection.get(limit=limit, include=["documents"])["documents"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and check ONNX embedding backends.")
+    parser.add_argument("--backend", choices=BACKENDS[1:], default="onnx-int8")
+    parser.add_argument("--sample", type=int, default=1000, help="chunks from chroma_db to compare on")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    export_onnx(args.backend)
+    texts = sample_texts(PERSIST_DIRECTORY, args.sample)
+    if len(texts) < 2:
+        print("Index some documents first; the parity check samples chunks from chroma_db.")
+    else:
+        for name, value in check_parity(texts, args.backend, k=args.k).items():
+            print(f"{name}: {value:.4f}" if isinstance(value, float) else f"{name}: {value}")
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+import metrics
+
+
+INDEX_FILENAME = "index.sqlite3"
+VECTORS_FILENAME = "vectors.f32"
+# Query vectors are kept in memory only: questions are mostly one-off, and
+# persisting them would grow the cache file without bound
+QUERY_CACHE_SIZE = int(os.environ.get("RAG_QUERY_CACHE_SIZE", "1024"))
+
+
+class EmbeddingCache:
+    """
+    On-disk map of sha256(model id + text) -> embedding vector.
+
+    Vectors are appended as raw float32 rows to a single file that is read back
+    through a memory map; a SQLite table maps each key to its row number. Writers
+    in different processes are serialised by SQLite's write lock, and the next row
+    is always derived from the file size, so a crash mid-append only leaves unused bytes.
+    """
+
+    def __init__(self, cache_directory, model_id):
+        os.makedirs(cache_directory, exist_ok=True)
+        self.model_id = model_id
+        self.vectors_path = os.path.join(cache_directory, VECTORS_FILENAME)
+        self.conn = sqlite3.connect(
+            os.path.join(cache_directory, INDEX_FILENAME), check_same_thread=False, isolation_level=None
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS vectors (key BLOB PRIMARY KEY, row INTEGER NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.lock = threading.Lock()
+        self.dim = self._get_dim()
+        self._memmap = None
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode("utf-8")).digest()
+
+    def _get_dim(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        return int(row[0]) if row else None
+
+    def _rows(self):
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dim * 4)
+
+    def _vectors(self, max_row):
+        """Memory map covering at least rows [0, max_row]; remapped only when the file has grown."""
+        if self._memmap is None or self._memmap.shape[0] <= max_row:
+            self._memmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._rows(), self.dim))
+        return self._memmap
+
+    def get_many(self, keys):
+        """Returns {key: vector} for the keys that are cached."""
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i : i + 500]
+                placeholders = ",".join("?" * len(part))
+                found.update(self.conn.execute(
+                    f"SELECT key, row FROM vectors WHERE key IN ({placeholders})", part
+                ).fetchall())
+            if not found:
+                return {}
+            rows = np.fromiter(found.values(), dtype=np.int64, count=len(found))
+            vectors = np.asarray(self._vectors(int(rows.max()))[rows])
+        return dict(zip(found.keys(), vectors))
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.dim is None:
+                    self.dim = self._get_dim() or vectors.shape[1]
+                    self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+                if vectors.shape[1] != self.dim:
+                    raise ValueError(f"Embedding cache holds {self.dim}-dim vectors, got {vectors.shape[1]}")
+                start_row = self._rows()
+                with open(self.vectors_path, "ab") as f:
+                    f.seek(start_row * self.dim * 4)
+                    f.truncate()
+                    f.write(vectors.tobytes())
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO vectors (key, row) VALUES (?, ?)",
+                    ((key, start_row + i) for i, key in enumerate(keys)),
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model with an EmbeddingCache. Only texts that were never
+    embedded by the same model are sent to it; repeated texts within a call are
+    embedded once. Document chunks are cached on disk; query vectors go to an
+    in-memory LRU of `query_cache_size` entries.
+    """
+
+    def __init__(self, embeddings, cache_directory, model_id, query_cache_size=QUERY_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.cache = EmbeddingCache(cache_directory, model_id)
+        self.query_cache_size = query_cache_size
+        self.query_vectors = OrderedDict()
+        self.query_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, hits, misses):
+        self.hits += hits
+        self.misses += misses
+        metrics.count("embedding_cache_hits", hits)
+        metrics.count("embedding_cache_misses", misses)
+
+    def embed_documents(self, texts):
+        keys = [self.cache.key(text) for text in texts]
+        cached = self.cache.get_many(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing), new_vectors)
+            cached.update(zip(missing, np.asarray(new_vectors, dtype=np.float32)))
+
+        self._count(len(texts) - len(missing), len(missing))
+        return [cached[key].tolist() for key in keys]
+
+    def _embed_queries(self, texts, embed):
+        found = {}
+        with self.query_lock:
+            for text in texts:
+                if text in self.query_vectors:
+                    self.query_vectors.move_to_end(text)
+                    found[text] = self.query_vectors[text]
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+
+        if missing:
+            new_vectors = [list(vector) for vector in embed(missing)]
+            found.update(zip(missing, new_vectors))
+            with self.query_lock:
+                self.query_vectors.update(zip(missing, new_vectors))
+                while len(self.query_vectors) > self.query_cache_size:
+                    self.query_vectors.popitem(last=False)
+
+        self._count(len(texts) - len(missing), len(missing))
+        return [list(found[text]) for text in texts]
+
+    def embed_queries(self, texts):
+        """
+        Embeds several queries in one model call, sharing cache entries with embed_query.
+        Sentence-transformers models encode queries and documents the same way.
+        """
+        return self._embed_queries(texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed_queries([text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
@@ -0,0 +1,113 @@
+import os
+import time
+import threading
+
+from config import DOCUMENT_DIRECTORY, PERSIST_DIRECTORY, ollama_url
+
+
+# Seconds between probe rounds; the UI only ever reads the cached results
+HEALTH_INTERVAL_SECONDS = float(os.environ.get("RAG_HEALTH_INTERVAL", "10"))
+OLLAMA_URL = ollama_url(os.environ.get("OLLAMA_HOST"))
+# Kept short: a stopped Ollama should show up as offline, not stall a probe round
+OLLAMA_TIMEOUT_SECONDS = 1.0
+
+
+def probe_ollama():
+    """True if the Ollama server answers."""
+    import requests
+    try:
+        return requests.get(f"{OLLAMA_URL}/api/tags", timeout=OLLAMA_TIMEOUT_SECONDS).status_code == 200
+    except requests.RequestException:
+        return False
+
+
+def probe_chunk_count():
+    """Chunks in the Chroma collection, or None until the vector store has been loaded."""
+    from resources import is_initialized, get_vectorstore
+    if not is_initialized():
+        return None
+    return get_vectorstore()._collection.count()
+
+
+def probe_documents():
+    """Indexed documents from the manifest, as {tenant: [paths relative to their collection]}."""
+    from index_manifest import IndexManifest, tenant_of, DEFAULT_TENANT
+    manifest = IndexManifest(PERSIST_DIRECTORY)
+    try:
+        paths = manifest.indexed_files()
+    finally:
+        manifest.close()
+    documents = {}
+    for path in paths:
+        tenant = tenant_of(path, DOCUMENT_DIRECTORY)
+        relative = os.path.relpath(path, DOCUMENT_DIRECTORY)
+        if tenant != DEFAULT_TENANT:
+            relative = os.path.relpath(relative, tenant)
+        documents.setdefault(tenant, []).append(relative)
+    return documents
+
+
+DEFAULT_PROBES = {
+    "ollama": probe_ollama,
+    "chunk_count": probe_chunk_count,
+    "documents": probe_documents,
+}
+
+
+class HealthMonitor(threading.Thread):
+    """
+    Daemon thread that runs the health and stats probes every `interval` seconds
+    and keeps their last results, so page reruns read them without any I/O.
+
+    Each result is {"value", "error", "checked_at"}; value and checked_at are
+    None until the probe has run once. Call refresh() after something changed
+    (e.g. an indexing job finished) to run the probes without waiting.
+    """
+
+    def __init__(self, probes=None, interval=HEALTH_INTERVAL_SECONDS):
+        super().__init__(name="health-monitor", daemon=True)
+        self.probes = dict(probes or DEFAULT_PROBES)
+        self.interval = interval
+        self.results = {name: {"value": None, "error": None, "checked_at": None} for name in self.probes}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+
+    def refresh(self):
+        self.wake.set()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+
+    def get(self, name):
+        with self.lock:
+            return dict(self.results[name])
+
+    def snapshot(self):
+        with self.lock:
+            return {name: dict(result) for name, result in self.results.items()}
+
+    def age(self, name):
+        """Seconds since the probe last ran, or None if it has not yet."""
+        checked_at = self.get(name)["checked_at"]
+        return None if checked_at is None else time.time() - checked_at
+
+    def probe(self, *names):
+        """Runs the named probes (all of them by default) in the calling thread."""
+        for name in names or self.probes:
+            probe = self.probes[name]
+            try:
+                result = {"value": probe(), "error": None}
+            except Exception as e:
+                # Keep the last good value, so one failed probe does not blank the stats
+                result = {"value": self.get(name)["value"], "error": str(e)}
+            result["checked_at"] = time.time()
+            with self.lock:
+                self.results[name] = result
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.probe()
+            self.wake.wait(self.interval)
+            self.wake.clear()
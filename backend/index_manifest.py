@@ -0,0 +1,271 @@
+import os
+import sqlite3
+import hashlib
+
+
+MANIFEST_FILENAME = "index_manifest.sqlite3"
+HASH_BLOCK_SIZE = 1024 * 1024
+BOOTSTRAP_PAGE_SIZE = 5000
+# Tenant of files directly in the documents folder; files in a subfolder belong to a tenant named after it
+DEFAULT_TENANT = "default"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_hash ON files(hash);
+CREATE TABLE IF NOT EXISTS contents (
+    hash TEXT PRIMARY KEY,
+    source TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_hash ON chunks(hash);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def hash_file(file_path):
+    """Returns the sha256 hex digest of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def tenant_of(file_path, directory):
+    """The tenant (collection) a document belongs to: its top-level folder under `directory`."""
+    parts = os.path.relpath(file_path, directory).split(os.sep)
+    if len(parts) < 2 or parts[0] == os.pardir:
+        return DEFAULT_TENANT
+    return parts[0]
+
+
+def file_type_of(file_path):
+    return os.path.splitext(file_path)[1].lstrip(".").lower()
+
+
+def content_key(file_hash, tenant):
+    """
+    Identity of a piece of indexed content. Identical files share one set of
+    chunks within a tenant, but never across tenants, so each tenant's chunks
+    carry its own tenant tag.
+    """
+    if tenant == DEFAULT_TENANT:
+        return file_hash
+    return hashlib.sha256(f"{tenant}\0{file_hash}".encode("utf-8")).hexdigest()
+
+
+def chunk_id(content_hash, index):
+    """Deterministic Chroma ID for the index-th chunk of a piece of content."""
+    return f"{content_hash}-{index}"
+
+
+class IndexManifest:
+    """
+    Persistent record of what has been indexed into the vector store, kept in a
+    SQLite sidecar next to the Chroma files so lookups never touch the collection.
+
+    `files` maps an absolute path to its size, mtime and content hash.
+    `contents` maps a content hash to the path its chunks are cited under,
+    so identical files share one set of chunks.
+    `chunks` maps each chunk ID in the store to the content it came from.
+    """
+
+    def __init__(self, persist_directory):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.path = os.path.join(persist_directory, MANIFEST_FILENAME)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+    def exists(self):
+        """True once the manifest has been populated (or bootstrapped) at least once."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'initialized'").fetchone()
+        return row is not None
+
+    def save(self):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('initialized', '1')")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def get_file(self, file_path):
+        row = self.conn.execute(
+            "SELECT size, mtime, hash FROM files WHERE path = ?", (file_path,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"size": row[0], "mtime": row[1], "hash": row[2]}
+
+    def has_content(self, content_hash):
+        row = self.conn.execute("SELECT 1 FROM contents WHERE hash = ?", (content_hash,)).fetchone()
+        return row is not None
+
+    def file_hashes(self, file_paths):
+        """Returns {path: content hash} for those of the given paths that are indexed."""
+        hashes = {}
+        for i in range(0, len(file_paths), 500):
+            part = list(file_paths[i : i + 500])
+            placeholders = ",".join("?" * len(part))
+            hashes.update(self.conn.execute(
+                f"SELECT path, hash FROM files WHERE path IN ({placeholders})", part
+            ).fetchall())
+        return hashes
+
+    def indexed_files(self):
+        return [row[0] for row in self.conn.execute("SELECT path FROM files ORDER BY path")]
+
+    def record_file(self, file_path, size, mtime, content_hash):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime, hash) VALUES (?, ?, ?, ?)",
+            (file_path, size, mtime, content_hash),
+        )
+
+    def record_content(self, content_hash, source, chunk_ids):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO contents (hash, source) VALUES (?, ?)", (content_hash, source)
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO chunks (id, hash) VALUES (?, ?)",
+            ((item_id, content_hash) for item_id in chunk_ids),
+        )
+
+    def forget(self, file_path):
+        self.conn.execute("DELETE FROM files WHERE path = ?", (file_path,))
+
+    def collect_garbage(self):
+        """
+        Drops content no file refers to any more. Returns (stale_ids, repoints)
+        where stale_ids are chunk IDs to delete from the store, and repoints is a
+        list of (ids, new_source) for chunks that survive through a duplicate file
+        but were cited under a path that is gone or now holds other content.
+        """
+        orphaned = [row[0] for row in self.conn.execute(
+            "SELECT c.hash FROM contents c "
+            "WHERE NOT EXISTS (SELECT 1 FROM files f WHERE f.hash = c.hash)"
+        )]
+        stale_ids = []
+        for content_hash in orphaned:
+            stale_ids.extend(self._chunk_ids(content_hash))
+            self.conn.execute("DELETE FROM chunks WHERE hash = ?", (content_hash,))
+            self.conn.execute("DELETE FROM contents WHERE hash = ?", (content_hash,))
+
+        moved = self.conn.execute(
+            "SELECT c.hash, MIN(f.path) FROM contents c JOIN files f ON f.hash = c.hash "
+            "WHERE NOT EXISTS (SELECT 1 FROM files s WHERE s.path = c.source AND s.hash = c.hash) "
+            "GROUP BY c.hash"
+        ).fetchall()
+        repoints = []
+        for content_hash, new_source in moved:
+            self.conn.execute("UPDATE contents SET source = ? WHERE hash = ?", (new_source, content_hash))
+            repoints.append((self._chunk_ids(content_hash), new_source))
+
+        return stale_ids, repoints
+
+    def _chunk_ids(self, content_hash):
+        return [row[0] for row in self.conn.execute(
+            "SELECT id FROM chunks WHERE hash = ?", (content_hash,)
+        )]
+
+    def scan(self, directory):
+        """
+        Compares the files under `directory` with the manifest. Content hashes are
+        tenant-scoped (see content_key).
+
+        Returns a dict with:
+          - "new": list of (path, size, mtime, hash) whose content is not indexed yet
+          - "duplicates": list of (path, size, mtime, hash) whose content is already indexed
+          - "changed": paths whose indexed content is out of date
+          - "removed": paths in the manifest that no longer exist
+          - "unchanged": count of files skipped on size/mtime alone
+        """
+        result = {"new": [], "duplicates": [], "changed": [], "removed": [], "unchanged": 0}
+        seen = set()
+        pending_hashes = set()
+
+        for root, _, files in os.walk(directory):
+            for file in files:
+                file_path = os.path.abspath(os.path.join(root, file))
+                seen.add(file_path)
+                stat = os.stat(file_path)
+                entry = self.get_file(file_path)
+
+                if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                    result["unchanged"] += 1
+                    continue
+
+                content_hash = content_key(hash_file(file_path), tenant_of(file_path, directory))
+                if entry and entry["hash"] == content_hash:
+                    # Touched but not modified
+                    self.record_file(file_path, stat.st_size, stat.st_mtime, content_hash)
+                    result["unchanged"] += 1
+                    continue
+
+                if entry:
+                    result["changed"].append(file_path)
+
+                item = (file_path, stat.st_size, stat.st_mtime, content_hash)
+                if content_hash in pending_hashes or self.has_content(content_hash):
+                    result["duplicates"].append(item)
+                else:
+                    pending_hashes.add(content_hash)
+                    result["new"].append(item)
+
+        result["removed"] = [p for (p,) in self.conn.execute("SELECT path FROM files") if p not in seen]
+        return result
+
+    def bootstrap_from_store(self, existing_db, directory):
+        """
+        One-time migration for vector stores built before the manifest existed.
+        Adopts the chunks already stored for each file so they are not re-embedded
+        and can be evicted by ID when the file changes or disappears.
+        Metadata is read page by page so the collection is never held in memory at once.
+        """
+        ids_by_source = {}
+        offset = 0
+        while True:
+            page = existing_db.get(include=["metadatas"], limit=BOOTSTRAP_PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            for item_id, metadata in zip(page["ids"], page["metadatas"]):
+                if metadata and "source" in metadata:
+                    ids_by_source.setdefault(metadata["source"], []).append(item_id)
+            offset += len(page["ids"])
+
+        for source, ids in ids_by_source.items():
+            if not os.path.isfile(source):
+                # Orphaned chunks from a deleted file; remove them now.
+                for i in range(0, len(ids), BOOTSTRAP_PAGE_SIZE):
+                    existing_db.delete(ids=ids[i : i + BOOTSTRAP_PAGE_SIZE])
+                continue
+            stat = os.stat(source)
+            content_hash = content_key(hash_file(source), tenant_of(source, directory))
+            self.record_file(source, stat.st_size, stat.st_mtime, content_hash)
+            if not self.has_content(content_hash):
+                self.conn.execute(
+                    "INSERT INTO contents (hash, source) VALUES (?, ?)", (content_hash, source)
+                )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, hash) VALUES (?, ?)",
+                ((item_id, content_hash) for item_id in ids),
+            )
+
+        self.save()
+        print(f"Adopted {len(ids_by_source)} previously indexed source(s) into the manifest")
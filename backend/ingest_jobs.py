@@ -0,0 +1,254 @@
+import os
+import time
+import sqlite3
+import argparse
+import threading
+
+
+JOBS_FILENAME = "ingest_jobs.sqlite3"
+# How often an idle worker looks for jobs submitted by another process
+POLL_SECONDS = 2.0
+# A job whose runs keep getting interrupted (e.g. a parser crashing the process) is given up after this many
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL,            -- queued, running, done or failed
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    files_total INTEGER NOT NULL,
+    files_done INTEGER NOT NULL DEFAULT 0,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    busy_seconds REAL NOT NULL DEFAULT 0,  -- indexing time across attempts, for throughput
+    phase TEXT,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,            -- pending, loaded, done, skipped or failed
+    chunks INTEGER,
+    error TEXT,
+    PRIMARY KEY (job_id, path)
+);
+"""
+
+
+class IngestJobs:
+    """
+    Persistent queue of indexing jobs, kept in a SQLite file next to the Chroma files.
+
+    A job is a set of files already saved under the documents folder. Running it
+    runs process_documents, which also picks up any other pending change, while
+    progress is recorded per file. Since process_documents commits its manifest
+    after every batch, a job interrupted by a restart is simply run again: files
+    indexed before the interruption are skipped as unchanged.
+    """
+
+    def __init__(self, persist_directory):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.path = os.path.join(persist_directory, JOBS_FILENAME)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            self.conn.execute(sql, params)
+            self.conn.commit()
+
+    def submit(self, file_paths):
+        """Queues the given files for indexing and returns the job ID."""
+        file_paths = [os.path.abspath(p) for p in file_paths]
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (status, created, files_total) VALUES ('queued', ?, ?)",
+                (time.time(), len(file_paths)),
+            )
+            job_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO job_files (job_id, path, status) VALUES (?, ?, 'pending')",
+                ((job_id, path) for path in file_paths),
+            )
+            self.conn.commit()
+        return job_id
+
+    def next_job(self):
+        """ID of the oldest unfinished job; jobs left 'running' by a previous process come first."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('running', 'queued') "
+                "ORDER BY status = 'queued', id LIMIT 1"
+            ).fetchone()
+        return row[0] if row else None
+
+    def recover(self):
+        """
+        Called once when a worker starts. Jobs left 'running' by a previous process
+        are resumed by next_job, unless they have already been interrupted MAX_ATTEMPTS times.
+        """
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'failed', finished = ?, phase = NULL, "
+                "error = 'interrupted ' || attempts || ' times' WHERE status = 'running' AND attempts >= ?",
+                (time.time(), MAX_ATTEMPTS),
+            )
+            self.conn.commit()
+
+    def has_pending(self):
+        return self.next_job() is not None
+
+    def jobs(self, limit=5):
+        """The most recent jobs, newest first, each with its files and throughput."""
+        with self.lock:
+            jobs = [dict(row) for row in self.conn.execute(
+                "SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)
+            )]
+            for job in jobs:
+                job["files"] = [dict(row) for row in self.conn.execute(
+                    "SELECT path, status, chunks, error FROM job_files WHERE job_id = ? ORDER BY path",
+                    (job["id"],),
+                )]
+        now = time.time()
+        for job in jobs:
+            seconds = job["busy_seconds"]
+            if job["status"] == "running" and job["started"]:
+                seconds += now - job["started"]
+            job["elapsed_seconds"] = seconds
+            job["chunks_per_second"] = job["chunks_done"] / seconds if seconds > 0 else 0.0
+            job["files_per_second"] = job["files_done"] / seconds if seconds > 0 else 0.0
+        return jobs
+
+    def run(self, job_id, index=None):
+        """
+        Runs one job to completion with `index(progress=...)`, process_documents by default.
+        Returns True if it succeeded.
+        """
+        if index is None:
+            from data_indexing import process_documents as index
+
+        with self.lock:
+            job_paths = {row[0] for row in self.conn.execute(
+                "SELECT path FROM job_files WHERE job_id = ?", (job_id,)
+            )}
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', started = ?, attempts = attempts + 1, "
+                "phase = 'scanning', error = NULL WHERE id = ?",
+                (time.time(), job_id),
+            )
+            self.conn.commit()
+
+        def set_file(path, status, chunks=None, error=None):
+            if path not in job_paths:
+                return
+            with self.lock:
+                previous = self.conn.execute(
+                    "SELECT status FROM job_files WHERE job_id = ? AND path = ?", (job_id, path)
+                ).fetchone()[0]
+                self.conn.execute(
+                    "UPDATE job_files SET status = ?, chunks = COALESCE(?, chunks), error = ? "
+                    "WHERE job_id = ? AND path = ?",
+                    (status, chunks, error, job_id, path),
+                )
+                if status in ("done", "skipped", "failed") and previous not in ("done", "skipped", "failed"):
+                    self.conn.execute("UPDATE jobs SET files_done = files_done + 1 WHERE id = ?", (job_id,))
+                self.conn.commit()
+
+        def progress(event, **fields):
+            if event == "scanned":
+                self._execute("UPDATE jobs SET phase = 'indexing' WHERE id = ?", (job_id,))
+            elif event == "file_loaded":
+                set_file(fields["path"], "loaded", chunks=fields["chunks"])
+            elif event == "file_failed":
+                set_file(fields["path"], "failed", error=fields["error"])
+            elif event == "file_indexed":
+                set_file(fields["path"], "done", chunks=fields["chunks"])
+            elif event == "file_skipped":
+                set_file(fields["path"], "skipped", error=fields["reason"])
+            elif event == "batch":
+                self._execute(
+                    "UPDATE jobs SET chunks_done = chunks_done + ? WHERE id = ?", (fields["chunks"], job_id)
+                )
+
+        try:
+            index(progress=progress)
+        except Exception as e:
+            self._finish(job_id, "failed", str(e))
+            return False
+
+        # Files the scan found already indexed (e.g. re-uploaded unchanged) produce no events
+        with self.lock:
+            pending = [row[0] for row in self.conn.execute(
+                "SELECT path FROM job_files WHERE job_id = ? AND status IN ('pending', 'loaded')", (job_id,)
+            )]
+        for path in pending:
+            set_file(path, "skipped", error="already indexed")
+        self._finish(job_id, "done")
+        return True
+
+    def _finish(self, job_id, status, error=None):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, busy_seconds = busy_seconds + (? - started), "
+                "phase = NULL, error = ? WHERE id = ?",
+                (status, time.time(), time.time(), error, job_id),
+            )
+            self.conn.commit()
+
+
+class IngestWorker(threading.Thread):
+    """
+    Daemon thread that runs queued jobs one at a time, in submission order.
+    Call notify() after submitting a job to start it without waiting for the next poll.
+    """
+
+    def __init__(self, jobs, index=None, poll_seconds=POLL_SECONDS):
+        super().__init__(name="ingest-worker", daemon=True)
+        self.jobs = jobs
+        self.index = index
+        self.poll_seconds = poll_seconds
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+
+    def notify(self):
+        self.wake.set()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+
+    def run(self):
+        self.jobs.recover()
+        while not self.stopping.is_set():
+            job_id = self.jobs.next_job()
+            if job_id is None:
+                self.wake.wait(self.poll_seconds)
+                self.wake.clear()
+                continue
+            self.jobs.run(job_id, self.index)
+
+
+if __name__ == "__main__":
+    from config import PERSIST_DIRECTORY
+
+    parser = argparse.ArgumentParser(description="Run queued indexing jobs, e.g. ones left unfinished by the app.")
+    parser.add_argument("--watch", action="store_true", help="keep running and wait for new jobs")
+    args = parser.parse_args()
+
+    jobs = IngestJobs(PERSIST_DIRECTORY)
+    if args.watch:
+        worker = IngestWorker(jobs)
+        worker.start()
+        worker.join()
+    else:
+        jobs.recover()
+        while (job_id := jobs.next_job()) is not None:
+            print(f"Running ingest job {job_id}...")
+            jobs.run(job_id)
@@ -0,0 +1,200 @@
+import os
+import re
+import sqlite3
+import threading
+
+
+KEYWORD_INDEX_FILENAME = "keyword_index.sqlite3"
+# Bumped whenever the postings table changes shape; older indexes are rebuilt from the store
+SCHEMA_VERSION = "2"
+BUILD_PAGE_SIZE = 5000
+# Query terms beyond this are ignored; every term adds a posting list to merge
+MAX_QUERY_TERMS = 16
+# Reciprocal rank fusion constant from Cormack et al.; damps the weight of top ranks
+RRF_K = 60
+
+# Very common English words carry almost no BM25 weight but have the longest
+# posting lists, so they are dropped from queries rather than scored.
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from had has have how i if in into is it its
+me my no not of on or our so than that the their them then there these they this to was
+we were what when where which who why will with you your
+""".split())
+
+# Same token boundaries as the FTS5 tokenizer below: runs of letters, digits and
+# underscores. Column names such as unit_price stay one token; SKU-00123 becomes
+# "sku" and "00123" on both sides.
+TOKEN_PATTERN = re.compile(r"\w+")
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS postings USING fts5(
+    body,
+    tenant,
+    file_type,
+    content='',
+    tokenize="unicode61 remove_diacritics 2 tokenchars '_'"
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def query_terms(text):
+    """Lower-cased, de-duplicated keyword terms of a question, stopwords removed."""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token not in STOPWORDS and token not in terms:
+            terms.append(token)
+    return terms[:MAX_QUERY_TERMS]
+
+
+def _phrase(value):
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Merges several ranked lists of keys into one, scoring each key by
+    sum(1 / (k + rank)) over the lists it appears in.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class KeywordIndex:
+    """
+    BM25 keyword index over the chunk texts, kept in a SQLite sidecar next to the
+    Chroma files.
+
+    Postings live in a contentless FTS5 table, so only the compressed (delta and
+    varint encoded) posting lists are stored on disk, not a second copy of every
+    chunk. Queries are answered from those lists without loading the corpus into memory.
+    `chunks` maps each FTS5 rowid to the Chroma chunk ID. Removing a chunk needs its
+    original text and metadata, which the caller reads back from the vector store.
+
+    Each chunk's tenant and file type are indexed as extra columns (ignored by
+    the BM25 ranking) so searches can be restricted to them inside the index.
+    """
+
+    def __init__(self, persist_directory):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.path = os.path.join(persist_directory, KEYWORD_INDEX_FILENAME)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self._migrate()
+
+    def _migrate(self):
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if row is None or row[0] != SCHEMA_VERSION:
+            # Dropping the 'initialized' flag makes the next indexing run rebuild from the store
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS chunks; DELETE FROM meta;"
+            )
+            self.conn.executescript(SCHEMA)
+            # Tenant and file type columns only filter, they never score
+            self.conn.execute("INSERT INTO postings (postings, rank) VALUES ('rank', 'bm25(1.0, 0.0, 0.0)')")
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('schema_version', ?)", (SCHEMA_VERSION,))
+            self.conn.commit()
+
+    def exists(self):
+        """True once the index has been built (or brought up to date with the store) at least once."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'initialized'").fetchone()
+        return row is not None
+
+    def save(self):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('initialized', '1')")
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add(self, ids, texts, metadatas):
+        """Indexes chunks by ID. IDs that are already indexed are skipped, so re-adding a batch is harmless."""
+        with self.lock:
+            for item_id, text, metadata in zip(ids, texts, metadatas):
+                cursor = self.conn.execute("INSERT OR IGNORE INTO chunks (id) VALUES (?)", (item_id,))
+                if cursor.rowcount:
+                    self.conn.execute(
+                        "INSERT INTO postings (rowid, body, tenant, file_type) VALUES (?, ?, ?, ?)",
+                        (cursor.lastrowid, text, *self._tags(metadata)),
+                    )
+
+    def remove(self, ids, texts, metadatas):
+        """Removes chunks by ID; `texts` and `metadatas` must be the ones they were indexed with."""
+        with self.lock:
+            for item_id, text, metadata in zip(ids, texts, metadatas):
+                row = self.conn.execute("SELECT rowid FROM chunks WHERE id = ?", (item_id,)).fetchone()
+                if row is None:
+                    continue
+                self.conn.execute(
+                    "INSERT INTO postings (postings, rowid, body, tenant, file_type) VALUES ('delete', ?, ?, ?, ?)",
+                    (row[0], text, *self._tags(metadata)),
+                )
+                self.conn.execute("DELETE FROM chunks WHERE rowid = ?", (row[0],))
+
+    @staticmethod
+    def _tags(metadata):
+        metadata = metadata or {}
+        return metadata.get("tenant", ""), metadata.get("file_type", "")
+
+    def search(self, query, k, tenants=None, file_types=None):
+        """
+        Returns up to k (chunk ID, BM25 score) pairs, best first. Scores are higher-is-better.
+        `tenants` and `file_types` restrict the search to chunks tagged with one of them.
+        The restriction is token based, so callers needing exact matches re-check the hits.
+        """
+        terms = query_terms(query)
+        if not terms or k <= 0:
+            return []
+        match = "(" + " OR ".join(_phrase(term) for term in terms) + ")"
+        if tenants:
+            match += " AND tenant : (" + " OR ".join(_phrase(tenant) for tenant in tenants) + ")"
+        if file_types:
+            match += " AND file_type : (" + " OR ".join(_phrase(file_type) for file_type in file_types) + ")"
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT c.id, -m.rank FROM ("
+                "  SELECT rowid, rank FROM postings WHERE postings MATCH ? ORDER BY rank LIMIT ?"
+                ") m JOIN chunks c ON c.rowid = m.rowid ORDER BY m.rank",
+                (match, k),
+            ).fetchall()
+        return rows
+
+    def optimize(self):
+        """Merges all posting-list segments into one; worth doing after a bulk build."""
+        with self.lock:
+            self.conn.execute("INSERT INTO postings (postings) VALUES ('optimize')")
+            self.conn.commit()
+
+    def build_from_store(self, existing_db):
+        """
+        Indexes every chunk already in the vector store, for stores built before
+        hybrid search. Reads BUILD_PAGE_SIZE chunks per request, then merges the
+        posting lists and marks the index as built.
+        """
+        offset = 0
+        while True:
+            page = existing_db._collection.get(
+                include=["documents", "metadatas"], limit=BUILD_PAGE_SIZE, offset=offset
+            )
+            if not page["ids"]:
+                break
+            self.add(page["ids"], page["documents"], page["metadatas"])
+            offset += len(page["ids"])
+        self.optimize()
+        self.save()
+        print(f"Built keyword index for {offset} previously indexed chunk(s)")
@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import time
+import uuid
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import nullcontext
+
+# Per-stage timings and counters for answering and indexing. Set RAG_METRICS=1 to
+# enable; disabled, stage() and trace() return a shared no-op context manager and
+# observe() / count() return straight away.
+#
+# Enabled, each traced operation (ask_question, process_documents, ...) logs one
+# JSON line with its stage timings and counts to the "rag.metrics" logger, and all
+# of them are aggregated into Prometheus metrics, exposed on RAG_METRICS_PORT
+# (http://host:port/metrics) and/or rewritten to RAG_METRICS_FILE after each
+# operation (for node_exporter's textfile collector).
+
+ENABLED = os.environ.get("RAG_METRICS", "") not in ("", "0")
+METRICS_FILE = os.environ.get("RAG_METRICS_FILE")
+METRICS_PORT = int(os.environ.get("RAG_METRICS_PORT", "0"))
+# Structured logs go to stderr unless this names a file
+METRICS_LOG = os.environ.get("RAG_METRICS_LOG")
+# Histogram buckets in seconds, from a cached embedding to a long generation
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger("rag.metrics")
+_current = contextvars.ContextVar("rag_trace", default=None)
+_lock = threading.Lock()
+_histograms = {}  # (metric, labels) -> [count per bucket..., count, sum]
+_counters = {}    # (metric, labels) -> value
+_exporter = None
+_NULL = nullcontext()
+
+
+class Trace:
+    """
+    Timings and counts of one operation. Stages run in other threads (e.g. the
+    indexing loader behind prefetch) are added to it as long as they inherit the
+    context the trace was started in.
+    """
+
+    def __init__(self, operation, **attributes):
+        self.operation = operation
+        self.attributes = attributes
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.stages = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.start = None
+        self._token = None
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            total = self.stages.setdefault(stage, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def count(self, name, value):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Exited from another context, e.g. a generator closed by a different caller
+            _current.set(None)
+        _record_histogram("rag_operation_seconds", (("operation", self.operation),), seconds)
+        with self.lock:
+            record = {
+                "event": "trace",
+                "operation": self.operation,
+                "trace_id": self.trace_id,
+                "seconds": round(seconds, 6),
+                "error": repr(exc) if exc is not None else None,
+                "stages": {stage: {"seconds": round(total, 6), "calls": calls} for stage, (total, calls) in self.stages.items()},
+                "counts": dict(self.counts),
+                **self.attributes,
+            }
+        logger.info(json.dumps(record, default=str))
+        _publish()
+        return False
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def trace(operation, **attributes):
+    """Context manager around one operation; yields its Trace (None when disabled)."""
+    if not ENABLED:
+        return _NULL
+    _ensure_started()
+    return Trace(operation, **attributes)
+
+
+def stage(name):
+    """Context manager timing one stage of the current operation."""
+    if not ENABLED:
+        return _NULL
+    return _Stage(name)
+
+
+def observe(name, seconds):
+    """Records a stage duration measured elsewhere, e.g. a file's load time reported by a worker."""
+    if not ENABLED:
+        return
+    current = _current.get()
+    if current is not None:
+        current.observe(name, seconds)
+    operation = current.operation if current is not None else "none"
+    _record_histogram("rag_stage_seconds", (("operation", operation), ("stage", name)), seconds)
+
+
+def count(name, value=1):
+    """Adds to a counter of the current operation, exported as rag_<name>_total."""
+    if not ENABLED or not value:
+        return
+    current = _current.get()
+    if current is not None:
+        current.count(name, value)
+    operation = current.operation if current is not None else "none"
+    key = (f"rag_{name}_total", (("operation", operation),))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _record_histogram(metric, labels, seconds):
+    key = (metric, labels)
+    with _lock:
+        values = _histograms.get(key)
+        if values is None:
+            values = _histograms[key] = [0] * len(BUCKETS) + [0, 0.0]
+        bucket = bisect.bisect_left(BUCKETS, seconds)
+        # Above the last bound only counts towards +Inf, which is the total count
+        if bucket < len(BUCKETS):
+            values[bucket] += 1
+        values[-2] += 1
+        values[-1] += seconds
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}" if pairs else ""
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        histograms = sorted((key, list(values)) for key, values in _histograms.items())
+        counters = sorted(_counters.items())
+    seen = set()
+    for (metric, labels), values in histograms:
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, values):
+            cumulative += bucket
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {values[-2]}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {values[-2]}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {values[-1]:.6f}")
+    for (metric, labels), value in counters:
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _publish():
+    if not METRICS_FILE:
+        return
+    # Written whole and renamed so a scraper never reads half a file
+    temp_path = f"{METRICS_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(render())
+        os.replace(temp_path, METRICS_FILE)
+    except OSError as e:
+        logger.warning(f"Could not write metrics to {METRICS_FILE}: {e}")
+
+
+def _ensure_started():
+    """Sets up the log handler and the /metrics endpoint on first use."""
+    global _exporter
+    if _exporter is not None:
+        return
+    with _lock:
+        if _exporter is not None:
+            return
+        if not logger.handlers:
+            handler = logging.FileHandler(METRICS_LOG) if METRICS_LOG else logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        _exporter = False
+        if METRICS_PORT:
+            try:
+                _exporter = _start_exporter(METRICS_PORT)
+            except OSError as e:
+                # e.g. the app and an indexing run on the same machine; the first one serves
+                logger.warning(f"Metrics endpoint not started on port {METRICS_PORT}: {e}")
+
+
+def _start_exporter(port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
+
+
+def llm_callbacks():
+    """
+    Callback handlers recording the model call's wall time and the load, prefill
+    and decode times and token counts Ollama reports. Empty when disabled.
+    """
+    if not ENABLED:
+        return []
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMMetrics(BaseCallbackHandler):
+        def __init__(self):
+            self.started = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self.started[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            start = self.started.pop(run_id, None)
+            if start is not None:
+                observe("llm", time.perf_counter() - start)
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "response_metadata", None) or {}
+                    # Ollama reports durations in nanoseconds
+                    for field, name in (("load_duration", "ollama_load"), ("prompt_eval_duration", "ollama_prefill"),
+                                        ("eval_duration", "ollama_decode")):
+                        if metadata.get(field):
+                            observe(name, metadata[field] / 1e9)
+                    count("prompt_tokens", metadata.get("prompt_eval_count") or 0)
+                    count("output_tokens", metadata.get("eval_count") or 0)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self.started.pop(run_id, None)
+
+    return [LLMMetrics()]
@@ -0,0 +1,67 @@
+import numpy as np
+import metrics
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def maximal_marginal_relevance(query_vector, candidate_vectors, k=3, lambda_mult=0.5):
+    """
+    Greedy MMR selection. Returns the indices of the chosen candidates in the
+    order they were picked, most relevant first.
+
+    Each round scores every candidate at once as
+    lambda_mult * sim(query, c) - (1 - lambda_mult) * max sim(c, selected).
+    The running max is updated with one matrix-vector product for the newly
+    selected candidate only, so every pairwise similarity is computed at most once.
+    The cost is O(k * fetch_k * dim), well under a millisecond for a few hundred candidates.
+    """
+    candidates = _normalize(candidate_vectors)
+    n = candidates.shape[0] if candidates.ndim == 2 else 0
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    relevance = candidates @ _normalize(query_vector)
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected = []
+
+    best = int(np.argmax(relevance))
+    while True:
+        selected.append(best)
+        available[best] = False
+        if len(selected) == k:
+            return selected
+        np.maximum(redundancy, candidates @ candidates[best], out=redundancy)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+
+
+def mmr_search_by_vector(vectorstore, query_vector, k=3, fetch_k=10, lambda_mult=0.5, filter=None):
+    """
+    Fetches the fetch_k nearest chunks from the Chroma collection together with
+    their stored embeddings and re-ranks them with maximal_marginal_relevance.
+    Candidates are never re-embedded. Returns Documents in MMR order, with IDs.
+    """
+    from langchain_core.documents import Document
+
+    with metrics.stage("chroma_query"):
+        results = vectorstore._collection.query(
+            query_embeddings=[query_vector],
+            n_results=max(fetch_k, k),
+            where=filter,
+            include=["documents", "metadatas", "embeddings"],
+        )
+    ids = results["ids"][0]
+    if not ids:
+        return []
+    with metrics.stage("mmr"):
+        order = maximal_marginal_relevance(query_vector, results["embeddings"][0], k=k, lambda_mult=lambda_mult)
+    return [
+        Document(page_content=results["documents"][0][i], metadata=results["metadatas"][0][i] or {}, id=ids[i])
+        for i in order
+    ]
@@ -0,0 +1,630 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import numpy as np
+
+
+QUANTIZED_DIRNAME = "quantized"
+STORE_FILENAME = "store.sqlite3"
+# "int8" (one byte per dimension, per-vector scale) or "binary" (one bit per dimension);
+# only applies to a new store, an existing one keeps the quantization it was built with
+QUANTIZATION = os.environ.get("RAG_QUANTIZATION", "int8")
+# Rows per append-only segment file; a full segment is never written again
+SEGMENT_ROWS = 65536
+# Quantized rows scored per NumPy call, which bounds the float32 working set of a search
+BLOCK_ROWS = 16384
+# Candidates from the coarse search that are rescored with the float vectors,
+# as a multiple of n_results; binary codes rank more coarsely than int8 ones
+OVERSAMPLE = {"int8": 4, "binary": 16}
+MIN_CANDIDATES = 64
+# Row masks of this many distinct filters are kept and updated as rows are written
+MAX_CACHED_FILTERS = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    row INTEGER PRIMARY KEY,         -- segment * SEGMENT_ROWS + position in the segment files
+    id TEXT NOT NULL UNIQUE,
+    document TEXT,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    rows INTEGER NOT NULL            -- rows committed; bytes past them are an interrupted append
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_COMPARISONS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def where_to_sql(where):
+    """Translates a Chroma `where` filter on metadata into an SQL condition on the items table."""
+    if not where:
+        return "1", []
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_to_sql(sub) for sub in condition]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            params.extend(p for _, sub_params in parts for p in sub_params)
+            continue
+        field = "json_extract(metadata, ?)"
+        path = '$."' + key.replace('"', '\\"') + '"'
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator in _COMPARISONS:
+                clauses.append(f"{field} {_COMPARISONS[operator]} ?")
+                params.extend([path, value])
+            elif operator in ("$in", "$nin"):
+                values = list(value)
+                placeholders = ",".join("?" * len(values)) or "NULL"
+                negate = "NOT " if operator == "$nin" else ""
+                clauses.append(f"{field} {negate}IN ({placeholders})")
+                params.extend([path, *values])
+            else:
+                raise ValueError(f"Unsupported filter operator '{operator}'")
+    return " AND ".join(clauses), params
+
+
+def quantize(vectors, quantization):
+    """
+    Returns (codes, aux) for float32 vectors. int8 codes are vector / scale rounded,
+    with the scale in aux[:, 0]; binary codes are the packed sign bits. aux[:, 1]
+    holds each vector's squared norm, used to turn dot products into L2 distances.
+    """
+    aux = np.zeros((len(vectors), 2), dtype=np.float32)
+    aux[:, 1] = np.einsum("ij,ij->i", vectors, vectors)
+    if quantization == "binary":
+        return np.packbits(vectors > 0, axis=1), aux
+    scale = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+    aux[:, 0] = scale
+    return np.clip(np.rint(vectors / scale[:, None]), -127, 127).astype(np.int8), aux
+
+
+class _Segment:
+    """Memory maps of one segment's codes, float vectors and aux rows, reopened as it grows."""
+
+    def __init__(self, path_prefix, rows, dim, code_width, code_dtype):
+        self.rows = rows
+        self.codes = np.memmap(f"{path_prefix}.codes", dtype=code_dtype, mode="r", shape=(rows, code_width))
+        self.vectors = np.memmap(f"{path_prefix}.vectors", dtype=np.float32, mode="r", shape=(rows, dim))
+        self.aux = np.array(np.memmap(f"{path_prefix}.aux", dtype=np.float32, mode="r", shape=(rows, 2)))
+
+
+class QuantizedCollection:
+    """
+    Vector collection stored as quantized codes plus float32 vectors in append-only,
+    memory-mapped segment files, with IDs, texts and metadata in SQLite.
+
+    A query scans only the quantized codes (int8 dot products or binary Hamming
+    distances), then reranks the best candidates by exact squared L2 distance on
+    the float vectors, so only those rows of the float files are read. Deleted or
+    replaced rows are dropped from SQLite and skipped; compact() reclaims their space.
+    The rows matching each recent `where` filter are kept as a mask, updated for
+    just the written rows, so filtered queries do not evaluate it over the whole table.
+
+    Implements the part of the Chroma collection API the pipeline uses (get, query,
+    upsert, update, delete, count), with the same arguments and result layout.
+    """
+
+    def __init__(self, directory, quantization=QUANTIZATION):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.conn = sqlite3.connect(os.path.join(directory, STORE_FILENAME), check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.RLock()
+        stored = self._get_meta("quantization")
+        if stored is None:
+            if quantization not in OVERSAMPLE:
+                raise ValueError(f"Unknown quantization '{quantization}', expected one of {list(OVERSAMPLE)}")
+            self._set_meta("quantization", quantization)
+            self.conn.commit()
+            stored = quantization
+        self.quantization = stored
+        self._data_version = None
+        self._refresh()
+
+    # State shared with other processes writing the same store
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _refresh(self):
+        """Reloads segment sizes and the live-row mask if another connection has committed since."""
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        self._data_version = version
+        dim = self._get_meta("dim")
+        self.dim = int(dim) if dim else None
+        self.segment_rows = dict(self.conn.execute("SELECT id, rows FROM segments"))
+        self._segments = {}
+        capacity = (max(self.segment_rows) + 1) * SEGMENT_ROWS if self.segment_rows else 0
+        self.live = np.zeros(capacity, dtype=bool)
+        rows = np.fromiter((row for (row,) in self.conn.execute("SELECT row FROM items")), dtype=np.int64)
+        self.live[rows] = True
+        self._masks = {}
+
+    def _commit(self):
+        self.conn.commit()
+        # Our own commits do not change data_version, so the in-memory state stays valid
+        self._data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f"seg-{segment:06d}")
+
+    def _code_layout(self):
+        if self.quantization == "binary":
+            return (self.dim + 7) // 8, np.uint8
+        return self.dim, np.int8
+
+    def _segment(self, segment):
+        rows = self.segment_rows[segment]
+        cached = self._segments.get(segment)
+        if cached is None or cached.rows != rows:
+            cached = self._segments[segment] = _Segment(self._path(segment), rows, self.dim, *self._code_layout())
+        return cached
+
+    def _vectors(self, rows):
+        """Float vectors of the given rows, in the same order."""
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        segments, positions = np.divmod(np.asarray(rows, dtype=np.int64), SEGMENT_ROWS)
+        for segment in np.unique(segments):
+            selected = segments == segment
+            out[selected] = self._segment(int(segment)).vectors[positions[selected]]
+        return out
+
+    # Writes
+
+    def _append(self, vectors):
+        """Appends vectors to the segment files and returns their rows; committed by the caller."""
+        codes, aux = quantize(vectors, self.quantization)
+        rows = []
+        start = 0
+        while start < len(vectors):
+            segment = max(self.segment_rows, default=0)
+            used = self.segment_rows.get(segment, 0)
+            if used == SEGMENT_ROWS:
+                segment, used = segment + 1, 0
+            take = min(SEGMENT_ROWS - used, len(vectors) - start)
+            prefix = self._path(segment)
+            for suffix, data in ((".codes", codes), (".vectors", vectors), (".aux", aux)):
+                part = np.ascontiguousarray(data[start : start + take])
+                with open(prefix + suffix, "ab") as f:
+                    # Drop bytes of an append whose rows were never committed
+                    f.truncate(used * (part.nbytes // take))
+                    f.write(part.tobytes())
+            self.conn.execute("INSERT OR REPLACE INTO segments (id, rows) VALUES (?, ?)", (segment, used + take))
+            self.segment_rows[segment] = used + take
+            rows.extend(range(segment * SEGMENT_ROWS + used, segment * SEGMENT_ROWS + used + take))
+            start += take
+        needed = (max(self.segment_rows) + 1) * SEGMENT_ROWS
+        if len(self.live) < needed:
+            self.live = np.concatenate([self.live, np.zeros(needed - len(self.live), dtype=bool)])
+        return rows
+
+    def _rows_of(self, ids):
+        rows = {}
+        for i in range(0, len(ids), 500):
+            part = list(ids[i : i + 500])
+            rows.update(self.conn.execute(
+                f"SELECT id, row FROM items WHERE id IN ({','.join('?' * len(part))})", part
+            ).fetchall())
+        return rows
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with self.lock:
+            self._refresh()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._set_meta("dim", self.dim)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's {self.dim}")
+            replaced = self._rows_of(ids)
+            try:
+                rows = self._append(vectors)
+                self.conn.executemany("DELETE FROM items WHERE id = ?", ((item_id,) for item_id in replaced))
+                self.conn.executemany(
+                    "INSERT INTO items (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                    (
+                        (row, item_id, document, json.dumps(metadata) if metadata is not None else None)
+                        for row, item_id, document, metadata in zip(rows, ids, documents, metadatas)
+                    ),
+                )
+                self._commit()
+            except BaseException:
+                self.conn.rollback()
+                self._data_version = None
+                self._refresh()
+                raise
+            self.live[list(replaced.values())] = False
+            self.live[rows] = True
+            self._update_masks(list(replaced.values()) + rows)
+
+    add = upsert
+
+    def update(self, ids, embeddings=None, metadatas=None, documents=None):
+        if embeddings is not None:
+            # New vectors need new rows
+            existing = self.get(ids=ids, include=["documents", "metadatas"])
+            by_id = dict(zip(existing["ids"], zip(existing["documents"], existing["metadatas"])))
+            self.upsert(
+                ids, embeddings,
+                documents if documents is not None else [by_id.get(i, (None, None))[0] for i in ids],
+                metadatas if metadatas is not None else [by_id.get(i, (None, None))[1] for i in ids],
+            )
+            return
+        with self.lock:
+            self._refresh()
+            if metadatas is not None:
+                self.conn.executemany(
+                    "UPDATE items SET metadata = ? WHERE id = ?",
+                    ((json.dumps(m) if m is not None else None, i) for i, m in zip(ids, metadatas)),
+                )
+            if documents is not None:
+                self.conn.executemany(
+                    "UPDATE items SET document = ? WHERE id = ?", ((d, i) for i, d in zip(ids, documents))
+                )
+            self._commit()
+            if metadatas is not None:
+                self._update_masks(list(self._rows_of(ids).values()))
+
+    def delete(self, ids=None, where=None):
+        with self.lock:
+            self._refresh()
+            condition, params = where_to_sql(where)
+            if ids is not None:
+                rows = list(self._rows_of(ids).values())
+                if where:
+                    rows = [row for (row,) in self.conn.execute(
+                        f"SELECT row FROM items WHERE row IN ({','.join('?' * len(rows))}) AND {condition}",
+                        [*rows, *params],
+                    )] if rows else []
+            else:
+                rows = [row for (row,) in self.conn.execute(f"SELECT row FROM items WHERE {condition}", params)]
+            self.conn.executemany("DELETE FROM items WHERE row = ?", ((row,) for row in rows))
+            self._commit()
+            self.live[rows] = False
+            self._update_masks(rows)
+
+    # Reads
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def _fetch(self, rows, include):
+        """ids, documents and metadatas of the given rows, in the same order."""
+        found = {}
+        for i in range(0, len(rows), 500):
+            part = [int(row) for row in rows[i : i + 500]]
+            for row, item_id, document, metadata in self.conn.execute(
+                f"SELECT row, id, document, metadata FROM items WHERE row IN ({','.join('?' * len(part))})", part
+            ):
+                found[row] = (item_id, document, json.loads(metadata) if metadata else None)
+        rows = [int(row) for row in rows if int(row) in found]
+        result = {"ids": [found[row][0] for row in rows]}
+        result["documents"] = [found[row][1] for row in rows] if "documents" in include else None
+        result["metadatas"] = [found[row][2] for row in rows] if "metadatas" in include else None
+        result["embeddings"] = self._vectors(rows) if "embeddings" in include and rows else (
+            np.empty((0, self.dim or 0), dtype=np.float32) if "embeddings" in include else None
+        )
+        return rows, result
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("metadatas", "documents")):
+        with self.lock:
+            self._refresh()
+            condition, params = where_to_sql(where)
+            if ids is not None:
+                rows = sorted(self._rows_of(ids).values())
+                if where and rows:
+                    rows = [row for (row,) in self.conn.execute(
+                        f"SELECT row FROM items WHERE row IN ({','.join('?' * len(rows))}) AND {condition} ORDER BY row",
+                        [*rows, *params],
+                    )]
+                rows = rows[offset or 0 :][: limit] if limit is not None else rows[offset or 0 :]
+            else:
+                rows = [row for (row,) in self.conn.execute(
+                    f"SELECT row FROM items WHERE {condition} ORDER BY row LIMIT ? OFFSET ?",
+                    [*params, -1 if limit is None else limit, offset or 0],
+                )]
+            _, result = self._fetch(rows, include)
+        result["included"] = list(include)
+        return result
+
+    def _matching(self, condition, params, rows=None):
+        """Rows (all of them, or those among `rows`) whose metadata match an SQL condition."""
+        if rows is None:
+            return np.fromiter(
+                (row for (row,) in self.conn.execute(f"SELECT row FROM items WHERE {condition}", params)), dtype=np.int64
+            )
+        matched = []
+        for i in range(0, len(rows), 500):
+            part = [int(row) for row in rows[i : i + 500]]
+            matched.extend(row for (row,) in self.conn.execute(
+                f"SELECT row FROM items WHERE row IN ({','.join('?' * len(part))}) AND {condition}", [*part, *params]
+            ))
+        return np.asarray(matched, dtype=np.int64)
+
+    def _allowed(self, where):
+        if not where:
+            return self.live
+        key = json.dumps(where, sort_keys=True, default=str)
+        cached = self._masks.pop(key, None)
+        if cached is None:
+            condition, params = where_to_sql(where)
+            mask = np.zeros_like(self.live)
+            mask[self._matching(condition, params)] = True
+            cached = (condition, params, mask)
+            if len(self._masks) >= MAX_CACHED_FILTERS:
+                self._masks.pop(next(iter(self._masks)))
+        # Reinserted, so the least recently used filter is dropped first
+        self._masks[key] = cached
+        return cached[2]
+
+    def _update_masks(self, rows):
+        """Brings the cached filter masks up to date after `rows` were written, replaced or deleted."""
+        if not len(rows):
+            return
+        for key, (condition, params, mask) in list(self._masks.items()):
+            if len(mask) < len(self.live):
+                mask = np.concatenate([mask, np.zeros(len(self.live) - len(mask), dtype=bool)])
+                self._masks[key] = (condition, params, mask)
+            mask[rows] = False
+            mask[self._matching(condition, params, rows)] = True
+
+    def _coarse(self, query, allowed, candidates):
+        """Rows of the `candidates` best allowed rows by quantized distance."""
+        best_rows, best_scores = [], []
+        if self.quantization == "binary":
+            query_code = np.packbits(query > 0)
+        for segment in sorted(self.segment_rows):
+            data = self._segment(segment)
+            base = segment * SEGMENT_ROWS
+            for start in range(0, data.rows, BLOCK_ROWS):
+                stop = min(start + BLOCK_ROWS, data.rows)
+                mask = allowed[base + start : base + stop]
+                if not mask.any():
+                    continue
+                block = data.codes[start:stop]
+                if self.quantization == "binary":
+                    scores = np.bitwise_count(np.bitwise_xor(block, query_code)).sum(axis=1, dtype=np.float32)
+                else:
+                    # ||v||^2 - 2 q.v ranks like the squared L2 distance to the query
+                    dots = (block.astype(np.float32) @ query) * data.aux[start:stop, 0]
+                    scores = data.aux[start:stop, 1] - 2 * dots
+                scores[~mask] = np.inf
+                if len(scores) > candidates:
+                    keep = np.argpartition(scores, candidates)[:candidates]
+                else:
+                    keep = np.arange(len(scores))
+                keep = keep[np.isfinite(scores[keep])]
+                best_rows.append(base + start + keep)
+                best_scores.append(scores[keep])
+        if not best_rows:
+            return np.empty(0, dtype=np.int64)
+        rows, scores = np.concatenate(best_rows), np.concatenate(best_scores)
+        if len(rows) > candidates:
+            rows = rows[np.argpartition(scores, candidates)[:candidates]]
+        return rows
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("metadatas", "documents", "distances")):
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        result = {key: [] for key in ("ids", "documents", "metadatas", "embeddings", "distances")}
+        with self.lock:
+            self._refresh()
+            allowed = self._allowed(where) if self.dim else None
+            for query in queries:
+                if allowed is None:
+                    rows, distances = [], np.empty(0, dtype=np.float32)
+                else:
+                    candidates = max(n_results * OVERSAMPLE[self.quantization], MIN_CANDIDATES)
+                    rows = self._coarse(query, allowed, candidates)
+                    # Exact rerank on the float vectors of the candidates only
+                    distances = ((self._vectors(rows) - query) ** 2).sum(axis=1)
+                    order = np.argsort(distances, kind="stable")[:n_results]
+                    rows, distances = rows[order], distances[order]
+                kept, fetched = self._fetch(rows, include)
+                by_row = dict(zip((int(row) for row in rows), distances.tolist()))
+                for key in ("ids", "documents", "metadatas", "embeddings"):
+                    result[key].append(fetched[key])
+                result["distances"].append([by_row[row] for row in kept])
+        for key in ("documents", "metadatas", "embeddings", "distances"):
+            if key not in include:
+                result[key] = None
+        result["included"] = list(include)
+        return result
+
+    # Maintenance
+
+    def size_bytes(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def compact(self):
+        """Rewrites the segments without deleted or replaced rows. Returns the number of rows reclaimed."""
+        with self.lock:
+            self._refresh()
+            used = sum(self.segment_rows.values())
+            live_rows = np.flatnonzero(self.live)
+            if used == len(live_rows):
+                return 0
+            old_segments = sorted(self.segment_rows)
+            self.conn.execute("DROP TABLE IF EXISTS temp.moved")
+            self.conn.execute("CREATE TEMP TABLE moved (old INTEGER PRIMARY KEY, new INTEGER)")
+            written = []
+            try:
+                # Copies go to fresh segment numbers above the old ones, so nothing is overwritten
+                first = max(old_segments) + 1
+                next_row = first * SEGMENT_ROWS
+                for i in range(0, len(live_rows), SEGMENT_ROWS):
+                    rows = live_rows[i : i + SEGMENT_ROWS]
+                    vectors = self._vectors(rows)
+                    segment = first + i // SEGMENT_ROWS
+                    codes, aux = quantize(vectors, self.quantization)
+                    written.append(segment)
+                    for suffix, data in ((".codes", codes), (".vectors", vectors), (".aux", aux)):
+                        with open(self._path(segment) + suffix, "wb") as f:
+                            f.write(np.ascontiguousarray(data).tobytes())
+                    self.conn.execute("INSERT INTO segments (id, rows) VALUES (?, ?)", (segment, len(rows)))
+                    self.conn.executemany(
+                        "INSERT INTO moved (old, new) VALUES (?, ?)",
+                        ((int(old), next_row + j) for j, old in enumerate(rows)),
+                    )
+                    next_row += SEGMENT_ROWS
+                self.conn.execute("UPDATE items SET row = -(SELECT new FROM moved WHERE old = items.row) - 1")
+                self.conn.execute("UPDATE items SET row = -row - 1")
+                self.conn.execute("DELETE FROM segments WHERE id < ?", (first,))
+                self._commit()
+            except BaseException:
+                self.conn.rollback()
+                # The old segments are still the live ones; drop the partial copies
+                self._remove_segment_files(written)
+                raise
+            finally:
+                self._data_version = None
+                self._refresh()
+            self._remove_segment_files(old_segments)
+            return used - len(live_rows)
+
+    def _remove_segment_files(self, segments):
+        for segment in segments:
+            for suffix in (".codes", ".vectors", ".aux"):
+                try:
+                    os.remove(self._path(segment) + suffix)
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        self.conn.close()
+
+
+class QuantizedVectorStore:
+    """
+    Drop-in for the LangChain Chroma wrapper as the pipeline uses it: the collection
+    is reached through `_collection`, plus `get` and `delete` at the store level.
+    """
+
+    def __init__(self, directory, quantization=QUANTIZATION):
+        self._collection = QuantizedCollection(directory, quantization)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("metadatas", "documents")):
+        return self._collection.get(ids=ids, where=where, limit=limit, offset=offset, include=include)
+
+    def delete(self, ids=None):
+        self._collection.delete(ids=ids)
+
+
+def quantized_directory(persist_directory):
+    return os.path.join(persist_directory, QUANTIZED_DIRNAME)
+
+
+def chroma_size_bytes(persist_directory):
+    """On-disk size of the Chroma files (SQLite plus HNSW segment folders), without the sidecars."""
+    total = 0
+    for entry in os.scandir(persist_directory):
+        if entry.name == "chroma.sqlite3":
+            total += entry.stat().st_size
+        elif entry.is_dir() and entry.name != QUANTIZED_DIRNAME:
+            total += sum(
+                os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(entry.path) for name in names
+            )
+    return total
+
+
+def import_from_chroma(collection, store, page_size=5000):
+    """Copies every vector, text and metadata of a Chroma collection into a quantized store."""
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        if not len(page["ids"]):
+            break
+        store.upsert(page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+        offset += len(page["ids"])
+    return offset
+
+
+def compare_with_chroma(collection, store, queries, k=10):
+    """
+    Recall@k of the quantized store and of Chroma's HNSW index against an exact
+    search over the stored float vectors, their overlap, and query latencies.
+    """
+    exact_rows = np.flatnonzero(store.live)
+    exact_vectors = store._vectors(exact_rows)
+    exact_ids = store._fetch(exact_rows, ())[1]["ids"]
+
+    results = {"quantized": {"hits": 0, "seconds": []}, "chroma": {"hits": 0, "seconds": []}}
+    overlap = 0
+    for query in np.asarray(queries, dtype=np.float32):
+        distances = ((exact_vectors - query) ** 2).sum(axis=1)
+        truth = {exact_ids[i] for i in np.argsort(distances)[:k]}
+        found = {}
+        for name, backend in (("quantized", store), ("chroma", collection)):
+            start = time.perf_counter()
+            found[name] = set(backend.query(query_embeddings=[query.tolist()], n_results=k, include=[])["ids"][0])
+            results[name]["seconds"].append(time.perf_counter() - start)
+            results[name]["hits"] += len(found[name] & truth)
+        overlap += len(found["quantized"] & found["chroma"])
+
+    report = {"queries": len(queries), "k": k, "quantization": store.quantization}
+    for name, values in results.items():
+        report[f"{name}_recall_at_k"] = values["hits"] / (k * len(queries))
+        report[f"{name}_p50_ms"] = float(np.percentile(values["seconds"], 50) * 1000)
+    report["overlap_at_k"] = overlap / (k * len(queries))
+    return report
+
+
+if __name__ == "__main__":
+    from config import PERSIST_DIRECTORY
+
+    parser = argparse.ArgumentParser(description="Build, check and compact the quantized vector store.")
+    parser.add_argument("--import-chroma", action="store_true",
+                        help="copy the vectors of the Chroma store into the quantized store (no re-embedding)")
+    parser.add_argument("--compare", action="store_true",
+                        help="report index sizes and recall@k of both stores against exact search")
+    parser.add_argument("--compact", action="store_true", help="reclaim the space of deleted chunks")
+    parser.add_argument("--queries", type=int, default=200, help="chunks whose opening words are used as queries")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    store = QuantizedCollection(quantized_directory(PERSIST_DIRECTORY))
+    if args.import_chroma or args.compare:
+        import chromadb
+        collection = chromadb.PersistentClient(path=PERSIST_DIRECTORY).get_collection("langchain")
+
+    if args.import_chroma:
+        from index_manifest import IndexManifest
+        print(f"Imported {import_from_chroma(collection, store)} chunk(s) from Chroma")
+        # The manifest now describes this store too (see process_documents)
+        manifest = IndexManifest(PERSIST_DIRECTORY)
+        manifest.set_meta("vector_store", "quantized")
+        manifest.save()
+        manifest.close()
+    if args.compact:
+        print(f"Reclaimed {store.compact()} row(s)")
+    if args.compare:
+        from resources import get_embeddings
+        texts = [text for text in collection.get(limit=args.queries, include=["documents"])["documents"] if text]
+        queries = get_embeddings().embed_queries([" ".join(text.split()[:12]) for text in texts])
+        report = compare_with_chroma(collection, store, queries, args.k)
+        report["chroma_bytes"] = chroma_size_bytes(PERSIST_DIRECTORY)
+        report["quantized_bytes"] = store.size_bytes()
+        report["chunks"] = store.count()
+        for name, value in report.items():
+            print(f"{name}: {value:.4f}" if isinstance(value, float) else f"{name}: {value}")
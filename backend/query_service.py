@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+from mmr import mmr_search_by_vector
+import metrics
+
+
+# Generations allowed to run against Ollama at once; the rest wait their turn
+MAX_CONCURRENT_GENERATIONS = int(os.environ.get("RAG_MAX_CONCURRENT_GENERATIONS", "2"))
+# Requests admitted (running + waiting) before new ones are rejected with ServiceBusy
+MAX_PENDING_REQUESTS = int(os.environ.get("RAG_MAX_PENDING_REQUESTS", "64"))
+# How long the embedding batcher waits for more questions before encoding
+EMBED_BATCH_WINDOW_SECONDS = 0.005
+EMBED_MAX_BATCH = 32
+
+
+class ServiceBusy(Exception):
+    """Raised when the service already holds max_pending requests."""
+
+
+class QueryService:
+    """
+    Asyncio front end for answering many questions concurrently.
+
+    - Query embeddings of requests arriving within a few milliseconds of each
+      other are computed in one batched model call.
+    - Retrieval and context assembly (vectorized MMR fused with keyword hits,
+      packed to the token budget, as in the synchronous pipeline) run in a worker thread.
+    - Generation uses the stuff-documents chain's ainvoke, with at most
+      `max_generations` running against the LLM at once.
+    - At most `max_pending` requests are admitted. The rest get ServiceBusy,
+      so callers see backpressure instead of an unbounded queue.
+
+    Every dependency can be injected, e.g. a stub LLM in tests. Anything left as
+    None comes from the shared resources used by retrieval_pipeline.
+    """
+
+    def __init__(self, llm=None, embeddings=None, vectorstore=None, search_kwargs=None,
+                 max_generations=MAX_CONCURRENT_GENERATIONS, max_pending=MAX_PENDING_REQUESTS,
+                 answer_cache=None, source_hashes=None):
+        import retrieval_pipeline
+
+        self.embeddings = embeddings or retrieval_pipeline.get_embeddings()
+        self.vectorstore = vectorstore or retrieval_pipeline.get_vectorstore()
+        _, self.combine_docs_chain = retrieval_pipeline.build_combine_docs_chain(
+            llm or retrieval_pipeline.load_llm_model(retrieval_pipeline.USE_MODEL)
+        )
+        self.search_kwargs = retrieval_pipeline.search_settings(search_kwargs)
+        self.max_pending = max_pending
+        self.answer_cache = answer_cache
+        self.source_hashes = source_hashes or retrieval_pipeline.indexed_source_hashes
+        self._pipeline = retrieval_pipeline
+
+        self._generation_slots = asyncio.Semaphore(max_generations)
+        self._pending = 0
+        self._admission = asyncio.Condition()
+        self._embed_queue = None
+        self._embed_worker = None
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _retrieve(self, query, vector, settings, filter):
+        docs = mmr_search_by_vector(self.vectorstore, vector, filter=filter or None, **settings)
+        docs = self._pipeline.fuse_keyword_results(query, docs, settings["k"], self.vectorstore, filter)
+        return self._pipeline.build_context(query, docs)
+
+    async def ask(self, query, search_kwargs=None, filter=None, vector=None, wait=False):
+        """
+        Answers one question. Returns {"answer", "sources"} like ask_question, plus
+        "timings": seconds spent embedding, retrieving, waiting for a generation
+        slot and generating. `search_kwargs` overrides the service's k, fetch_k and
+        lambda_mult for this request, and `filter` restricts it to matching chunks
+        (e.g. one tenant's). Pass the query's `vector` if it is already embedded.
+        With `wait`, a full service makes the call wait for a free place instead
+        of raising ServiceBusy, for in-process callers that queue their own work.
+        """
+        if self._pending >= self.max_pending:
+            if not wait:
+                raise ServiceBusy(f"{self._pending} requests already pending")
+            async with self._admission:
+                await self._admission.wait_for(lambda: self._pending < self.max_pending)
+                self._pending += 1
+        else:
+            self._pending += 1
+        try:
+            with metrics.trace("service_ask"):
+                return await self._answer(query, search_kwargs, filter, vector)
+        finally:
+            self._pending -= 1
+            async with self._admission:
+                self._admission.notify()
+
+    async def _answer(self, query, search_kwargs, filter, vector):
+        settings = self._pipeline.search_settings(search_kwargs, base=self.search_kwargs)
+        scope = self._pipeline.retrieval_scope(settings, filter)
+        timings = {}
+        start = time.perf_counter()
+        if vector is None:
+            with metrics.stage("embed_query"):
+                # Includes the wait for the rest of the embedding batch
+                vector = await self._embed(query)
+        timings["embed"] = time.perf_counter() - start
+
+        if self.answer_cache is not None:
+            with metrics.stage("answer_cache"):
+                cached = await asyncio.to_thread(self.answer_cache.lookup, vector, self.source_hashes, scope)
+            metrics.count("answer_cache_hits" if cached is not None else "answer_cache_misses")
+            if cached is not None:
+                return {**cached, "timings": timings}
+
+        start = time.perf_counter()
+        docs = await asyncio.to_thread(self._retrieve, query, vector, settings, filter)
+        timings["retrieve"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with metrics.stage("generation_queue"):
+            await self._generation_slots.acquire()
+        timings["queue"] = time.perf_counter() - start
+        try:
+            start = time.perf_counter()
+            answer = await self.combine_docs_chain.ainvoke({"input": query, "context": docs})
+            timings["generate"] = time.perf_counter() - start
+        finally:
+            self._generation_slots.release()
+
+        sources = {doc.metadata.get('source') for doc in docs}
+        if self.answer_cache is not None:
+            await asyncio.to_thread(
+                self.answer_cache.store, vector, answer, sources, self.source_hashes, scope
+            )
+        return {"answer": answer, "sources": sources, "timings": timings}
+
+    async def ask_many(self, queries):
+        """
+        Answers questions concurrently, at most max_pending at a time; the rest
+        wait their turn. Failures are returned in place as exceptions.
+        """
+        return await asyncio.gather(*(self.ask(query, wait=True) for query in queries), return_exceptions=True)
+
+    async def embed_many(self, queries):
+        """Embeds all the queries in one model call, off the event loop."""
+        if hasattr(self.embeddings, "embed_queries"):
+            return await asyncio.to_thread(self.embeddings.embed_queries, queries)
+        return await asyncio.to_thread(self.embeddings.embed_documents, queries)
+
+    async def _embed(self, query):
+        if self._embed_worker is None or self._embed_worker.done():
+            self._embed_queue = asyncio.Queue()
+            self._embed_worker = asyncio.create_task(self._run_embed_batches())
+        future = asyncio.get_running_loop().create_future()
+        await self._embed_queue.put((query, future))
+        return await future
+
+    async def _run_embed_batches(self):
+        """Collects questions for a few milliseconds and encodes them together off the event loop."""
+        while True:
+            batch = [await self._embed_queue.get()]
+            deadline = asyncio.get_running_loop().time() + EMBED_BATCH_WINDOW_SECONDS
+            while len(batch) < EMBED_MAX_BATCH:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._embed_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [query for query, _ in batch]
+            try:
+                vectors = await self.embed_many(texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    async def close(self):
+        if self._embed_worker is not None:
+            self._embed_worker.cancel()
+            try:
+                await self._embed_worker
+            except asyncio.CancelledError:
+                pass
+
+
+async def serve(host, port, service):
+    """
+    Minimal JSON-lines server: each request line is {"question": ...}, optionally
+    with "search_kwargs" ({"k", "fetch_k", "lambda_mult"}) and a Chroma "filter", and each
+    response line is {"answer": ..., "sources": [...]} or {"error": ...}.
+    Requests on one connection are answered concurrently, in completion order,
+    with the request's "id" echoed back.
+    """
+    async def handle(reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def send(response):
+            async with write_lock:
+                writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                await writer.drain()
+
+        async def answer(request):
+            try:
+                result = await service.ask(request["question"], request.get("search_kwargs"), request.get("filter"))
+                response = {"answer": result["answer"], "sources": sorted(s for s in result["sources"] if s)}
+            except ServiceBusy as e:
+                response = {"error": "busy", "detail": str(e)}
+            except Exception as e:
+                response = {"error": str(e)}
+            response["id"] = request.get("id")
+            await send(response)
+
+        while line := await reader.readline():
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(request, dict):
+                # Valid JSON, but not a request object
+                await send({"error": "invalid request"})
+                continue
+            task = asyncio.create_task(answer(request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        await asyncio.gather(*tasks)
+        writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"Query service listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve RAG questions concurrently over JSON lines.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-generations", type=int, default=MAX_CONCURRENT_GENERATIONS)
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING_REQUESTS)
+    args = parser.parse_args()
+
+    async def main():
+        import retrieval_pipeline
+        service = QueryService(
+            max_generations=args.max_generations,
+            max_pending=args.max_pending,
+            answer_cache=retrieval_pipeline.answer_cache,
+        )
+        if retrieval_pipeline.OLLAMA_WARM_UP:
+            await asyncio.to_thread(retrieval_pipeline.warm_up_llm)
+        await serve(args.host, args.port, service)
+
+    asyncio.run(main())
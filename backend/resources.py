@@ -0,0 +1,67 @@
+import threading
+import os
+from config import PERSIST_DIRECTORY, EMBEDDING_CACHE_DIRECTORY, EMBED_BATCH_SIZE, VECTOR_STORE
+from startup_timing import timed
+
+# One embedding model and one Chroma client per process, created on first use and
+# shared by data_indexing, retrieval_pipeline and the Streamlit app. Importing this
+# module is cheap: torch, sentence-transformers and Chroma load on the first call.
+
+_lock = threading.Lock()
+_embeddings = None
+_vectorstore = None
+
+
+def get_embeddings():
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                with timed("import embedding backend"):
+                    from embedding_backends import load_embeddings
+                # torch fp32 by default; RAG_EMBEDDING_BACKEND=onnx / onnx-int8 for ONNX Runtime
+                with timed("load embedding model"):
+                    _embeddings = load_embeddings(
+                        EMBEDDING_CACHE_DIRECTORY,
+                        encode_kwargs={"batch_size": EMBED_BATCH_SIZE},
+                    )
+    return _embeddings
+
+
+def get_vectorstore():
+    global _vectorstore
+    if _vectorstore is None:
+        if VECTOR_STORE == "quantized":
+            # Stores vectors computed by the caller, so it needs no embedding model
+            with _lock:
+                if _vectorstore is None:
+                    from quantized_store import QuantizedVectorStore, quantized_directory
+                    with timed("open quantized vector store"):
+                        _vectorstore = QuantizedVectorStore(quantized_directory(PERSIST_DIRECTORY))
+        else:
+            # Loaded before taking the lock, which get_embeddings takes too
+            embeddings = get_embeddings()
+            with _lock:
+                if _vectorstore is None:
+                    with timed("import langchain_chroma"):
+                        from langchain_chroma import Chroma
+                    # Connect to existing db or create new if it does not exist
+                    with timed("connect to Chroma"):
+                        _vectorstore = Chroma(
+                            persist_directory=PERSIST_DIRECTORY,
+                            embedding_function=embeddings,
+                        )
+    return _vectorstore
+
+
+def vectorstore_exists():
+    """True if the configured vector store has been created on disk; does not load it."""
+    if VECTOR_STORE == "quantized":
+        from quantized_store import quantized_directory, STORE_FILENAME
+        return os.path.exists(os.path.join(quantized_directory(PERSIST_DIRECTORY), STORE_FILENAME))
+    return os.path.exists(os.path.join(PERSIST_DIRECTORY, "chroma.sqlite3"))
+
+
+def is_initialized():
+    """True once the vector store has been loaded."""
+    return _vectorstore is not None
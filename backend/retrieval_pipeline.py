@@ -1,41 +1,181 @@
 import os
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_ollama import ChatOllama
-from langchain_classic.chains import create_retrieval_chain
-from langchain_classic.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
+import json
+import threading
 import httpx
+from config import PERSIST_DIRECTORY
+from resources import get_embeddings, get_vectorstore
+from answer_cache import AnswerCache
+from index_manifest import IndexManifest
+from keyword_index import KeywordIndex, KEYWORD_INDEX_FILENAME, reciprocal_rank_fusion
+from mmr import mmr_search_by_vector
+from context_budget import assemble_context, estimate_tokens, prompt_token_logger, CONTEXT_TOKEN_BUDGET
+import metrics
+from startup_timing import timed, report as report_startup_timing
 
-# Paths
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-PERSIST_DIRECTORY = os.path.join(BASE_DIR, 'chroma_db')
-SENTENCE_TRANSFORMER_MODEL_DIR = os.path.join(BASE_DIR, "backend/models/all-MiniLM-L6-v2")
 USE_MODEL = 'deepseek-r1:8b'
+# MMR retrieval: top k chunks out of fetch_k candidates; lambda_mult 1 = relevance only, 0 = diversity only.
+# These are the defaults; each request can override them (see search_settings).
+SEARCH_KWARGS = {
+    "k" : int(os.environ.get("RAG_SEARCH_K", "3")),
+    "fetch_k" : int(os.environ.get("RAG_FETCH_K", "10")),
+    "lambda_mult" : float(os.environ.get("RAG_LAMBDA_MULT", "0.5")),
+}
+# Hybrid search: fuse the MMR results with BM25 keyword hits (set to 0 for vector-only)
+HYBRID_SEARCH = os.environ.get("RAG_HYBRID_SEARCH", "1") == "1"
 
-# Load Vector Store
-print("Connecting to Vector Store....")
-embeddings = HuggingFaceEmbeddings(
-    model_name=SENTENCE_TRANSFORMER_MODEL_DIR
-)
-vectorstore = Chroma(
-    persist_directory = PERSIST_DIRECTORY, 
-    embedding_function = embeddings
-)
+# Semantic answer cache: questions at least this similar to a cached one reuse its answer
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("RAG_ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get("RAG_ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.environ.get("RAG_ANSWER_CACHE_SIZE", "512"))  # 0 disables the cache
+
+# Ollama generation: how long the model stays loaded after a request (Ollama's default is 5m; -1 = forever)
+OLLAMA_KEEP_ALIVE = os.environ.get("RAG_OLLAMA_KEEP_ALIVE", "30m")
+# Load the model and its prompt prefix at startup instead of on the first question
+OLLAMA_WARM_UP = os.environ.get("RAG_OLLAMA_WARM_UP", "1") == "1"
+# Thinking: "off", "on" (kept out of the answer), "default" (the model's own, inline
+# <think> tags for deepseek-r1) or a level such as "low" for models that take one
+REASONING = os.environ.get("RAG_REASONING", "off")
+MAX_ANSWER_TOKENS = int(os.environ.get("RAG_MAX_ANSWER_TOKENS", "512"))
+REASONING_TOKENS = int(os.environ.get("RAG_REASONING_TOKENS", "1024"))  # added to the limit unless reasoning is off
+NUM_CTX = int(os.environ.get("RAG_NUM_CTX", "0"))  # 0 = sized from the context budget (see context_window)
+# Allowance for the question in num_ctx, and headroom for the chars/4 token estimate
+QUESTION_TOKENS = 256
+TOKEN_ESTIMATE_MARGIN = 1.25
+NUM_CTX_STEP = 512
 
-# Retriever (top 3 most relevant chunks)
-retriever = vectorstore.as_retriever(
-    search_type='mmr',
-    search_kwargs={"k" : 3, "fetch_k" : 10, "lambda_mult" : 0.5}
+# The chain, LLM client and LangChain imports are built on first use (see get_rag_chain)
+# so importing this module stays cheap for the CLI and the Streamlit page.
+_chain_lock = threading.Lock()
+_components = {}
+
+answer_cache = AnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    max_entries=ANSWER_CACHE_SIZE,
 )
+_manifest_lock = threading.Lock()
+_manifest = None
 
-# Local LLM
-def load_llm_model(model_name):
-    llm = ChatOllama(model=model_name, temperature=0)
-    return llm
+def indexed_source_hashes(paths):
+    """Current content hash of each cited source, read from the indexing manifest."""
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = IndexManifest(PERSIST_DIRECTORY)
+        return _manifest.file_hashes(paths)
+
+_keyword_index = None
+
+def get_keyword_index():
+    """The BM25 index next to the vector store, or None if hybrid search is off or nothing is indexed yet."""
+    global _keyword_index
+    if not HYBRID_SEARCH:
+        return None
+    with _manifest_lock:
+        if _keyword_index is None and os.path.exists(os.path.join(PERSIST_DIRECTORY, KEYWORD_INDEX_FILENAME)):
+            _keyword_index = KeywordIndex(PERSIST_DIRECTORY)
+    return _keyword_index
+
+def _filter_values(filter, field):
+    """Values a Chroma `where` filter pins `field` to ({field: v}, $eq, $in, inside $and), or None."""
+    if not filter:
+        return None
+    if "$and" in filter:
+        for condition in filter["$and"]:
+            values = _filter_values(condition, field)
+            if values:
+                return values
+        return None
+    condition = filter.get(field)
+    if isinstance(condition, dict):
+        if "$eq" in condition:
+            return [condition["$eq"]]
+        return list(condition.get("$in", [])) or None
+    return [condition] if condition is not None else None
+
+def fuse_keyword_results(query, vector_docs, k, vectorstore=None, filter=None):
+    """
+    Merges the vector results with the top-k keyword hits by reciprocal rank fusion,
+    so exact identifiers and column names are found even when their embeddings are not.
+    Chunks found only by keyword are read from the vector store by ID, through the
+    same `filter`, so a hit outside it is dropped. Tenant and file type filters are
+    also applied inside the keyword index itself.
+    """
+    keyword_index = get_keyword_index()
+    if keyword_index is None:
+        return vector_docs
+    with metrics.stage("keyword_search"):
+        hits = keyword_index.search(
+            query, k, tenants=_filter_values(filter, "tenant"), file_types=_filter_values(filter, "file_type")
+        )
+    if not hits:
+        return vector_docs
+
+    from langchain_core.documents import Document
+
+    by_id = {doc.id: doc for doc in vector_docs}
+    missing = [item_id for item_id, _ in hits if item_id not in by_id]
+    if missing:
+        with metrics.stage("keyword_fetch"):
+            found = (vectorstore or get_vectorstore())._collection.get(
+                ids=missing, where=filter or None, include=["documents", "metadatas"]
+            )
+        for item_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"]):
+            by_id[item_id] = Document(page_content=text, metadata=metadata or {}, id=item_id)
+    keyword_ids = [item_id for item_id, _ in hits if item_id in by_id]
+    fused = reciprocal_rank_fusion([[doc.id for doc in vector_docs], keyword_ids])[:k]
+    return [by_id[item_id] for item_id in fused]
+
+def search_settings(overrides=None, base=None):
+    """SEARCH_KWARGS (or `base`) with any of k, fetch_k and lambda_mult overridden for one request."""
+    settings = dict(base or SEARCH_KWARGS)
+    for name, value in (overrides or {}).items():
+        if name not in SEARCH_KWARGS:
+            raise ValueError(f"Unknown search setting '{name}', expected one of {list(SEARCH_KWARGS)}")
+        if value is not None:
+            settings[name] = type(SEARCH_KWARGS[name])(value)
+    return settings
+
+def retrieval_scope(settings, filter=None):
+    """Answer cache scope: answers are only reused for the same search settings and filter."""
+    return json.dumps({"search": settings, "filter": filter or None}, sort_keys=True)
+
+def retrieve(query, search_kwargs=None, filter=None, query_vector=None):
+    """
+    MMR vector search over the store, fused with keyword hits when hybrid search is on.
+    `filter` is a Chroma `where` filter on chunk metadata, e.g. {"tenant": "finance"}
+    or {"file_type": {"$in": ["csv", "xlsx"]}}, applied inside the store before ranking.
+    Pass `query_vector` if the question is already embedded.
+    """
+    settings = search_settings(search_kwargs)
+    if query_vector is None:
+        with metrics.stage("embed_query"):
+            query_vector = get_embeddings().embed_query(query)
+    docs = mmr_search_by_vector(get_vectorstore(), query_vector, filter=filter or None, **settings)
+    return fuse_keyword_results(query, docs, settings["k"], filter=filter)
+
+def build_context(query, docs, budget_tokens=CONTEXT_TOKEN_BUDGET):
+    """Merges, de-duplicates and packs retrieved chunks into the prompt's token budget, and logs the result."""
+    with metrics.stage("context_assembly"):
+        context, stats = assemble_context(docs, budget_tokens)
+    metrics.count("retrieved_chunks", stats["retrieved"])
+    metrics.count("packed_chunks", stats["packed"])
+    metrics.count("context_tokens", stats["context_tokens"])
+    prompt_tokens = (
+        estimate_tokens(system_prompt) + estimate_tokens(question_prompt) + estimate_tokens(query) + stats["context_tokens"]
+    )
+    print(
+        f"Context: {stats['retrieved']} chunks retrieved, {stats['merged']} merged, "
+        f"{stats['duplicates']} near-duplicates dropped, {stats['packed']} packed "
+        f"({stats['context_tokens']}/{stats['budget_tokens']} tokens, ~{prompt_tokens} prompt tokens)"
+    )
+    return context
+
+def _retrieve_for_chain(inputs):
+    # The chain passes its whole input dict: {"input": question, "search_kwargs": ..., "filter": ..., "query_vector": ...}
+    docs = retrieve(inputs["input"], inputs.get("search_kwargs"), inputs.get("filter"), inputs.get("query_vector"))
+    return build_context(inputs["input"], docs)
 
-llm = load_llm_model(USE_MODEL)
-    
 system_prompt = (
     "You are a precise question-answering assistant. Your task is to answer questions "
     "using only the provided context.\n\n"
@@ -60,48 +200,234 @@ system_prompt = (
     "- Conflicting information: Present both perspectives with their sources\n"
     "- Ambiguous questions: Answer the most likely interpretation\n\n"
     
-    "Context:\n{context}\n\n"
-    
     "Remember: Accuracy over completeness. A short correct answer beats a long uncertain one."
 )
 
-prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", system_prompt),
-        ("human", "{input}"),
-    ]
+# Everything that changes per question comes after the static instructions, so
+# Ollama can reuse their evaluated prefix from the previous request
+question_prompt = (
+    "Context:\n{context}\n\n"
+    "Question: {input}"
 )
 
-combine_docs_chain = create_stuff_documents_chain(llm, prompt)
-rag_chain = create_retrieval_chain(retriever, combine_docs_chain)
+def reasoning_mode(value=REASONING):
+    """ChatOllama's `reasoning` for a RAG_REASONING value: False, True, None (model default) or a level."""
+    value = str(value).strip().lower()
+    if value in ("off", "0", "false", "no"):
+        return False
+    if value in ("on", "1", "true", "yes"):
+        return True
+    if value in ("", "default"):
+        return None
+    return value
+
+def answer_token_limit(reasoning):
+    """num_predict: the answer allowance, plus the thinking allowance unless reasoning is off."""
+    return MAX_ANSWER_TOKENS if reasoning is False else MAX_ANSWER_TOKENS + REASONING_TOKENS
+
+def context_window(num_predict):
+    """
+    num_ctx that fits the largest prompt build_context packs plus `num_predict`
+    output tokens. It is fixed per process rather than sized per question,
+    because Ollama reloads the model whenever num_ctx changes.
+    """
+    if NUM_CTX:
+        return NUM_CTX
+    prompt_tokens = (
+        estimate_tokens(system_prompt) + estimate_tokens(question_prompt) + CONTEXT_TOKEN_BUDGET + QUESTION_TOKENS
+    )
+    tokens = int((prompt_tokens + num_predict) * TOKEN_ESTIMATE_MARGIN)
+    return -(-tokens // NUM_CTX_STEP) * NUM_CTX_STEP
 
-def ask_question(query):
+# Local LLM
+def load_llm_model(model_name, **overrides):
+    """ChatOllama with the generation settings above; `overrides` replace any of them (e.g. num_ctx=None)."""
+    from langchain_ollama import ChatOllama
+    reasoning = reasoning_mode()
+    num_predict = answer_token_limit(reasoning)
+    settings = {
+        "temperature": 0,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "reasoning": reasoning,
+        "num_predict": num_predict,
+        "num_ctx": context_window(num_predict),
+        "callbacks": [prompt_token_logger()] + metrics.llm_callbacks(),
+    }
+    settings.update(overrides)
+    llm = ChatOllama(model=model_name, **settings)
+    return llm
+
+def warm_up_llm(llm=None):
+    """
+    Loads the model in Ollama with the answering options (a different num_ctx
+    would load it again) and runs the static instructions through it, so the
+    first question neither waits for the load nor prefills the instructions.
+    """
+    llm = llm or load_llm_model(USE_MODEL, callbacks=None)
+    with timed("LLM warm-up"):
+        try:
+            llm.model_copy(update={"num_predict": 1}).invoke([("system", system_prompt), ("human", "Hello")])
+        except httpx.ConnectError:
+            print("Ollama is not running; the model will be loaded by the first question.")
+
+def build_combine_docs_chain(llm, messages=None):
+    """
+    Prompt and stuff-documents chain that turns retrieved context into an answer
+    with `llm`. `messages` replaces the prompt's (role, template) pairs.
+    """
+    from langchain_classic.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate
+
+    prompt = ChatPromptTemplate.from_messages(
+        messages or [
+            ("system", system_prompt),
+            ("human", question_prompt),
+        ]
+    )
+    return prompt, create_stuff_documents_chain(llm, prompt)
+
+def get_rag_chain():
+    """Builds the retrieval chain on first call and returns the same one afterwards."""
+    if "rag_chain" not in _components:
+        with _chain_lock:
+            if "rag_chain" not in _components:
+                # Load Vector Store (shared with data_indexing and app.py)
+                print("Connecting to Vector Store....")
+                vectorstore = get_vectorstore()
+
+                with timed("import LangChain chains"):
+                    from langchain_classic.chains import create_retrieval_chain
+                    from langchain_core.runnables import RunnableLambda
+
+                with timed("build RAG chain"):
+                    # Retriever (top 3 chunks from MMR and keyword search)
+                    retriever = RunnableLambda(_retrieve_for_chain, name="HybridRetriever")
+                    llm = load_llm_model(USE_MODEL)
+                    prompt, combine_docs_chain = build_combine_docs_chain(llm)
+                    _components.update(
+                        retriever=retriever,
+                        llm=llm,
+                        prompt=prompt,
+                        combine_docs_chain=combine_docs_chain,
+                        rag_chain=create_retrieval_chain(retriever, combine_docs_chain),
+                    )
+    return _components["rag_chain"]
+
+def warm_up():
+    """
+    Loads everything ask_question needs, including one pass through the embedding
+    model. The model is loaded in Ollama meanwhile, in a background thread.
+    """
+    if OLLAMA_WARM_UP:
+        threading.Thread(target=warm_up_llm, name="llm-warm-up", daemon=True).start()
+    get_rag_chain()
+    with timed("first query embedding"):
+        get_embeddings().embeddings.embed_query("warm up")
+
+def __getattr__(name):
+    # Lazily built module attributes kept for callers that import them directly
+    if name == "vectorstore":
+        return get_vectorstore()
+    if name == "embeddings":
+        return get_embeddings()
+    if name in ("retriever", "llm", "prompt", "combine_docs_chain", "rag_chain"):
+        get_rag_chain()
+        return _components[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _cached_answer(query, scope):
+    """Embeds the question and looks it up in the answer cache. Returns (query vector, cached answer or None)."""
+    with metrics.stage("embed_query"):
+        query_vector = get_embeddings().embed_query(query)
+    with metrics.stage("answer_cache"):
+        cached = answer_cache.lookup(query_vector, indexed_source_hashes, scope)
+    metrics.count("answer_cache_hits" if cached is not None else "answer_cache_misses")
+    return query_vector, cached
+
+def ask_question(query, search_kwargs=None, filter=None):
+    """
+    Answers a question from the indexed documents. `search_kwargs` overrides k,
+    fetch_k and lambda_mult; `filter` restricts the search to chunks whose metadata
+    match it (see retrieve), e.g. filter={"tenant": "finance"}.
+    """
     try:
-        response = rag_chain.invoke({"input": query})
-        answer = response['answer']
-        sources = set()
-        
-        for doc in response['context']:
-            sources.add(doc.metadata.get('source'))
+        with metrics.trace("ask_question"):
+            settings = search_settings(search_kwargs)
+            scope = retrieval_scope(settings, filter)
+            query_vector, cached = _cached_answer(query, scope)
+            if cached is not None:
+                return cached
+
+            response = get_rag_chain().invoke(
+                {"input": query, "search_kwargs": settings, "filter": filter, "query_vector": query_vector}
+            )
+            answer = response['answer']
+            sources = set()
             
-        return {"answer" : answer, "sources" : sources}
+            for doc in response['context']:
+                sources.add(doc.metadata.get('source'))
+                
+            answer_cache.store(query_vector, answer, sources, indexed_source_hashes, scope)
+            return {"answer" : answer, "sources" : sources}
             
     except httpx.ConnectError:
         print("\n❌ Error: Cannot connect to Ollama.")
         print("💡 Solution: Please open the Ollama app on your Mac or run 'ollama serve' in your terminal.")
     except Exception as e:
         print(f"\n❌ An unexpected error occurred: {e}")
-        
-        
+
+
+def stream_question(query, search_kwargs=None, filter=None):
+    """
+    Streaming variant of ask_question. Yields answer text as the model produces it,
+    then one final dict {"answer": full answer, "sources": set of sources}.
+    Errors (e.g. httpx.ConnectError when Ollama is down) are raised to the caller.
+    """
+    with metrics.trace("stream_question"):
+        settings = search_settings(search_kwargs)
+        scope = retrieval_scope(settings, filter)
+        query_vector, cached = _cached_answer(query, scope)
+        if cached is not None:
+            yield cached["answer"]
+            yield cached
+            return
+
+        answer = []
+        sources = set()
+
+        chain_input = {"input": query, "search_kwargs": settings, "filter": filter, "query_vector": query_vector}
+        for chunk in get_rag_chain().stream(chain_input):
+            if "context" in chunk:
+                for doc in chunk["context"]:
+                    sources.add(doc.metadata.get('source'))
+            if "answer" in chunk:
+                answer.append(chunk["answer"])
+                yield chunk["answer"]
+
+        answer_cache.store(query_vector, "".join(answer), sources, indexed_source_hashes, scope)
+        yield {"answer" : "".join(answer), "sources" : sources}
+
+
 if __name__ == "__main__":
+    warm_up()
+    report_startup_timing()
     while True:
         query = input("\nYou: ")
         if query.lower() in ['/exit', '/quit']:
             break
-        response = ask_question(query)
-        print(f"Model: {response['answer']}")
-        
+        try:
+            print("Model: ", end="", flush=True)
+            for item in stream_question(query):
+                if isinstance(item, dict):
+                    response = item
+                else:
+                    print(item, end="", flush=True)
+            print()
+        except httpx.ConnectError:
+            print("\n❌ Error: Cannot connect to Ollama.")
+            print("💡 Solution: Please open the Ollama app on your Mac or run 'ollama serve' in your terminal.")
+            continue
+
         print("\nSources Used: ")
         for source in response['sources']:
             print(f'- {source}')
-        
\ No newline at end of file
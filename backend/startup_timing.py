@@ -0,0 +1,33 @@
+import os
+import time
+from contextlib import contextmanager
+
+# Set RAG_STARTUP_TIMING=1 to print how long each heavy component takes to load.
+# Disabled, timed() is a bare yield.
+
+ENABLED = os.environ.get("RAG_STARTUP_TIMING", "") not in ("", "0")
+_timings = []
+
+
+@contextmanager
+def timed(label):
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _timings.append((label, elapsed))
+        print(f"[startup] {label}: {elapsed * 1000:.0f} ms")
+
+
+def report():
+    """Prints the breakdown collected so far, slowest first."""
+    if not ENABLED or not _timings:
+        return
+    total = sum(elapsed for _, elapsed in _timings)
+    print(f"[startup] total {total * 1000:.0f} ms")
+    for label, elapsed in sorted(_timings, key=lambda item: -item[1]):
+        print(f"[startup]   {elapsed * 1000:8.0f} ms  {label}")
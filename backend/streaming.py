@@ -0,0 +1,58 @@
+import queue
+import contextvars
+import threading
+
+# Helpers for wiring generator stages together with bounded buffers.
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(iterable, maxsize=2):
+    """
+    Iterates `iterable` in a background thread, keeping at most `maxsize` items
+    buffered ahead of the consumer. The producer blocks when the buffer is full,
+    so a slow consumer applies backpressure instead of letting memory grow.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+            return
+        put(_DONE)
+
+    # The producer runs in the caller's context, so its work is attributed to the caller's trace
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(produce,), daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        # Consumer finished or bailed out early; let the producer exit.
+        stop.set()
+        thread.join()
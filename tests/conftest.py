@@ -0,0 +1,13 @@
+import os
+import sys
+import pytest
+
+# The backend modules import each other by bare name, as they do when run from backend/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+
+@pytest.fixture
+def vector_only(monkeypatch):
+    """Retrieval without the keyword index, which would otherwise be opened under chroma_db."""
+    import retrieval_pipeline
+    monkeypatch.setattr(retrieval_pipeline, "HYBRID_SEARCH", False)
@@ -0,0 +1,61 @@
+import re
+import zlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic stand-in for the sentence-transformers model: a normalized,
+    hashed bag of words, so texts sharing words are close. Counts the texts it
+    is asked to embed.
+    """
+
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.embedded = 0
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.embedded += 1
+        return self._vector(text)
+
+
+class FakeCollection:
+    """Chroma collection stand-in that answers every query with the same two chunks."""
+
+    def query(self, query_embeddings, n_results, where, include):
+        return {
+            "ids": [["a-0", "b-0"]],
+            "documents": [["alpha text", "beta text"]],
+            "metadatas": [[{"source": "a.txt"}, {"source": "b.txt"}]],
+            "embeddings": [[[1.0] + [0.0] * 63, [0.0, 1.0] + [0.0] * 62]],
+        }
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self._collection = FakeCollection()
+
+
+def make_query_service(**kwargs):
+    """QueryService over the fakes above; every answer is "an answer", generated with a short delay."""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from query_service import QueryService
+    return QueryService(
+        llm=FakeListChatModel(responses=["an answer"], sleep=0.01),
+        embeddings=FakeEmbeddings(),
+        vectorstore=FakeVectorStore(),
+        search_kwargs={"k": 2, "fetch_k": 2},
+        **kwargs,
+    )
@@ -0,0 +1,70 @@
+import pytest
+from answer_cache import AnswerCache
+from fakes import FakeEmbeddings
+
+
+@pytest.fixture
+def embed():
+    return FakeEmbeddings().embed_query
+
+
+def hashes_from(current):
+    return lambda paths: {path: current[path] for path in paths if path in current}
+
+
+def test_same_question_hits_and_other_question_misses(embed):
+    cache = AnswerCache()
+    current = {"a.txt": "h1"}
+    cache.store(embed("what is the refund policy"), "30 days", ["a.txt"], hashes_from(current))
+
+    assert cache.lookup(embed("what is the refund policy"), hashes_from(current)) == {
+        "answer": "30 days", "sources": {"a.txt"},
+    }
+    assert cache.lookup(embed("who signs purchase orders"), hashes_from(current)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_reindexed_or_removed_source_invalidates(embed):
+    cache = AnswerCache()
+    current = {"a.txt": "h1", "b.txt": "h2"}
+    vector = embed("refund policy")
+    cache.store(vector, "30 days", ["a.txt", "b.txt"], hashes_from(current))
+
+    current["a.txt"] = "h1-changed"
+    assert cache.lookup(vector, hashes_from(current)) is None
+    # The stale entry is dropped, not just skipped
+    current["a.txt"] = "h1"
+    assert cache.lookup(vector, hashes_from(current)) is None
+
+    cache.store(vector, "30 days", ["a.txt", "b.txt"], hashes_from(current))
+    del current["b.txt"]
+    assert cache.lookup(vector, hashes_from(current)) is None
+    assert cache.entries == {}
+
+
+def test_scopes_are_separate(embed):
+    cache = AnswerCache()
+    vector = embed("refund policy")
+    cache.store(vector, "ops answer", ["a.txt"], hashes_from({"a.txt": "h"}), scope="ops")
+
+    assert cache.lookup(vector, hashes_from({"a.txt": "h"}), scope="sales") is None
+    assert cache.lookup(vector, hashes_from({"a.txt": "h"}), scope="ops")["answer"] == "ops answer"
+
+
+def test_expired_and_least_recently_used_entries_go(embed, monkeypatch):
+    import answer_cache
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = AnswerCache(ttl_seconds=60, max_entries=2)
+    no_sources = hashes_from({})
+    for question in ("first", "second"):
+        cache.store(embed(question), question, [], no_sources)
+    cache.lookup(embed("first"), no_sources)
+    cache.store(embed("third"), "third", [], no_sources)
+
+    assert cache.lookup(embed("second"), no_sources) is None
+    assert cache.lookup(embed("first"), no_sources)["answer"] == "first"
+
+    now[0] += 61
+    assert cache.lookup(embed("third"), no_sources) is None
+    assert cache.entries == {}
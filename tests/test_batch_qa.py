@@ -0,0 +1,59 @@
+import json
+import asyncio
+import pytest
+from batch_qa import read_questions, run_batch
+from fakes import make_query_service
+
+
+pytestmark = pytest.mark.usefixtures("vector_only")
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+
+def read_jsonl(path):
+    # Skips the line an interrupted run cut short
+    records = []
+    for line in path.read_text().splitlines():
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            pass
+    return records
+
+
+def test_zero_id_is_kept_and_missing_ids_are_numbered(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    write_jsonl(path, [{"id": 0, "question": "first"}, {"question": "second"}, {"id": "", "question": "third"}])
+    assert [q["id"] for q in read_questions(str(path))] == ["0", "2", "3"]
+
+
+def test_duplicate_ids_are_rejected(tmp_path):
+    path = tmp_path / "questions.csv"
+    path.write_text("id,question\n7,first\n2,second\n7,third\n")
+    with pytest.raises(ValueError, match="'7'"):
+        read_questions(str(path))
+
+
+def test_rerun_answers_only_what_is_missing(tmp_path):
+    questions = tmp_path / "questions.jsonl"
+    output = tmp_path / "answers.jsonl"
+    write_jsonl(questions, [{"id": 0, "question": "zero"}, {"question": "one"}, {"id": "x", "question": "two"}])
+    # An earlier run answered "0", failed "x" and was cut off mid-line
+    output.write_text(
+        json.dumps({"id": "0", "question": "zero", "answer": "old"}) + "\n"
+        + json.dumps({"id": "x", "question": "two", "error": "timeout"}) + "\n"
+        + '{"id": "2", "quest'
+    )
+
+    asyncio.run(run_batch(str(questions), str(output), max_generations=1, retrieval_workers=1, service=make_query_service()))
+
+    answered = [record for record in read_jsonl(output) if "error" not in record]
+    assert sorted(record["id"] for record in answered) == ["0", "2", "x"]
+    assert [record["answer"] for record in answered if record["id"] == "0"] == ["old"]
+
+    # Nothing left to do on a third run
+    asyncio.run(run_batch(str(questions), str(output), service=make_query_service()))
+    assert len(read_jsonl(output)) == len(answered) + 1
+
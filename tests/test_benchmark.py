@@ -0,0 +1,111 @@
+import os
+import csv
+import zipfile
+import pytest
+import requests
+from langchain_core.documents import Document
+from benchmark import generate_corpus, keep_alive_seconds, latency_summary, start_stub_ollama, bench_retrieval
+
+
+def test_corpus_labels_each_fact_with_the_file_that_states_it(tmp_path):
+    queries = generate_corpus(str(tmp_path), documents=4, formats=("txt", "csv", "docx", "pdf"), words_per_document=80, facts_per_document=2)
+    assert sorted(os.listdir(tmp_path)) == ["doc_00000.txt", "doc_00001.csv", "doc_00002.docx", "doc_00003.pdf"]
+    assert len(queries) == 8
+    assert len({query["question"] for query in queries}) == 8
+
+    txt = (tmp_path / "doc_00000.txt").read_text()
+    with open(tmp_path / "doc_00001.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    with zipfile.ZipFile(tmp_path / "doc_00002.docx") as package:
+        docx = package.read("word/document.xml").decode("utf-8")
+    texts = {str((tmp_path / name).resolve()): text for name, text in (
+        ("doc_00000.txt", txt), ("doc_00001.csv", "\n".join(" ".join(row) for row in rows)), ("doc_00002.docx", docx),
+    )}
+    for query in queries[:6]:
+        # "What is the budget of project ABC-1234?" is answered by "The budget of project ABC-1234 is ..."
+        statement = query["question"].removeprefix("What is t").removesuffix("?")
+        assert f"T{statement} is " in texts[query["source"]]
+        assert all(f"T{statement} is " not in text for source, text in texts.items() if source != query["source"])
+    assert rows[0] == ["project", "attribute", "value", "notes"]
+
+
+def test_corpus_is_reproducible_from_the_seed(tmp_path):
+    first = generate_corpus(str(tmp_path / "a"), documents=2, formats=("txt",), seed=7)
+    second = generate_corpus(str(tmp_path / "b"), documents=2, formats=("txt",), seed=7)
+    assert [q["question"] for q in first] == [q["question"] for q in second]
+    assert (tmp_path / "a" / "doc_00001.txt").read_text() == (tmp_path / "b" / "doc_00001.txt").read_text()
+
+
+def test_recall_at_k_counts_queries_whose_file_was_retrieved(monkeypatch):
+    import retrieval_pipeline
+    results = {"q1": ["a.txt", "b.txt"], "q2": ["c.txt"], "q3": [], "warm up": []}
+    monkeypatch.setattr(retrieval_pipeline, "search_settings", lambda search_kwargs: {"k": 2})
+    monkeypatch.setattr(retrieval_pipeline, "retrieve", lambda question, settings=None: [
+        Document(page_content="", metadata={"source": source}) for source in results[question]
+    ])
+    queries = [{"question": "q1", "source": "b.txt"}, {"question": "q2", "source": "a.txt"},
+               {"question": "q3", "source": "a.txt"}, {"question": "q1", "source": "a.txt"}]
+    result = bench_retrieval(queries, {})
+    assert result["recall_at_k"] == 0.5
+    assert result["queries"] == 4
+    assert bench_retrieval([], {})["recall_at_k"] is None
+
+
+def test_latency_summary_percentiles_in_milliseconds():
+    summary = latency_summary([i / 1000 for i in range(1, 101)])
+    assert summary["p50"] == pytest.approx(50.5)
+    assert summary["p95"] == pytest.approx(95.05)
+    assert summary["p99"] == pytest.approx(99.01)
+    assert summary["mean"] == pytest.approx(50.5)
+    assert summary["max"] == pytest.approx(100)
+    assert latency_summary([]) is None
+
+
+@pytest.mark.parametrize("value, seconds", [
+    (None, 300), (0, 0), (-1, -1), (90, 90), ("45s", 45), ("30m", 1800), ("1h", 3600), ("500ms", 0.5), (" 2m ", 120), ("-1", -1),
+])
+def test_keep_alive_parsing(value, seconds):
+    assert keep_alive_seconds(value) == seconds
+
+
+@pytest.fixture
+def stub():
+    server, url = start_stub_ollama(answer_tokens=5, think_tokens=3)
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def chat(url, **fields):
+    request = {"model": "stub", "messages": [{"role": "user", "content": "hi"}], "stream": False, **fields}
+    return requests.post(f"{url}/api/chat", json=request, timeout=10).json()
+
+
+def test_stub_think_switch(stub):
+    off = chat(stub, think=False)
+    assert "thinking" not in off["message"]
+    assert off["message"]["content"].split() == [f"token{i}" for i in range(5)]
+    assert off["eval_count"] == 5
+
+    on = chat(stub, think=True)
+    assert on["message"]["thinking"].split() == ["thought0", "thought1", "thought2"]
+    assert on["eval_count"] == 8
+
+    # Left unset, a reasoning model writes its thinking into the answer
+    unset = chat(stub)
+    assert unset["message"]["content"].startswith("<think>thought0 ")
+    assert "thinking" not in unset["message"]
+
+
+def test_stub_num_predict_cuts_thinking_first(stub):
+    reply = chat(stub, think=True, options={"num_predict": 4})
+    assert reply["message"]["thinking"].split() == ["thought0", "thought1", "thought2"]
+    assert reply["message"]["content"].split() == ["token0"]
+    assert (reply["eval_count"], reply["done_reason"]) == (4, "length")
+
+    reply = chat(stub, think=True, options={"num_predict": 2})
+    assert reply["message"]["content"] == ""
+    assert reply["message"]["thinking"].split() == ["thought0", "thought1"]
+
+    assert chat(stub, think=False, options={"num_predict": -1})["done_reason"] == "stop"
+
@@ -0,0 +1,75 @@
+from langchain_core.documents import Document
+from context_budget import assemble_context, merge_adjacent, drop_near_duplicates, pack, estimate_tokens
+
+
+def chunk(text, start, source="a.txt", page=None, id=None):
+    metadata = {"source": source, "start_index": start}
+    if page is not None:
+        metadata["page"] = page
+    return Document(page_content=text, metadata=metadata, id=id)
+
+
+def test_overlapping_and_touching_chunks_are_stitched():
+    text = "The quick brown fox jumps over the lazy dog. It was not amused."
+    first, second, third = chunk(text[:25], 0), chunk(text[20:45], 20), chunk(text[46:], 46)
+    merged = merge_adjacent([second, third, first])
+    assert [doc.page_content for doc in merged] == [text[:45] + "\n" + text[46:]]
+
+
+def test_separate_pages_and_sources_stay_apart_in_rank_order():
+    docs = [
+        chunk("page two text", 0, page=2, id="p2"),
+        chunk("other file", 0, source="b.txt", id="b"),
+        chunk("page one text", 0, page=1, id="p1"),
+        Document(page_content="no position", metadata={"source": "a.txt"}, id="x"),
+    ]
+    assert [doc.id for doc in merge_adjacent(docs)] == ["p2", "b", "p1", "x"]
+
+
+def test_merged_passage_takes_its_best_rank():
+    text = "Payment is due within thirty days."
+    docs = [
+        chunk(text[12:], 12, id="second"),
+        chunk("other", 0, source="b.txt", id="b"),
+        chunk(text[:20], 0, id="first"),
+    ]
+    merged = merge_adjacent(docs)
+    # Named after its first chunk, ranked where its best chunk was
+    assert [doc.id for doc in merged] == ["first", "b"]
+    assert merged[0].page_content == text
+
+
+def test_near_duplicates_keep_the_best_ranked():
+    docs = [
+        Document(page_content="the supplier contract renews every year in March", id="best"),
+        Document(page_content="The supplier contract renews every year in March.", id="copy"),
+        Document(page_content="invoices are due within thirty days", id="other"),
+    ]
+    assert [doc.id for doc in drop_near_duplicates(docs)] == ["best", "other"]
+
+
+def test_pack_skips_what_does_not_fit_and_cuts_an_oversized_best():
+    docs = [Document(page_content="a" * 40), Document(page_content="b" * 400), Document(page_content="c" * 40)]
+    packed, used = pack(docs, budget_tokens=30)
+    assert [doc.page_content[0] for doc in packed] == ["a", "c"]
+    assert used == 2 * (estimate_tokens("a" * 40) + 1)
+
+    packed, used = pack(docs[1:2], budget_tokens=30)
+    assert len(packed[0].page_content) == 120
+    assert used <= 30
+
+
+def test_assemble_context_reports_each_step():
+    text = "Refunds are issued within thirty days of purchase for unopened items."
+    docs = [
+        chunk(text[:40], 0),
+        chunk(text[30:], 30),
+        chunk(text, 0, source="copy.txt"),
+        chunk("x" * 4000, 0, source="big.txt"),
+    ]
+    packed, stats = assemble_context(docs, budget_tokens=100)
+    assert [doc.page_content for doc in packed] == [text]
+    assert stats == {
+        "retrieved": 4, "merged": 1, "duplicates": 1, "packed": 1,
+        "context_tokens": estimate_tokens(text) + 1, "budget_tokens": 100,
+    }
@@ -0,0 +1,62 @@
+import csv
+
+from document_loading import load_table, pack_rows, TABLE_HEADER_SHARE
+
+
+def rows_of(table):
+    return list(enumerate(table, 1))
+
+
+def test_rows_are_packed_under_the_header():
+    table = [["id", "name"]] + [[str(i), f"item {i}"] for i in range(100)]
+    chunks = pack_rows(rows_of(table), {}, chunk_size=120)
+    assert len(chunks) > 1
+    assert all(len(chunk.page_content) <= 120 for chunk in chunks)
+    assert all(chunk.page_content.startswith("id | name\n") for chunk in chunks)
+    assert chunks[0].metadata["row_start"] == 2
+    assert chunks[-1].metadata["row_end"] == 101
+    # Every row lands in exactly one chunk
+    bodies = [line for chunk in chunks for line in chunk.page_content.split("\n")[1:]]
+    assert bodies == [f"{i} | item {i}" for i in range(100)]
+
+
+def test_long_row_is_split_with_the_header_on_every_piece():
+    long_row = ["1"] + [f"word{i} " * 10 for i in range(20)]
+    table = [["id", "notes"], ["0", "short"], long_row, ["2", "after"]]
+    chunks = pack_rows(rows_of(table), {"sheet": "s"}, chunk_size=200)
+    assert all(len(chunk.page_content) <= 200 for chunk in chunks)
+    assert all(chunk.page_content.startswith("id | notes\n") for chunk in chunks)
+    pieces = [chunk for chunk in chunks if chunk.metadata["row_start"] == chunk.metadata["row_end"] == 3]
+    assert len(pieces) > 1
+    assert all(chunk.metadata["sheet"] == "s" for chunk in chunks)
+    # The rows around the long one keep their own chunks
+    assert chunks[0].page_content == "id | notes\n0 | short"
+    assert chunks[-1].page_content == "id | notes\n2 | after"
+
+
+def test_long_header_is_cut_at_a_column_boundary():
+    header = [f"column name {i}" for i in range(50)]
+    table = [header, ["x"] * 3]
+    chunks = pack_rows(rows_of(table), {}, chunk_size=400)
+    first_line = chunks[0].page_content.split("\n")[0]
+    assert len(first_line) <= 400 * TABLE_HEADER_SHARE
+    assert first_line.startswith("column name 0 | column name 1")
+    assert first_line.endswith(" …")
+    assert chunks[0].page_content.endswith("x | x | x")
+
+
+def test_load_table_reads_csv(tmp_path):
+    path = tmp_path / "table.csv"
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows([["id", "value"], ["1", "a"], ["2", "b"]])
+    chunks = load_table(str(path))
+    assert [chunk.page_content for chunk in chunks] == ["id | value\n1 | a\n2 | b"]
+    assert (chunks[0].metadata["row_start"], chunks[0].metadata["row_end"]) == (2, 3)
+
+
+def test_multi_line_records_are_numbered_by_their_first_line(tmp_path):
+    path = tmp_path / "notes.csv"
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows([["id", "note"], ["1", "first\nsecond\nthird"], ["2", "one line"]])
+    chunk, = load_table(str(path))
+    assert (chunk.metadata["row_start"], chunk.metadata["row_end"]) == (2, 5)
@@ -0,0 +1,37 @@
+import sys
+import types
+import pytest
+import embedding_backends
+
+
+@pytest.fixture
+def fake_huggingface(monkeypatch):
+    created = []
+
+    class HuggingFaceEmbeddings:
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+
+    monkeypatch.setitem(sys.modules, "langchain_huggingface", types.SimpleNamespace(HuggingFaceEmbeddings=HuggingFaceEmbeddings))
+    monkeypatch.setattr(embedding_backends, "export_onnx", lambda backend: "/models/onnx")
+    monkeypatch.setattr(embedding_backends, "_embed_threads", None)
+    return created
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_session_uses_the_embedding_threads(fake_huggingface, backend):
+    pytest.importorskip("onnxruntime")
+    torch_loaded = "torch" in sys.modules
+    embedding_backends.set_embedding_threads(3)
+    embedding_backends.load_base_embeddings(backend)
+
+    options = fake_huggingface[0]["model_kwargs"]["model_kwargs"]["session_options"]
+    assert options.intra_op_num_threads == 3
+    # Setting the thread count never pulls in torch for an ONNX backend
+    assert ("torch" in sys.modules) == torch_loaded
+
+
+def test_onnx_session_keeps_the_default_without_a_thread_count(fake_huggingface):
+    pytest.importorskip("onnxruntime")
+    embedding_backends.load_base_embeddings("onnx")
+    assert fake_huggingface[0]["model_kwargs"]["model_kwargs"]["session_options"].intra_op_num_threads == 0
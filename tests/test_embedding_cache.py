@@ -0,0 +1,45 @@
+import os
+from embedding_cache import CachedEmbeddings, VECTORS_FILENAME
+from fakes import FakeEmbeddings
+
+
+def test_documents_are_embedded_once_across_instances(tmp_path):
+    model = FakeEmbeddings()
+    first = CachedEmbeddings(model, str(tmp_path), "fake").embed_documents(["alpha", "beta", "alpha"])
+    assert model.embedded == 2
+
+    again = CachedEmbeddings(model, str(tmp_path), "fake").embed_documents(["beta", "alpha"])
+    assert model.embedded == 2
+    assert again == [first[1], first[0]]
+
+
+def test_model_id_separates_entries(tmp_path):
+    model = FakeEmbeddings()
+    CachedEmbeddings(model, str(tmp_path), "one").embed_documents(["alpha"])
+    CachedEmbeddings(model, str(tmp_path), "two").embed_documents(["alpha"])
+    assert model.embedded == 2
+
+
+def test_queries_are_not_persisted(tmp_path):
+    model = FakeEmbeddings()
+    embeddings = CachedEmbeddings(model, str(tmp_path), "fake")
+    embeddings.embed_documents(["a chunk"])
+    size = os.path.getsize(tmp_path / VECTORS_FILENAME)
+
+    vector = embeddings.embed_query("a question")
+    assert embeddings.embed_queries(["a question"]) == [vector]
+    assert model.embedded == 2
+    assert os.path.getsize(tmp_path / VECTORS_FILENAME) == size
+
+
+def test_query_cache_is_bounded_lru(tmp_path):
+    model = FakeEmbeddings()
+    embeddings = CachedEmbeddings(model, str(tmp_path), "fake", query_cache_size=2)
+    embeddings.embed_queries(["q1", "q2"])
+    embeddings.embed_query("q1")  # q2 is now the least recently used
+    embeddings.embed_query("q3")
+    assert list(embeddings.query_vectors) == ["q1", "q3"]
+
+    embedded = model.embedded
+    embeddings.embed_query("q2")
+    assert model.embedded == embedded + 1
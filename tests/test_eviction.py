@@ -0,0 +1,55 @@
+import chromadb
+import pytest
+from langchain_chroma import Chroma
+from config import DOCUMENT_DIRECTORY
+from data_indexing import evict_chunks, chunk_tags
+from keyword_index import KeywordIndex
+from fakes import FakeEmbeddings
+
+
+@pytest.fixture
+def db():
+    client = chromadb.EphemeralClient()
+    store = Chroma(client=client, collection_name="eviction", embedding_function=FakeEmbeddings())
+    yield store
+    client.delete_collection("eviction")
+
+
+def index(db, keyword_index, path, texts, prefix):
+    ids = [f"{prefix}-{i}" for i in range(len(texts))]
+    metadatas = [{"source": path, **chunk_tags(path)} for _ in texts]
+    db.add_texts(texts, metadatas=metadatas, ids=ids)
+    keyword_index.add(ids, texts, metadatas)
+    return ids
+
+
+def test_stale_chunks_leave_store_and_keyword_index(db, tmp_path):
+    keyword_index = KeywordIndex(str(tmp_path))
+    path = f"{DOCUMENT_DIRECTORY}/notes.txt"
+    stale = index(db, keyword_index, path, ["invoice SKU-00123 overdue", "quarterly budget"], "old")
+    kept = index(db, keyword_index, path, ["supplier contract renewal"], "new")
+
+    evict_chunks(db, stale, [], keyword_index)
+
+    assert db._collection.get(ids=stale)["ids"] == []
+    assert db._collection.get(ids=kept)["ids"] == kept
+    assert keyword_index.search("invoice budget", 10) == []
+    assert [item_id for item_id, _ in keyword_index.search("supplier", 10)] == kept
+
+
+def test_repoint_retags_keyword_postings(db, tmp_path):
+    keyword_index = KeywordIndex(str(tmp_path))
+    old_path, new_path = f"{DOCUMENT_DIRECTORY}/report.txt", f"{DOCUMENT_DIRECTORY}/report.md"
+    ids = index(db, keyword_index, old_path, ["warehouse inventory levels", "shipping delays"], "shared")
+
+    evict_chunks(db, [], [(ids, new_path)], keyword_index)
+
+    metadatas = db._collection.get(ids=ids, include=["metadatas"])["metadatas"]
+    assert {(m["source"], m["file_type"]) for m in metadatas} == {(new_path, "md")}
+    assert keyword_index.search("warehouse", 10, file_types=["txt"]) == []
+    assert [item_id for item_id, _ in keyword_index.search("warehouse", 10, file_types=["md"])] == [ids[0]]
+
+    # Removing with the new tags must leave no postings behind
+    evict_chunks(db, ids, [], keyword_index)
+    assert keyword_index.count() == 0
+    assert keyword_index.search("warehouse shipping", 10) == []
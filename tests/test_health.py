@@ -0,0 +1,38 @@
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import health
+from config import ollama_url
+
+
+@pytest.mark.parametrize("host, url", [
+    (None, "http://localhost:11434"),
+    ("127.0.0.1:11434", "http://127.0.0.1:11434"),
+    ("0.0.0.0", "http://localhost:11434"),
+    ("0.0.0.0:8080", "http://localhost:8080"),
+    ("gpu-box", "http://gpu-box:11434"),
+    ("http://localhost:11434/", "http://localhost:11434"),
+    ("https://ollama.example.com", "https://ollama.example.com:443"),
+    ("[::1]:11434", "http://[::1]:11434"),
+])
+def test_ollama_host_is_normalized(host, url):
+    assert ollama_url(host) == url
+
+
+def test_probe_reaches_ollama_given_a_host_without_scheme(monkeypatch):
+    class Tags(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200 if self.path == "/api/tags" else 404)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Tags)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        monkeypatch.setattr(health, "OLLAMA_URL", ollama_url(f"127.0.0.1:{server.server_address[1]}"))
+        assert health.probe_ollama()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,95 @@
+import os
+import pytest
+from index_manifest import IndexManifest, DEFAULT_TENANT, content_key, hash_file, tenant_of
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = IndexManifest(str(tmp_path / "db"))
+    yield manifest
+    manifest.close()
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path.resolve())
+
+
+def record(manifest, item, chunks=1):
+    path, size, mtime, content_hash = item
+    manifest.record_file(path, size, mtime, content_hash)
+    if not manifest.has_content(content_hash):
+        manifest.record_content(content_hash, path, [f"{content_hash}-{i}" for i in range(chunks)])
+
+
+def index_all(manifest, docs):
+    result = manifest.scan(str(docs))
+    for item in result["new"] + result["duplicates"]:
+        record(manifest, item)
+    manifest.save()
+    return result
+
+
+def test_scan_sorts_files_into_new_duplicate_changed_and_removed(manifest, tmp_path):
+    docs = tmp_path / "docs"
+    a = write(docs / "a.txt", "alpha")
+    b = write(docs / "b.txt", "beta")
+    first = index_all(manifest, docs)
+    assert sorted(item[0] for item in first["new"]) == [a, b]
+
+    write(docs / "copy.txt", "alpha")
+    write(docs / "b.txt", "beta, revised")
+    os.utime(b, (1, 1))
+    os.remove(a)
+    second = manifest.scan(str(docs))
+
+    assert [item[0] for item in second["duplicates"]] == [str((docs / "copy.txt").resolve())]
+    assert second["changed"] == [b]
+    assert [item[0] for item in second["new"]] == [b]
+    assert second["removed"] == [a]
+    assert second["unchanged"] == 0
+
+
+def test_touched_file_is_unchanged(manifest, tmp_path):
+    docs = tmp_path / "docs"
+    path = write(docs / "a.txt", "alpha")
+    index_all(manifest, docs)
+    os.utime(path, (1, 1))
+
+    result = manifest.scan(str(docs))
+    assert result["new"] == result["duplicates"] == result["changed"] == []
+    assert result["unchanged"] == 1
+    assert manifest.get_file(path)["mtime"] == 1
+
+
+def test_same_content_in_two_tenants_is_indexed_twice(manifest, tmp_path):
+    docs = tmp_path / "docs"
+    write(docs / "ops" / "a.txt", "shared")
+    write(docs / "sales" / "a.txt", "shared")
+    write(docs / "top.txt", "shared")
+
+    result = manifest.scan(str(docs))
+    assert len(result["new"]) == 3
+    assert tenant_of(str(docs / "top.txt"), str(docs)) == DEFAULT_TENANT
+    assert content_key("h", DEFAULT_TENANT) == "h"
+    assert content_key("h", "ops") != content_key("h", "sales")
+
+
+def test_garbage_collection_drops_orphans_and_repoints_duplicates(manifest, tmp_path):
+    docs = tmp_path / "docs"
+    a = write(docs / "a.txt", "alpha")
+    b = write(docs / "b.txt", "beta")
+    index_all(manifest, docs)
+    copy = write(docs / "copy.txt", "alpha")
+    index_all(manifest, docs)
+    alpha, beta = hash_file(a), hash_file(b)
+
+    for path in (a, b):
+        manifest.forget(path)
+    stale_ids, repoints = manifest.collect_garbage()
+
+    assert stale_ids == [f"{beta}-0"]
+    assert repoints == [([f"{alpha}-0"], copy)]
+    assert not manifest.has_content(beta)
+    assert manifest.file_hashes([a, b, copy]) == {copy: alpha}
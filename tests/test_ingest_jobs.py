@@ -0,0 +1,89 @@
+import threading
+import pytest
+from ingest_jobs import IngestJobs, IngestWorker, MAX_ATTEMPTS
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    jobs = IngestJobs(str(tmp_path))
+    yield jobs
+    jobs.close()
+
+
+def indexer(events):
+    def index(progress):
+        for event, fields in events:
+            progress(event, **fields)
+    return index
+
+
+def test_run_records_progress_per_file(jobs, tmp_path):
+    a, b, c = (str(tmp_path / name) for name in ("a.txt", "b.txt", "c.txt"))
+    job_id = jobs.submit([a, b, c])
+    index = indexer([
+        ("scanned", {}),
+        ("file_loaded", {"path": a, "chunks": 3}),
+        ("file_loaded", {"path": str(tmp_path / "not-in-job.txt"), "chunks": 1}),
+        ("batch", {"chunks": 4}),
+        ("file_indexed", {"path": a, "chunks": 3}),
+        ("file_failed", {"path": b, "error": "bad PDF"}),
+    ])
+
+    assert jobs.run(job_id, index)
+    job, = jobs.jobs()
+    assert (job["status"], job["files_total"], job["files_done"], job["chunks_done"]) == ("done", 3, 3, 4)
+    assert {f["path"]: (f["status"], f["chunks"], f["error"]) for f in job["files"]} == {
+        a: ("done", 3, None),
+        b: ("failed", None, "bad PDF"),
+        # Not mentioned by the indexer: the scan found it already indexed
+        c: ("skipped", None, "already indexed"),
+    }
+    assert not jobs.has_pending()
+
+
+def test_failed_run_is_recorded(jobs, tmp_path):
+    job_id = jobs.submit([str(tmp_path / "a.txt")])
+
+    def index(progress):
+        raise RuntimeError("store unavailable")
+
+    assert not jobs.run(job_id, index)
+    job, = jobs.jobs()
+    assert (job["status"], job["error"], job["attempts"]) == ("failed", "store unavailable", 1)
+
+
+def test_interrupted_job_resumes_first_until_max_attempts(jobs, tmp_path):
+    first = jobs.submit([str(tmp_path / "a.txt")])
+    second = jobs.submit([str(tmp_path / "b.txt")])
+    # A process dying mid-run leaves the job 'running'
+    jobs._execute("UPDATE jobs SET status = 'running', started = 0, attempts = 1 WHERE id = ?", (second,))
+
+    jobs.recover()
+    assert jobs.next_job() == second
+
+    jobs._execute("UPDATE jobs SET attempts = ? WHERE id = ?", (MAX_ATTEMPTS, second))
+    jobs.recover()
+    assert jobs.next_job() == first
+    assert jobs.jobs()[0]["error"] == f"interrupted {MAX_ATTEMPTS} times"
+
+
+def test_worker_runs_jobs_in_submission_order(jobs, tmp_path):
+    ran = []
+    done = threading.Event()
+
+    def index(progress):
+        ran.append(jobs.next_job())
+        if len(ran) == 2:
+            done.set()
+
+    jobs.submit([str(tmp_path / "a.txt")])
+    jobs.submit([str(tmp_path / "b.txt")])
+    worker = IngestWorker(jobs, index, poll_seconds=0.05)
+    worker.start()
+    try:
+        assert done.wait(5)
+    finally:
+        worker.stop()
+        worker.join(5)
+    assert ran == [1, 2]
+    assert [job["status"] for job in jobs.jobs()] == ["done", "done"]
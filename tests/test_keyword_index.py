@@ -0,0 +1,50 @@
+import pytest
+from keyword_index import KeywordIndex, reciprocal_rank_fusion, query_terms
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = KeywordIndex(str(tmp_path))
+    index.add(
+        ["a-0", "b-0", "c-0"],
+        ["invoice SKU-00123 is overdue", "the unit_price column", "overdue invoice reminder for the invoice"],
+        [{"tenant": "ops", "file_type": "txt"}, {"tenant": "ops", "file_type": "csv"}, {"tenant": "sales", "file_type": "txt"}],
+    )
+    yield index
+    index.close()
+
+
+def test_rrf_rewards_keys_found_by_both_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["d", "b", "e"]])
+    assert fused[0] == "b"
+    assert set(fused) == {"a", "b", "c", "d", "e"}
+    # Ties keep first-seen order
+    assert fused[1:3] == ["a", "d"]
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_rrf_scores_by_rank_not_list_length():
+    # "x" is first in one list; "y" is second in two lists and outscores it
+    assert reciprocal_rank_fusion([["x", "y"], ["z", "y"]], k=1)[0] == "y"
+    assert reciprocal_rank_fusion([["x", "y"], ["z", "y"]], k=100)[0] == "y"
+
+
+def test_query_terms_drop_stopwords_and_repeats():
+    assert query_terms("What is the unit_price of SKU-00123 and the SKU?") == ["unit_price", "sku", "00123"]
+
+
+def test_search_ranks_by_bm25_and_filters_by_tags(index):
+    assert [item_id for item_id, _ in index.search("overdue invoice", 10)] == ["c-0", "a-0"]
+    assert [item_id for item_id, _ in index.search("overdue invoice", 10, tenants=["ops"])] == ["a-0"]
+    assert [item_id for item_id, _ in index.search("unit_price", 10, file_types=["csv"])] == ["b-0"]
+    assert index.search("unit_price", 10, file_types=["txt"]) == []
+    assert index.search("the of and", 10) == []
+
+
+def test_re_adding_is_harmless_and_remove_needs_the_indexed_text(index):
+    index.add(["a-0"], ["invoice SKU-00123 is overdue"], [{"tenant": "ops", "file_type": "txt"}])
+    assert index.count() == 3
+
+    index.remove(["a-0"], ["invoice SKU-00123 is overdue"], [{"tenant": "ops", "file_type": "txt"}])
+    assert index.count() == 2
+    assert [item_id for item_id, _ in index.search("00123 invoice", 10)] == ["c-0"]
@@ -0,0 +1,55 @@
+import pytest
+import metrics
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "_histograms", {})
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_exporter", False)
+    monkeypatch.setattr(metrics, "METRICS_FILE", None)
+
+
+def sample(text, name):
+    values = [line.rsplit(" ", 1)[1] for line in text.splitlines() if line.startswith(name)]
+    assert len(values) == 1, name
+    return float(values[0])
+
+
+def test_observation_above_last_bucket_is_counted_once(enabled):
+    metrics.observe("llm", 120.0)
+    text = metrics.render()
+    labels = 'operation="none",stage="llm"'
+    assert sample(text, f'rag_stage_seconds_bucket{{{labels},le="60.0"}}') == 0
+    assert sample(text, f'rag_stage_seconds_bucket{{{labels},le="+Inf"}}') == 1
+    assert sample(text, f"rag_stage_seconds_count{{{labels}}}") == 1
+    assert sample(text, f"rag_stage_seconds_sum{{{labels}}}") == 120.0
+
+
+def test_buckets_are_cumulative(enabled):
+    for seconds in (0.002, 0.002, 0.3, 90.0):
+        metrics.observe("embed", seconds)
+    text = metrics.render()
+    labels = 'operation="none",stage="embed"'
+    assert sample(text, f'rag_stage_seconds_bucket{{{labels},le="0.005"}}') == 2
+    assert sample(text, f'rag_stage_seconds_bucket{{{labels},le="0.5"}}') == 3
+    assert sample(text, f'rag_stage_seconds_bucket{{{labels},le="60.0"}}') == 3
+    assert sample(text, f'rag_stage_seconds_bucket{{{labels},le="+Inf"}}') == 4
+    assert sample(text, f"rag_stage_seconds_count{{{labels}}}") == 4
+
+
+def test_trace_collects_stages_and_counts(enabled):
+    with metrics.trace("ask_question") as trace:
+        with metrics.stage("retrieve"):
+            pass
+        metrics.count("packed_chunks", 3)
+    assert trace.stages["retrieve"][1] == 1
+    assert trace.counts == {"packed_chunks": 3}
+    assert sample(metrics.render(), 'rag_packed_chunks_total{operation="ask_question"}') == 3
+
+
+def test_disabled_is_a_no_op(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    assert metrics.trace("ask_question") is metrics.stage("retrieve")
+    assert metrics.llm_callbacks() == []
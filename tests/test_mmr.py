@@ -0,0 +1,38 @@
+import numpy as np
+from mmr import maximal_marginal_relevance, mmr_search_by_vector
+from fakes import FakeEmbeddings, FakeVectorStore
+
+
+def test_near_duplicate_is_passed_over_for_a_diverse_candidate():
+    query = [1.0, 0.0]
+    candidates = [[1.0, 0.1], [1.0, 0.12], [0.6, -0.8]]
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=0.5) == [0, 2]
+    # With no weight on diversity it is plain similarity order
+    assert maximal_marginal_relevance(query, candidates, k=3, lambda_mult=1.0) == [0, 1, 2]
+
+
+def test_matches_the_naive_definition():
+    rng = np.random.default_rng(0)
+    query, candidates = rng.normal(size=16), rng.normal(size=(40, 16))
+    unit = candidates / np.linalg.norm(candidates, axis=1, keepdims=True)
+    relevance = unit @ (query / np.linalg.norm(query))
+    expected = [int(np.argmax(relevance))]
+    while len(expected) < 8:
+        scores = [
+            -np.inf if i in expected else 0.7 * relevance[i] - 0.3 * max(unit[i] @ unit[j] for j in expected)
+            for i in range(len(unit))
+        ]
+        expected.append(int(np.argmax(scores)))
+    assert maximal_marginal_relevance(query, candidates, k=8, lambda_mult=0.7) == expected
+
+
+def test_k_is_capped_by_the_candidates():
+    assert maximal_marginal_relevance([1.0, 0.0], [[1.0, 0.0]], k=5) == [0]
+    assert maximal_marginal_relevance([1.0, 0.0], [], k=3) == []
+
+
+def test_search_uses_stored_embeddings():
+    embeddings = FakeEmbeddings()
+    docs = mmr_search_by_vector(FakeVectorStore(), embeddings.embed_query("question"), k=2, fetch_k=2)
+    assert sorted(doc.id for doc in docs) == ["a-0", "b-0"]
+    assert embeddings.embedded == 1
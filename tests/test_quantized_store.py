@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+import resources
+from quantized_store import QuantizedCollection
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((500, 32)).astype(np.float32)
+
+
+def exact_top_k(vectors, query, k, allowed=None):
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    if allowed is not None:
+        distances[~allowed] = np.inf
+    return list(np.argsort(distances)[:k])
+
+
+def test_quantized_store_does_not_load_the_embedding_model(monkeypatch, tmp_path):
+    def no_model():
+        raise AssertionError("embedding model loaded")
+
+    monkeypatch.setattr(resources, "VECTOR_STORE", "quantized")
+    monkeypatch.setattr(resources, "PERSIST_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(resources, "_vectorstore", None)
+    monkeypatch.setattr(resources, "get_embeddings", no_model)
+    store = resources.get_vectorstore()
+    assert store._collection.count() == 0
+    store._collection.close()
+
+
+@pytest.fixture
+def store(tmp_path, vectors):
+    collection = QuantizedCollection(str(tmp_path), quantization="int8")
+    ids = [f"c{i}" for i in range(len(vectors))]
+    metadatas = [{"source": f"doc{i % 10}.txt", "tenant": "finance" if i % 2 else "hr"} for i in range(len(vectors))]
+    collection.upsert(ids, vectors, documents=[f"text {i}" for i in range(len(vectors))], metadatas=metadatas)
+    yield collection
+    collection.close()
+
+
+def test_int8_search_matches_exact_search(store, vectors):
+    rng = np.random.default_rng(1)
+    recalls = []
+    for query in rng.standard_normal((20, 32)).astype(np.float32):
+        found = store.query([query], n_results=10)["ids"][0]
+        expected = [f"c{i}" for i in exact_top_k(vectors, query, 10)]
+        recalls.append(len(set(found) & set(expected)) / 10)
+    assert np.mean(recalls) >= 0.95
+
+
+def test_binary_search_finds_the_query_vector(tmp_path, vectors):
+    collection = QuantizedCollection(str(tmp_path), quantization="binary")
+    collection.upsert([f"c{i}" for i in range(len(vectors))], vectors)
+    assert collection.query([vectors[42]], n_results=1)["ids"][0] == ["c42"]
+    collection.close()
+
+
+def test_filtered_query_follows_writes(store, vectors):
+    query = vectors[7]  # a finance row
+    where = {"tenant": "finance"}
+    assert store.query([query], n_results=1, where=where)["ids"][0] == ["c7"]
+
+    # Moving the row to another tenant takes it out of the cached filter mask
+    store.update(ids=["c7"], metadatas=[{"source": "doc7.txt", "tenant": "hr"}])
+    assert "c7" not in store.query([query], n_results=5, where=where)["ids"][0]
+    assert store.query([query], n_results=1, where={"tenant": "hr"})["ids"][0] == ["c7"]
+
+    # New and replaced rows are added to it
+    store.upsert(["c7", "new"], [query, query], metadatas=[{"tenant": "finance"}, {"tenant": "finance"}])
+    assert set(store.query([query], n_results=2, where=where)["ids"][0]) == {"c7", "new"}
+
+    store.delete(ids=["c7"])
+    result = store.query([query], n_results=50, where=where)
+    assert "c7" not in result["ids"][0] and "new" in result["ids"][0]
+    assert all(m["tenant"] == "finance" for m in result["metadatas"][0])
+
+
+def test_filter_mask_matches_sql(store):
+    for where in ({"tenant": "hr"}, {"source": {"$in": ["doc1.txt", "doc2.txt"]}},
+                  {"$and": [{"tenant": "finance"}, {"source": {"$ne": "doc3.txt"}}]}):
+        store.query([np.ones(32, dtype=np.float32)], n_results=1, where=where)
+        expected = sorted(int(item_id[1:]) for item_id in store.get(where=where, include=[])["ids"])
+        assert list(np.flatnonzero(store._allowed(where))) == expected
+
+
+def test_writes_from_another_connection_are_seen(store, tmp_path, vectors):
+    where = {"tenant": "finance"}
+    store.query([vectors[0]], n_results=1, where=where)
+    other = QuantizedCollection(str(tmp_path))
+    other.upsert(["other"], [vectors[0]], metadatas=[{"tenant": "finance"}])
+    other.close()
+    assert store.query([vectors[0]], n_results=1, where=where)["ids"][0] == ["other"]
+
+
+def test_compact_keeps_results(store, vectors):
+    store.delete(ids=[f"c{i}" for i in range(0, 500, 3)])
+    before = store.query([vectors[1]], n_results=5, where={"tenant": "finance"})["ids"][0]
+    assert store.compact() == 167
+    assert store.count() == 333
+    assert store.query([vectors[1]], n_results=5, where={"tenant": "finance"})["ids"][0] == before
+
+
+def test_failed_compact_leaves_no_segment_files(store, vectors, tmp_path, monkeypatch):
+    store.delete(ids=[f"c{i}" for i in range(0, 500, 3)])
+    files = sorted(path.name for path in tmp_path.rglob("*") if path.is_file())
+
+    def fail():
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(store, "_commit", fail)
+    with pytest.raises(RuntimeError):
+        store.compact()
+    assert sorted(path.name for path in tmp_path.rglob("*") if path.is_file()) == files
+    assert store.count() == 333
+    assert store.query([vectors[1]], n_results=1)["ids"][0] == ["c1"]
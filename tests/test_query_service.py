@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from query_service import ServiceBusy
+from fakes import make_query_service
+
+
+pytestmark = pytest.mark.usefixtures("vector_only")
+
+
+def test_ask_many_queues_past_max_pending():
+    async def run():
+        service = make_query_service(max_pending=3, max_generations=1)
+        results = await service.ask_many([f"question {i}" for i in range(5)])
+        await service.close()
+        return results
+
+    results = asyncio.run(run())
+    assert [result["answer"] for result in results] == ["an answer"] * 5
+    assert all(result["sources"] == {"a.txt", "b.txt"} for result in results)
+
+
+def test_ask_rejects_past_max_pending():
+    async def run():
+        service = make_query_service(max_pending=2, max_generations=1)
+        results = await asyncio.gather(*(service.ask(f"q{i}") for i in range(3)), return_exceptions=True)
+        await service.close()
+        return results
+
+    results = asyncio.run(run())
+    assert sum(isinstance(result, ServiceBusy) for result in results) == 1
+
+
+def test_precomputed_vector_skips_embedding():
+    async def run():
+        service = make_query_service()
+        result = await service.ask("question", vector=[1.0] + [0.0] * 63)
+        await service.close()
+        return service.embeddings.embedded, result
+
+    embedded, result = asyncio.run(run())
+    assert embedded == 0
+    assert set(result["timings"]) == {"embed", "retrieve", "queue", "generate"}
+
+
+def test_server_answers_a_non_object_request_with_an_error():
+    import json
+    import socket
+    from query_service import serve
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    async def run():
+        service = make_query_service()
+        server = asyncio.create_task(serve("127.0.0.1", port, service))
+        for _ in range(100):
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                break
+            except OSError:
+                await asyncio.sleep(0.01)
+        writer.write(b'[]\n"hi"\n{"id": 7, "question": "refunds?"}\n')
+        await writer.drain()
+        replies = [json.loads(await reader.readline()) for _ in range(3)]
+        writer.close()
+        server.cancel()
+        await service.close()
+        return replies
+
+    replies = asyncio.run(run())
+    assert replies[:2] == [{"error": "invalid request"}] * 2
+    assert replies[2]["id"] == 7 and replies[2]["answer"] == "an answer"
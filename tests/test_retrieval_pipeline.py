@@ -0,0 +1,35 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import retrieval_pipeline
+from answer_cache import AnswerCache
+from fakes import FakeEmbeddings, FakeVectorStore
+
+
+@pytest.fixture
+def pipeline(monkeypatch, vector_only):
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(retrieval_pipeline, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(retrieval_pipeline, "get_vectorstore", FakeVectorStore)
+    monkeypatch.setattr(retrieval_pipeline, "load_llm_model", lambda name: FakeListChatModel(responses=["an answer"]))
+    monkeypatch.setattr(retrieval_pipeline, "indexed_source_hashes", lambda paths: {path: "hash" for path in paths})
+    monkeypatch.setattr(retrieval_pipeline, "answer_cache", AnswerCache(threshold=0.95, ttl_seconds=60, max_entries=8))
+    monkeypatch.setattr(retrieval_pipeline, "_components", {})
+    return embeddings
+
+
+def test_ask_question_embeds_the_question_once(pipeline):
+    response = retrieval_pipeline.ask_question("what is alpha?")
+    assert response == {"answer": "an answer", "sources": {"a.txt", "b.txt"}}
+    assert pipeline.embedded == 1
+
+
+def test_stream_question_embeds_the_question_once(pipeline):
+    items = list(retrieval_pipeline.stream_question("what is beta?"))
+    assert items[-1] == {"answer": "an answer", "sources": {"a.txt", "b.txt"}}
+    assert pipeline.embedded == 1
+
+
+def test_repeated_question_is_answered_from_the_cache(pipeline):
+    retrieval_pipeline.ask_question("what is alpha?")
+    retrieval_pipeline._components["llm"].responses = ["a different answer"]
+    assert retrieval_pipeline.ask_question("what is alpha?")["answer"] == "an answer"